@@ -304,6 +304,17 @@ class ArUcoWebSocketServer:
                 commands.append("STOP")  # Or no-op
         return commands
 
+    def commands_to_script(self, commands, step_duration=0.2):
+        """
+        Packages navigation commands as one motion script message that the
+        robot executes locally, instead of relaying each step separately.
+        """
+        steps = [[command, step_duration] for command in commands if command.startswith("Arrow")]
+        if not steps:
+            return None
+        now_ms = int(time.time() * 1000)
+        return {"type": "script", "id": f"aruco-{now_ms}", "timestamp": now_ms, "steps": steps}
+
     def process_frame_calibration(self, frame):
         """Process frame for calibration mode"""
         # Store current frame for calibration capture
@@ -378,6 +389,7 @@ class ArUcoWebSocketServer:
                         'pitch_deg': marker_result['pitch_deg']
                     }
                     marker_result['commands'] = self.navigate_robot(nav_data)
+                    marker_result['script'] = self.commands_to_script(marker_result['commands'])
                 else:
                     # If not calibrated, or pose estimation failed, provide default commands
                     marker_result['commands'] = ["CALIBRATION_NEEDED"]
@@ -0,0 +1,99 @@
+# bench_command_ack.py
+"""
+Benchmark: batched drive-command acks and controller-side percentiles.
+
+Runs the bench_soak operator scenario on sim_harness.SimulatedRobot in
+virtual time. The held keys are shared round-robin between --operators
+controllers. Each controller numbers its commands and tells its AckTracker
+when it sent them. Commands reach the robot after a random uplink latency;
+acks come back after a random downlink latency. The robot runs the real
+AckBatcher on motor_thread's dispatch and driver hooks and flushes it
+every FLUSH_INTERVAL_S.
+
+Reports, per operator: rtt / network / exec / feedback percentiles and the
+ack statuses. Load: ack messages per second on the reply topic (every
+operator subscribes to it) with one message per command vs coalesced, and
+the busiest second.
+
+Usage: python3 bench_command_ack.py [--minutes 5] [--operators 3] [--repeat 0.1] [--seed 0]
+"""
+
+import argparse
+import collections
+import functools
+import random
+
+from bench_soak import operator_scenario
+from sim_harness import SimulatedRobot  # Selects the sim GPIO backend before motor_thread loads
+
+import command_ack
+import motor_thread as mt
+
+ROBOT = "robot-bench"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Command ack benchmark (virtual time)")
+    parser.add_argument("--minutes", type=float, default=5.0, help="simulated duration")
+    parser.add_argument("--operators", type=int, default=3)
+    parser.add_argument("--repeat", type=float, default=0.1, help="key-repeat interval of held keys (s)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    seconds = args.minutes * 60
+    rng = random.Random(args.seed)
+    robot = SimulatedRobot(seed=args.seed)
+    clock = robot.clock
+    trackers = [command_ack.AckTracker(sender=i + 1, clock=clock) for i in range(args.operators)]
+    seqs = [0] * args.operators
+    arrivals = collections.Counter()    # Ack messages per virtual second
+    commands = 0
+
+    def deliver(payload):
+        arrivals[int(clock.monotonic())] += 1
+        for tracker in trackers:
+            clock.call_later(rng.uniform(0.02, 0.15), tracker.handle, ROBOT, payload)
+
+    mt.ack_batcher = command_ack.AckBatcher(deliver, clock)
+    clock.call_every(command_ack.FLUSH_INTERVAL_S, mt.ack_batcher.flush)
+
+    def send(operator, key, options):
+        nonlocal commands
+        seqs[operator] += 1
+        commands += 1
+        trackers[operator].sent(ROBOT, seqs[operator])
+        robot.send(key, sender=operator + 1, seq=seqs[operator], latency=rng.uniform(0.02, 0.15), **options)
+
+    trace, obstacles = operator_scenario(seconds, args.seed)
+    for i, command in enumerate(trace):
+        operator = i % args.operators
+        count = 1 + int(command.get("hold", 0.0) / args.repeat)
+        options = {name: command[name] for name in ("duration", "speed") if name in command}
+        for k in range(count):
+            clock.call_at(command["t"] + k * args.repeat, functools.partial(send, operator, command["key"], options))
+    try:
+        robot.schedule_obstacles(obstacles)
+        stats = robot.run(seconds + 2)
+    finally:
+        mt.ack_batcher = None
+        robot.close()
+
+    print(f"simulated {stats['sim_s']:.0f}s in {stats['wall_s']:.1f}s wall, {commands} commands, "
+          f"{args.operators} operators, key repeat {args.repeat * 1000:.0f} ms")
+    print(f"{'operator':>8} {'stage':>9} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8}   statuses")
+    for tracker in trackers:
+        summary = tracker.summary(ROBOT)
+        statuses = " ".join(f"{name}={count}" for name, count in summary["status"].items() if count)
+        for j, stage in enumerate(command_ack.TRACKER_STAGES):
+            s = summary[stage]
+            print(f"{tracker.sender if j == 0 else '':>8} {stage:>9} {s['p50'] / 1000:6.1f}ms {s['p90'] / 1000:6.1f}ms "
+                  f"{s['p99'] / 1000:6.1f}ms {s['max'] / 1000:6.1f}ms   "
+                  + (f"{statuses} unacked={summary['unacked']} coalesced={summary['coalesced']}" if j == 0 else ""))
+    batcher_messages = sum(arrivals.values())
+    print(f"ack messages/s on the reply topic: per-command {commands / seconds:.1f}, "
+          f"coalesced {batcher_messages / seconds:.1f} (busiest second {max(arrivals.values(), default=0)}, "
+          f"cap {1 / command_ack.FLUSH_INTERVAL_S:.0f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+# bench_command_filter.py
+"""
+Benchmark: duplicate suppression and late-burst collapsing (command_filter).
+
+Runs sim_harness.SimulatedRobot in virtual time through a Wi-Fi blip cycle,
+repeated --blips times. The operator holds ArrowUp at key-repeat with a
+normal 20-150 ms uplink. Then the link drops for --blip seconds. During the
+blip the operator holds ArrowUp and then ArrowLeft, sees nothing happen and
+lets go. On reconnect, the broker first redelivers the last --redeliver
+commands sent before the blip (QoS 1, same seq and timestamp). The
+commands queued during the blip follow --spacing-ms apart.
+
+before  every command that is not stale runs (filters bypassed)
+after   motor_thread's SequenceFilter and BacklogCollapser
+
+Per mode: commands delivered and executed, duplicates executed, late
+commands executed, and in the SETTLE_S after each reconnect (the operator
+is idle by then, so all of it is backlog): executions, direction changes,
+cm driven and degrees turned.
+
+Usage: python3 bench_command_filter.py [--blips 20] [--blip 1.5] [--redeliver 3] [--spacing-ms 20] [--seed 0]
+"""
+
+import argparse
+import collections
+import math
+import multiprocessing
+import random
+
+CYCLE_S = 10.0
+REPEAT_S = 0.1
+SETTLE_S = 3.0
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+class PassThrough:
+    """SequenceFilter stand-in that accepts everything (the old behaviour)"""
+
+    def check(self, command):
+        return 0    # command_filter.ACCEPT
+
+    def stats(self):
+        return {}
+
+
+def run(mode, args, results):
+    from sim_harness import SimulatedRobot  # Selects the sim GPIO backend before motor_thread loads
+    import command_filter
+    import control_codec
+    import motor_thread as mt
+
+    rng = random.Random(args.seed)
+    robot = SimulatedRobot(seed=args.seed)
+    clock = robot.clock
+    if mode == "before":
+        mt.command_sequences = PassThrough()
+        mt.command_backlog.late_after_ms = math.inf
+
+    executed = []       # (age ms when it ran, command)
+    execute_drive_command = mt.execute_drive_command
+
+    def recorded(command, received_ns, decoded_ns):
+        executed.append((clock.time() * 1000.0 - command.timestamp, command))
+        execute_drive_command(command, received_ns, decoded_ns)
+
+    mt.execute_drive_command = recorded
+    seq = 0
+    delivered = []      # Sent before the blip; the newest are still unacked at QoS 1
+    queued = []         # Sent during the blip
+
+    def press(key, offline):
+        nonlocal seq
+        seq += 1
+        if offline:
+            queued.append(control_codec.command_from_json(
+                {"key": key, "timestamp": clock.time() * 1000.0, "sender": 1, "seq": seq}))
+        else:
+            delivered.append(robot.send(key, sender=1, seq=seq, latency=rng.uniform(0.02, 0.15)))
+
+    def hold(start, key, seconds, offline=False):
+        for k in range(int(round(seconds / REPEAT_S)) + 1):
+            clock.call_at(start + k * REPEAT_S, press, key, offline)
+
+    def reconnect():
+        backlog = (delivered[-args.redeliver:] if args.redeliver else []) + queued
+        for i, command in enumerate(backlog):
+            robot.deliver(command, i * args.spacing_ms / 1000)
+        delivered.clear()
+        queued.clear()
+
+    windows = []        # Per reconnect: [executions, direction changes, cm, degrees]
+
+    def window_start():
+        windows.append([len(executed), mt.odometry.distance, mt.odometry.theta])
+
+    def window_end():
+        first, distance, theta = windows[-1]
+        keys = [command.key for _, command in executed[first:]]
+        turned = abs(math.degrees((mt.odometry.theta - theta + math.pi) % (2 * math.pi) - math.pi))
+        windows[-1] = [len(keys), sum(1 for a, b in zip(keys, keys[1:]) if a != b),
+                       mt.odometry.distance - distance, turned]
+
+    for i in range(args.blips):
+        t = 1.0 + i * CYCLE_S
+        hold(t, "ArrowUp", 1.0)
+        blip = t + 1.2
+        hold(blip, "ArrowUp", 0.6, offline=True)
+        hold(blip + 0.7, "ArrowLeft", 0.4, offline=True)
+        clock.call_at(blip + args.blip - 0.001, window_start)
+        clock.call_at(blip + args.blip, reconnect)
+        clock.call_at(blip + args.blip + SETTLE_S, window_end)
+
+    try:
+        stats = robot.run(args.blips * CYCLE_S + 1.0)
+    finally:
+        mt.execute_drive_command = execute_drive_command
+        robot.close()
+
+    runs = collections.Counter((command.sender, command.seq) for _, command in executed)
+    results.put({"mode": mode, "commands": stats["commands"], "executed": len(executed),
+                 "duplicates": sum(n - 1 for n in runs.values()),
+                 "late": sum(1 for age, _ in executed if age > command_filter.LATE_AFTER_MS),
+                 "filter": mt.command_sequences.stats(), "backlog": mt.command_backlog.stats(),
+                 "windows": windows})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Duplicate suppression and backlog collapse (virtual time)")
+    parser.add_argument("--blips", type=int, default=20, help="blip cycles")
+    parser.add_argument("--blip", type=float, default=1.5, help="link outage (s)")
+    parser.add_argument("--redeliver", type=int, default=3, help="unacked commands redelivered on reconnect")
+    parser.add_argument("--spacing-ms", type=float, default=20.0, help="gap between backlog deliveries")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # Each mode in a fresh process: SimulatedRobot rewires motor_thread's globals
+    context = multiprocessing.get_context("spawn")
+    rows = []
+    for mode in ("before", "after"):
+        results = context.Queue()
+        process = context.Process(target=run, args=(mode, args, results))
+        process.start()
+        rows.append(results.get(timeout=300))
+        process.join()
+
+    print(f"{args.blips} blips of {args.blip:.1f}s, {args.redeliver} redelivered, "
+          f"backlog {args.spacing_ms:.0f} ms apart, key repeat {REPEAT_S * 1000:.0f} ms")
+    print(f"{'mode':<7} {'delivered':>9} {'executed':>8} {'dup run':>7} {'late run':>8}   "
+          f"after each reconnect ({SETTLE_S:.0f}s, p50/max): {'runs':>7} {'changes':>7} {'cm':>11} {'deg':>11}")
+    for r in rows:
+        columns = list(zip(*r["windows"]))
+        cells = [f"{percentile(c, 50):.0f}/{max(c):.0f}" for c in columns[:2]]
+        cells += [f"{percentile(c, 50):.1f}/{max(c):.1f}" for c in columns[2:]]
+        print(f"{r['mode']:<7} {r['commands']:>9} {r['executed']:>8} {r['duplicates']:>7} {r['late']:>8}   "
+              f"{'':>39} {cells[0]:>7} {cells[1]:>7} {cells[2]:>11} {cells[3]:>11}")
+    after = rows[1]
+    print(f"after: filter {after['filter']}, backlog {after['backlog']}")
+
+
+if __name__ == "__main__":
+    main()
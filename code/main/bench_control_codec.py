@@ -0,0 +1,89 @@
+# bench_control_codec.py
+"""
+Benchmark: JSON vs binary drive commands.
+
+Compares payload size, decode cost (bytes -> key/timestamp/duration) and the
+full customCallback path on the simulated GPIO backend.
+
+Usage: python3 bench_control_codec.py [--iterations 200000] [--callbacks 2000]
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import time
+
+os.environ["ROBOT_GPIO_BACKEND"] = "sim"
+
+import control_codec  # noqa: E402
+import motor_thread  # noqa: E402
+
+
+class FakeMessage:
+    def __init__(self, payload):
+        self.payload = payload
+        self.topic = "bench"
+
+
+def json_payload(i):
+    return json.dumps({"key": "ArrowUp", "timestamp": int(time.time() * 1000) + i,
+                       "duration": 0.2, "seq": i}).encode()
+
+
+def binary_payload(i):
+    return control_codec.encode_command("ArrowUp", i, int(time.time() * 1000) + i, 0.2)
+
+
+def decode_json(payload):
+    msg_data = json.loads(payload.decode())
+    if msg_data.get("type") in ("disconnect", "reconnect", "hello", "videocall_on", "videocall_off"):
+        return None
+    if msg_data.get("key") and msg_data.get("timestamp"):
+        return control_codec.command_from_json(msg_data)
+    return None
+
+
+def decode_binary(payload):
+    return control_codec.decode_command(payload)
+
+
+def time_decode(decode, payloads):
+    start = time.perf_counter_ns()
+    for payload in payloads:
+        decode(payload)
+    return (time.perf_counter_ns() - start) / len(payloads)
+
+
+def time_callbacks(make_payload, count):
+    motor_thread.system_running = True
+    motor_thread.start_motor_driver()
+    messages = [FakeMessage(make_payload(i)) for i in range(count)]
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter_ns()
+        for message in messages:
+            motor_thread.customCallback(None, None, message)
+        elapsed = time.perf_counter_ns() - start
+        motor_thread.motor_stop(immediate=True)
+    return elapsed / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON vs binary control message benchmark")
+    parser.add_argument("--iterations", type=int, default=200000, help="payloads for the decode test")
+    parser.add_argument("--callbacks", type=int, default=2000, help="messages through customCallback")
+    args = parser.parse_args()
+
+    json_payloads = [json_payload(i) for i in range(args.iterations)]
+    binary_payloads = [binary_payload(i) for i in range(args.iterations)]
+    print(f"{'format':<8} {'bytes':>6} {'decode ns':>10} {'callback us':>12}")
+    for name, payloads, decode, make in (("json", json_payloads, decode_json, json_payload),
+                                         ("binary", binary_payloads, decode_binary, binary_payload)):
+        size = len(payloads[0])
+        decode_ns = time_decode(decode, payloads)
+        callback_us = time_callbacks(make, args.callbacks) / 1000.0
+        print(f"{name:<8} {size:>6} {decode_ns:>10.0f} {callback_us:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+# bench_credential_rotation.py
+"""
+Benchmark: recovery time of a hot credential rotation (credential_rotation).
+
+An MqttHub shares one upstream session. A HubClient in a spawned process
+(like the battery reader) publishes a sequence number every --interval
+seconds on a topic it subscribes to, and records when each one comes back.
+Meanwhile this process rewrites the credentials file --rotations times, and
+CredentialRotator swaps the credentials into the upstream client and
+reconnects it.
+
+Upstream: the real AWS IoT session with --credentials (the robot's
+mqtt_data_log.json; each rotation re-applies the same keys). Otherwise a
+loopback broker stand-in that forgets its subscriptions on disconnect, like
+a clean MQTT session, and takes --handshake-ms to connect.
+
+Per rotation: the rotator's phases (swap, disconnect, connect, resubscribe)
+and total recovery, plus the outage the client saw (longest gap between
+echoes). Totals: messages lost and client reconnects (0 means the hub
+socket was never torn down). Before this change, recovery was the full
+robot_main restart (Chrome, login, WebSocket), which takes minutes and
+cannot be reproduced here.
+
+Usage: python3 bench_credential_rotation.py [--rotations 5] [--interval 0.01] [--handshake-ms 300]
+                                            [--credentials mqtt_data_log.json]
+"""
+
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+
+from bench_mqtt_hub import LoopbackUpstream, make_sdk_client, percentile
+from credential_rotation import CredentialRotator, read_credentials, write_credentials
+from mqtt_hub import HubClient, MqttHub
+
+HUB_PATH = "/tmp/robot_mqtt_rotation_bench.sock"
+TOPIC = "robot-bench/rotation"
+
+
+class SessionUpstream(LoopbackUpstream):
+    """Loopback broker whose subscriptions live only as long as the session"""
+
+    def __init__(self, handshake_s):
+        super().__init__()
+        self.handshake_s = handshake_s
+        self.connected = True
+        self.connects = 0
+
+    def configureEndpoint(self, host, port):
+        pass
+
+    def configureIAMCredentials(self, access_key, secret_key, session_token):
+        self.credentials = (access_key, secret_key, session_token)
+
+    def connect(self):
+        time.sleep(self.handshake_s)
+        self.connected = True
+        self.connects += 1
+        return True
+
+    def disconnect(self):
+        self.connected = False
+        self._subscriptions.clear()
+        return True
+
+    def publish(self, topic, payload, qos=0):
+        if not self.connected:
+            raise ConnectionError("not connected")
+        return super().publish(topic, payload, qos)
+
+
+def echo_worker(seconds, interval, results):
+    client = HubClient("rotationBenchClient", HUB_PATH)
+    client.connect()
+    arrivals = {}
+    client.subscribe(TOPIC, 1, lambda c, userdata, message: arrivals.setdefault(int(message.payload), time.time()))
+    client.stats()  # Subscription in place before the first publish
+    connects, sent, sock = 0, 0, client._sock
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        try:
+            client.publish(TOPIC, str(sent), 0)
+        except OSError:
+            pass
+        sent += 1
+        if client._sock is not sock:
+            connects, sock = connects + 1, client._sock
+        time.sleep(interval)
+    time.sleep(0.5)
+    results.put({"sent": sent, "arrivals": sorted(arrivals.values()), "reconnects": connects})
+    client.disconnect()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hot credential rotation benchmark")
+    parser.add_argument("--rotations", type=int, default=5)
+    parser.add_argument("--interval", type=float, default=0.01, help="client publish interval (s)")
+    parser.add_argument("--handshake-ms", type=float, default=300.0, help="loopback connect time (TLS + SigV4 stand-in)")
+    parser.add_argument("--credentials", help="mqtt_data_log.json for a real AWS IoT session")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    path = os.path.join(workdir, "mqtt_data_log.json")
+    if args.credentials:
+        with open(args.credentials) as f:
+            entry = json.load(f)
+        with open(path, "w") as f:
+            json.dump(entry, f)
+        credentials = read_credentials(path)
+        upstream = make_sdk_client("rotationBenchHub", credentials)
+        upstream.connect()
+    else:
+        credentials = {"awsAccessKey": "AKIA0", "awsSecretKey": "secret0", "awsSessionToken": "token0",
+                       "awsHost": "loopback", "topic": TOPIC}
+        write_credentials(credentials, path)
+        upstream = SessionUpstream(args.handshake_ms / 1000.0)
+
+    hub = MqttHub(upstream, HUB_PATH)
+    hub.start()
+    reports, rotated_at = [], []
+    rotator = CredentialRotator(upstream, credentials, path, hub=hub, on_rotated=reports.append)
+
+    gap_s = 1.0
+    seconds = gap_s * (args.rotations + 1)
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    worker = context.Process(target=echo_worker, args=(seconds, args.interval, results))
+    worker.start()
+    # Publishes that hit the reconnect gap fail loudly in the hub; they are counted as lost below
+    with open(os.devnull, "w") as sink, contextlib.redirect_stdout(sink):
+        try:
+            time.sleep(gap_s)
+            for i in range(1, args.rotations + 1):
+                if args.credentials:
+                    fresh = credentials
+                    rotator.credentials = dict(credentials, awsSessionToken="")   # Same keys count as new
+                else:
+                    fresh = dict(credentials, awsAccessKey=f"AKIA{i}", awsSecretKey=f"secret{i}",
+                                 awsSessionToken=f"token{i}")
+                rotated_at.append(time.time())
+                write_credentials(fresh, path)
+                rotator.check()
+                time.sleep(max(0.0, gap_s - (time.time() - rotated_at[-1])))
+            report = results.get(timeout=seconds + 30)
+            worker.join()
+        finally:
+            hub.shutdown()
+            if args.credentials:
+                upstream.disconnect()
+
+    arrivals = report["arrivals"]
+    print(f"{'rotation':>8} {'swap':>7} {'disc':>7} {'connect':>8} {'resub':>7} {'recovery':>9} {'outage':>8}")
+    outages = []
+    for i, (started, rotation) in enumerate(zip(rotated_at, reports), 1):
+        window = [t for t in arrivals if started - 0.2 <= t <= started + gap_s]
+        gaps = [b - a for a, b in zip(window, window[1:])]
+        outage = max(gaps, default=0.0) * 1000
+        outages.append(outage)
+        status = "" if rotation["ok"] else f"  failed: {rotation.get('error')}"
+        print(f"{i:>8} {rotation.get('swapMs', 0):6.1f}ms {rotation.get('disconnectMs', 0):6.1f}ms "
+              f"{rotation.get('connectMs', 0):7.1f}ms {rotation.get('resubscribeMs', 0):6.1f}ms "
+              f"{rotation['recoveryMs']:8.1f}ms {outage:7.0f}ms{status}")
+    recoveries = [r["recoveryMs"] for r in reports if r["ok"]]
+    if recoveries:
+        print(f"recovery p50 {percentile(recoveries, 50):.1f} ms, max {max(recoveries):.1f} ms; "
+              f"client outage p50 {percentile(outages, 50):.0f} ms")
+    print(f"client: {report['sent']} sent, {report['sent'] - len(arrivals)} lost, "
+          f"{report['reconnects']} hub reconnects; rotations ok {rotator.rotations}/{args.rotations}")
+
+
+if __name__ == "__main__":
+    main()
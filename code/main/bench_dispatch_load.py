@@ -0,0 +1,316 @@
+# bench_dispatch_load.py
+"""
+Benchmark: the robot's dispatch path under controller load, fully offline.
+
+A local_broker.LocalBroker runs in its own process behind the HubClient
+socket protocol. This process is the robot, on the simulated GPIO backend
+and wired like motor_thread.main:
+- a HubClient stands in for the SDK client;
+- customCallback is subscribed to the robot topic;
+- the RobotRuntime dispatches commands;
+- an AckBatcher publishes on <topic>/ack;
+- the motor driver, the obstacle watcher and the sensor process run.
+
+For each load level, --controllers synthetic controllers are spawned. Each
+one publishes, at its own rates:
+- arrow presses: JSON, or control_codec binary with --binary, with
+  per-controller seq numbers;
+- motion scripts;
+- system messages ("hello", "pose_query").
+Every controller reads the ack topic with an AckTracker. --sweep runs one
+level per arrow rate (per controller, Hz).
+
+Per level:
+- offered vs dispatched messages per second;
+- drops: broker queue overflow, stale, rejected, timed out, never acked;
+- dispatch path latency by message kind:
+  - hop: callback receipt -> handler start, the runtime's queue;
+  - handler: time spent handling the message;
+- arrow round trip (send -> ack) and execution (receipt -> pins) from the
+  controllers' ack trackers;
+- peak runtime backlog (messages submitted but not yet handled).
+
+Usage: python3 bench_dispatch_load.py [--controllers 3] [--seconds 10] [--sweep 5,20,50,100,200]
+                                      [--script-rate 0.2] [--system-rate 1] [--binary]
+                                      [--max-queued 1000] [--latency-ms 20,150]
+"""
+
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import threading
+import time
+
+HUB_PATH = "/tmp/robot_dispatch_bench.sock"
+TOPIC = "robot-bench/dispatch"
+ROBOT = "robot-bench"
+KINDS = ("arrow", "script", "system")
+ARROWS = ("ArrowUp", "ArrowLeft", "ArrowDown", "ArrowRight")
+SYSTEM_TYPES = ("hello", "pose_query")
+DRAIN_S = 2.0       # After the last send: let acks and script outcomes come back
+
+
+def broker_process(max_queued, latency, ready, stop, results):
+    from local_broker import serve
+    with open(os.devnull, "w") as sink, contextlib.redirect_stdout(sink):
+        hub = serve(HUB_PATH, max_queued=max_queued, latency=latency)
+        ready.set()
+        stop.wait()
+        results.put(hub.client.stats())
+        hub.shutdown()
+
+
+def controller(index, args, rate, start_at, results):
+    """One operator: arrows at rate Hz, scripts and system messages at their rates"""
+    import command_ack
+    import control_codec
+    from mqtt_hub import HubClient
+
+    client = HubClient(f"controller{index}", HUB_PATH)
+    client.connect()
+    sender = index + 1
+    tracker = command_ack.AckTracker(sender=sender)
+    lock = threading.Lock()
+    scripts = {}        # script status -> count for our scripts
+
+    def on_ack(client_, userdata, message):
+        with lock:
+            tracker.handle(ROBOT, message.payload.decode())
+
+    def on_robot(client_, userdata, message):
+        if message.payload[:1] != b"{":
+            return
+        data = json.loads(message.payload)
+        if data.get("type") == "script_status" and str(data.get("id", "")).startswith(f"c{index}-"):
+            with lock:
+                scripts[data["status"]] = scripts.get(data["status"], 0) + 1
+
+    client.subscribe(TOPIC + command_ack.ACK_TOPIC_SUFFIX, 0, on_ack)
+    client.subscribe(TOPIC, 0, on_robot)
+    client.stats()  # Subscriptions in place before the first publish
+
+    intervals = {"arrow": 1.0 / rate if rate > 0 else None,
+                 "script": 1.0 / args.script_rate if args.script_rate > 0 else None,
+                 "system": 1.0 / args.system_rate if args.system_rate > 0 else None}
+    # Stagger controllers so their sends do not line up
+    due = {kind: start_at + interval * (index + 1) / (args.controllers + 1)
+           for kind, interval in intervals.items() if interval}
+    sent = dict.fromkeys(KINDS, 0)
+    errors = 0
+    seq = 0
+    end = start_at + args.seconds
+    time.sleep(max(0.0, start_at - time.time()))
+    while due:
+        kind = min(due, key=due.get)
+        at = due[kind]
+        if at >= end:
+            break
+        delay = at - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        due[kind] = at + intervals[kind]
+        now_ms = int(time.time() * 1000)
+        if kind == "arrow":
+            seq += 1
+            key = ARROWS[(seq // 10) % len(ARROWS)]   # Held for ten repeats, like a key press
+            if args.binary:
+                payload = control_codec.encode_command(key, seq, now_ms, 0.2, sender=sender)
+            else:
+                payload = json.dumps({"key": key, "timestamp": now_ms, "seq": seq, "sender": sender,
+                                      "duration": 0.2})
+            with lock:
+                tracker.sent(ROBOT, seq)
+        elif kind == "script":
+            payload = json.dumps({"type": "script", "id": f"c{index}-{sent['script']}", "timestamp": now_ms,
+                                  "sender": sender, "steps": [["ArrowLeft", 0.3], ["ArrowRight", 0.3]]})
+        else:
+            payload = json.dumps({"type": SYSTEM_TYPES[sent["system"] % len(SYSTEM_TYPES)]})
+        try:
+            client.publish(TOPIC, payload, 0)
+            sent[kind] += 1
+        except OSError:
+            errors += 1
+    time.sleep(DRAIN_S)
+    with lock:
+        summary = tracker.summary(ROBOT)
+        histograms = tracker.robots[ROBOT]["latency"].histograms if ROBOT in tracker.robots else {}
+        results.put({"sent": sent, "errors": errors, "status": summary["status"], "unacked": summary["unacked"],
+                     "coalesced": summary["coalesced"], "histograms": histograms, "scripts": scripts})
+    client.disconnect()
+
+
+class DispatchProbe:
+    """Wraps motor_thread.handle_message: queue hop and handler time per message kind"""
+
+    def __init__(self, mt):
+        self.handle_message = mt.handle_message
+        self.reset()
+        customCallback = mt.customCallback
+
+        def counted_callback(client, userdata, message):
+            self.received += 1
+            customCallback(client, userdata, message)
+
+        mt.handle_message = self.handle
+        self.callback = counted_callback
+
+    @staticmethod
+    def kind(payload):
+        """arrow / script / system, or other for the robot's own publishes echoed back"""
+        if payload[:1] != b"{" or b'"key"' in payload:
+            return "arrow"
+        if b'"script"' in payload:
+            return "script"
+        return "system" if any(f'"{name}"'.encode() in payload for name in SYSTEM_TYPES) else "other"
+
+    def handle(self, message, received_ns):
+        started_ns = time.monotonic_ns()
+        self.handle_message(message, received_ns)
+        kind = self.kind(message.payload)
+        self.recorder.record(f"{kind}.hop", (started_ns - received_ns) // 1000)
+        self.recorder.record_ns(f"{kind}.handler", started_ns)
+        self.handled[kind] += 1
+
+    def sample(self):
+        self.peak_backlog = max(self.peak_backlog, self.received - sum(self.handled.values()))
+
+    def reset(self):
+        """Start a level: a fresh recorder (the previous one stays with its results)"""
+        from latency_stats import LatencyRecorder
+        self.recorder = LatencyRecorder([f"{kind}.{stage}" for kind in KINDS + ("other",)
+                                         for stage in ("hop", "handler")])
+        self.received = 0
+        self.handled = dict.fromkeys(KINDS + ("other",), 0)
+        self.peak_backlog = 0
+
+
+def run_level(args, rate, probe):
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    start_at = time.time() + 2.0    # Controllers need about a second to spawn and subscribe
+    controllers = [context.Process(target=controller, args=(i, args, rate, start_at, results))
+                   for i in range(args.controllers)]
+    for process in controllers:
+        process.start()
+    time.sleep(max(0.0, start_at - time.time()))
+    probe.reset()
+    deadline = start_at + args.seconds
+    while time.time() < deadline:
+        probe.sample()
+        time.sleep(0.05)
+    dispatched = {kind: probe.handled[kind] for kind in KINDS}
+    reports = [results.get(timeout=args.seconds + 60) for _ in controllers]
+    for process in controllers:
+        process.join()
+    return reports, dispatched
+
+
+def percentiles(histogram):
+    return f"{histogram.percentile(50) / 1000:7.2f} {histogram.percentile(99) / 1000:8.2f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Robot dispatch path under synthetic controller load (offline)")
+    parser.add_argument("--controllers", type=int, default=3)
+    parser.add_argument("--seconds", type=float, default=10.0, help="load duration per level")
+    parser.add_argument("--sweep", default="5,20,50,100,200", help="arrow rates per controller (Hz), one level each")
+    parser.add_argument("--script-rate", type=float, default=0.2, help="scripts per second per controller")
+    parser.add_argument("--system-rate", type=float, default=1.0, help="system messages per second per controller")
+    parser.add_argument("--binary", action="store_true", help="send arrows as control_codec binary commands")
+    parser.add_argument("--max-queued", type=int, default=1000, help="broker queue limit per subscription")
+    parser.add_argument("--latency-ms", help="broker one-way latency range, e.g. 20,150")
+    args = parser.parse_args()
+
+    os.environ["ROBOT_GPIO_BACKEND"] = "sim"
+    import command_ack
+    import latency_stats
+    import motor_thread as mt
+    from mqtt_hub import HubClient
+    from robot_runtime import RobotRuntime
+
+    latency = tuple(float(v) / 1000 for v in args.latency_ms.split(",")) if args.latency_ms else None
+    context = multiprocessing.get_context("spawn")
+    ready, stop, broker_results = context.Event(), context.Event(), context.Queue()
+    broker = context.Process(target=broker_process, args=(args.max_queued, latency, ready, stop, broker_results))
+    broker.start()
+    if not ready.wait(30):
+        raise SystemExit("local broker did not start")
+
+    rows = []
+    with open(os.devnull, "w") as sink, contextlib.redirect_stdout(sink):
+        # The robot, as motor_thread.main wires it, with a HubClient for the SDK client
+        mt.system_running = True
+        mt.topic = TOPIC
+        mt.mqtt_hub = client = HubClient("robot", HUB_PATH)
+        client.connect()
+        mt.start_motor_driver()
+        mt.runtime = runtime = RobotRuntime()
+        runtime.start()
+        mt.ack_batcher = command_ack.AckBatcher(
+            lambda payload: client.publish(TOPIC + command_ack.ACK_TOPIC_SUFFIX, payload, 0), mt.clock,
+            wake=lambda: runtime.wake("command-acks"))
+        runtime.ticker("command-acks", mt.ack_batcher.tick)
+        sensors = multiprocessing.get_context("fork").Process(
+            target=mt.measure_distance, args=(mt.open_sensor_snapshot(), mt.obstacle_gate), daemon=True)
+        sensors.start()
+        mt.start_obstacle_watcher()
+        probe = DispatchProbe(mt)
+        client.subscribe(TOPIC, 1, probe.callback)
+        client.stats()
+        try:
+            for rate in [float(r) for r in args.sweep.split(",")]:
+                latency_stats.recorder.reset()
+                reports, dispatched = run_level(args, rate, probe)
+                rows.append((rate, reports, dispatched, probe.recorder, probe.peak_backlog))
+                time.sleep(0.5)
+        finally:
+            runtime.stop()
+            mt.motor_stop(immediate=True)
+            client.disconnect()
+            sensors.terminate()
+            sensors.join()
+            mt.close_sensor_snapshot()
+            stop.set()
+    broker_stats = broker_results.get(timeout=30)
+    broker.join()
+
+    print(f"{args.controllers} controllers, {args.seconds:.0f}s per level, "
+          f"{'binary' if args.binary else 'JSON'} arrows, scripts {args.script_rate}/s and system "
+          f"{args.system_rate}/s per controller, broker queue {args.max_queued}"
+          + (f", latency {args.latency_ms} ms" if args.latency_ms else ""))
+    print(f"{'arrow Hz':>8} {'offered/s':>9} {'dispatched/s':>12} {'stale':>6} {'reject':>6} {'timeout':>7} "
+          f"{'unacked':>7} {'backlog':>7}   {'rtt p50':>7} {'p99':>8}   {'exec p50':>8} {'p99':>8}  (ms)")
+    for rate, reports, dispatched, recorder, backlog in rows:
+        offered = sum(sum(r["sent"].values()) for r in reports) / args.seconds
+        status = {name: sum(r["status"][name] for r in reports) for name in command_ack.STATUS_NAMES}
+        unacked = sum(r["unacked"] for r in reports)
+        merged = {stage: latency_stats.LatencyHistogram() for stage in command_ack.TRACKER_STAGES}
+        for report in reports:
+            for stage, histogram in report["histograms"].items():
+                merged[stage].merge(histogram)
+        print(f"{rate:8.0f} {offered:9.1f} {sum(dispatched.values()) / args.seconds:12.1f} {status['stale']:>6} "
+              f"{status['rejected']:>6} {status['timeout']:>7} {unacked:>7} {backlog:>7}   "
+              f"{percentiles(merged['rtt'])}   {percentiles(merged['exec'])}")
+    print()
+    print(f"{'arrow Hz':>8} {'kind':>7} {'n':>7}   {'hop p50':>7} {'p99':>8}   {'handler p50':>11} {'p99':>8}  (ms)")
+    for rate, reports, dispatched, recorder, backlog in rows:
+        for kind in KINDS:
+            hop, handler = recorder.histograms[f"{kind}.hop"], recorder.histograms[f"{kind}.handler"]
+            sent = sum(r["sent"][kind] for r in reports)
+            print(f"{rate if kind == 'arrow' else '':>8} {kind:>7} {hop.total:>4}/{sent:<4}  {percentiles(hop)}   "
+                  f"    {percentiles(handler)}")
+    scripts = {}
+    for _, reports, _, _, _ in rows:
+        for report in reports:
+            for name, count in report["scripts"].items():
+                scripts[name] = scripts.get(name, 0) + count
+    robot = broker_stats["subscriptions"].get(TOPIC, {})
+    print(f"\nbroker: {broker_stats['published']} published, robot topic dropped {robot.get('dropped', 0)} "
+          f"(peak queue {robot.get('peakQueued', 0)}); script outcomes {scripts}; "
+          f"publish errors {sum(r['errors'] for row in rows for r in row[1])}")
+
+
+if __name__ == "__main__":
+    main()
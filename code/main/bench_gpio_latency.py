@@ -0,0 +1,108 @@
+# bench_gpio_latency.py
+"""
+Benchmark on the simulated GPIO backend (no robot needed):
+
+1. MQTT-message-to-pin latency: feeds drive commands through
+   motor_thread.customCallback and measures the time until the first
+   PWM duty change lands on the motor pins in the transition trace.
+2. Ultrasonic sensor-loop cost: runs measure_single_distance against
+   synthesized echo pulses and reports CPU time, wall time and error.
+
+Usage: python3 bench_gpio_latency.py [--commands 500] [--samples 200]
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import random
+import time
+
+os.environ["ROBOT_GPIO_BACKEND"] = "sim"
+
+from gpio_backend import GPIO  # noqa: E402
+import latency_stats  # noqa: E402
+import motor_thread  # noqa: E402
+import ultrasonic_thread2  # noqa: E402
+
+
+class FakeMessage:
+    def __init__(self, payload):
+        self.payload = payload
+        self.topic = "bench"
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def bench_command_latency(commands):
+    motor_thread.system_running = True
+    motor_thread.start_motor_driver()
+    motor_pins = {motor_thread.IN1, motor_thread.IN2, motor_thread.IN3, motor_thread.IN4}
+    keys = ["ArrowUp", "ArrowLeft", "ArrowDown", "ArrowRight"]
+    latencies_us = []
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for i in range(commands):
+            payload = json.dumps({
+                "key": keys[i % len(keys)],
+                "timestamp": int(time.time() * 1000),
+                "duration": 0.05
+            }).encode()
+            GPIO.clear_trace()
+            sent = time.monotonic_ns()
+            motor_thread.customCallback(None, None, FakeMessage(payload))
+            deadline = time.monotonic() + 0.5
+            first = None
+            while first is None and time.monotonic() < deadline:
+                hits = [t for t in GPIO.transitions(since_ns=sent) if t[1] in motor_pins]
+                if hits:
+                    first = hits[0][0]
+                else:
+                    time.sleep(0.0001)
+            if first is not None:
+                latencies_us.append((first - sent) / 1000.0)
+            # Let the stop deadline pass so every command starts from rest
+            time.sleep(0.08)
+        motor_thread.motor_stop(immediate=True)
+    return latencies_us
+
+
+def bench_sensor_loop(samples):
+    trig, echo = ultrasonic_thread2.SENSORS[0]
+    ultrasonic_thread2.setup_gpio()
+    errors, cpu_us, wall_us = [], [], []
+    for _ in range(samples):
+        distance = random.uniform(5, 300)
+        GPIO.set_echo_distance(trig, echo, distance)
+        cpu0, wall0 = time.process_time(), time.perf_counter()
+        measured = ultrasonic_thread2.measure_single_distance(trig, echo, 1)
+        cpu_us.append((time.process_time() - cpu0) * 1e6)
+        wall_us.append((time.perf_counter() - wall0) * 1e6)
+        errors.append(measured - distance)
+        time.sleep(0.005)
+    return errors, cpu_us, wall_us
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulated GPIO latency / sensor cost benchmark")
+    parser.add_argument("--commands", type=int, default=300, help="drive commands to time")
+    parser.add_argument("--samples", type=int, default=200, help="ultrasonic samples to time")
+    args = parser.parse_args()
+
+    latencies = bench_command_latency(args.commands)
+    print(f"message -> pin: n={len(latencies)}  p50 {percentile(latencies, 50):.1f}us  "
+          f"p99 {percentile(latencies, 99):.1f}us  max {max(latencies):.1f}us")
+    for stage, stats in latency_stats.recorder.snapshot().items():
+        print(f"  stage {stage:<9} n={stats['n']:<5} p50 {stats['p50']}us  p99 {stats['p99']}us  max {stats['max']}us")
+
+    errors, cpu_us, wall_us = bench_sensor_loop(args.samples)
+    abs_errors = [abs(e) for e in errors]
+    print(f"sensor sample:   wall p50 {percentile(wall_us, 50):.0f}us  cpu p50 {percentile(cpu_us, 50):.0f}us  "
+          f"cpu/wall {sum(cpu_us) / sum(wall_us) * 100:.0f}%  "
+          f"|error| p50 {percentile(abs_errors, 50):.2f}cm  p99 {percentile(abs_errors, 99):.2f}cm")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# bench_motor_driver.py
+"""
+Benchmark: per-tick cost of the MotorDriver ramp control loop.
+
+Measures tick() in isolation against no-op PWM channels (pure control-loop
+cost) and then runs the real loop thread at the requested rate to report
+period jitter. Runs without GPIO.
+
+Usage: python3 bench_motor_driver.py [--ticks 200000] [--rate 100]
+"""
+
+import argparse
+import time
+
+from motor_driver import MotorDriver
+
+
+class NullPWM:
+    def __init__(self, pin, frequency):
+        self.pin = pin
+        self.writes = 0
+
+    def start(self, duty):
+        pass
+
+    def ChangeDutyCycle(self, duty):
+        self.writes += 1
+
+    def stop(self):
+        pass
+
+
+class NullGPIO:
+    PWM = NullPWM
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def bench_tick(ticks, rate):
+    """Time tick() while targets keep flipping so every tick ramps"""
+    driver = MotorDriver(NullGPIO, (13, 27), (22, 23), rate_hz=rate)
+    dt = 1.0 / rate
+    samples = []
+    targets = ((80, 80), (-80, -80), (-60, 60), (60, -60), (0, 0))
+    per_target = max(1, ticks // 50)
+    for i in range(ticks):
+        if i % per_target == 0:
+            left, right = targets[(i // per_target) % len(targets)]
+            driver.left.target, driver.right.target = left, right
+        start = time.perf_counter_ns()
+        driver.tick(dt)
+        samples.append(time.perf_counter_ns() - start)
+    return samples
+
+
+def bench_loop(rate, seconds):
+    """Run the real control thread while ramping and record tick periods"""
+    driver = MotorDriver(NullGPIO, (13, 27), (22, 23), rate_hz=rate, accel=1.0, decel=1.0)
+    stamps = []
+    original_tick = driver.tick
+
+    def timed_tick(dt):
+        stamps.append(time.perf_counter())
+        return original_tick(dt)
+
+    driver.tick = timed_tick
+    driver.start()
+    # Slow ramps keep the loop busy for the whole run
+    driver.set_targets(100, -100)
+    time.sleep(seconds)
+    driver.shutdown()
+    return [(b - a) * 1000.0 for a, b in zip(stamps, stamps[1:])]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Motor driver control-loop benchmark")
+    parser.add_argument("--ticks", type=int, default=200000, help="ticks for the isolated tick test")
+    parser.add_argument("--rate", type=float, default=100.0, help="control loop rate (Hz)")
+    parser.add_argument("--seconds", type=float, default=3.0, help="duration of the live loop test")
+    args = parser.parse_args()
+
+    samples = bench_tick(args.ticks, args.rate)
+    mean_us = sum(samples) / len(samples) / 1000.0
+    print(f"tick(): mean {mean_us:.2f}us  p50 {percentile(samples, 50) / 1000:.2f}us  "
+          f"p99 {percentile(samples, 99) / 1000:.2f}us  -> max ~{1e6 / mean_us:,.0f} Hz of pure control cost")
+    print(f"        at {args.rate:.0f} Hz the loop uses ~{mean_us * args.rate / 1e4:.3f}% of one core")
+
+    periods = bench_loop(args.rate, args.seconds)
+    target_ms = 1000.0 / args.rate
+    print(f"loop:   {len(periods) + 1} ticks in {args.seconds:.1f}s (target {target_ms:.2f}ms)  "
+          f"period p50 {percentile(periods, 50):.2f}ms  p99 {percentile(periods, 99):.2f}ms  "
+          f"max {max(periods):.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
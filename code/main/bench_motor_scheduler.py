@@ -0,0 +1,116 @@
+# bench_motor_scheduler.py
+"""
+Benchmark: threading.Timer per command vs the resident MotorScheduler.
+
+Reports the arm rate (commands/s a single callback thread can sustain),
+threads created, and stop-time jitter (actual stop minus intended deadline,
+p50/p99) for key-repeat style command streams. Runs without GPIO.
+
+Usage: python3 bench_motor_scheduler.py [--commands 2000] [--rate 30]
+"""
+
+import argparse
+import threading
+import time
+
+from motor_scheduler import MotorScheduler
+
+
+class TimerStopper:
+    """The previous approach: cancel and spawn a threading.Timer per command"""
+
+    def __init__(self, stop_callback):
+        self._stop_callback = stop_callback
+        self._timer = None
+        self.threads_created = 0
+
+    def extend(self, timeout):
+        if self._timer:
+            self._timer.cancel()
+        self._timer = threading.Timer(timeout, self._stop_callback)
+        self._timer.start()
+        self.threads_created += 1
+
+    def shutdown(self):
+        if self._timer:
+            self._timer.cancel()
+
+
+class SchedulerStopper:
+    def __init__(self, stop_callback):
+        self._scheduler = MotorScheduler(stop_callback)
+        self._scheduler.start()
+        self.threads_created = 1
+
+    def extend(self, timeout):
+        self._scheduler.extend(timeout)
+
+    def shutdown(self):
+        self._scheduler.shutdown()
+
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def bench_arm_rate(factory, commands):
+    """Issue commands back to back and report the sustained arm rate"""
+    stopper = factory(lambda: None)
+    start = time.perf_counter()
+    for _ in range(commands):
+        stopper.extend(0.2)
+    elapsed = time.perf_counter() - start
+    stopper.shutdown()
+    return commands / elapsed, stopper.threads_created
+
+
+def bench_stop_jitter(factory, bursts, rate, burst_len, timeout):
+    """Replay key-repeat bursts and measure when the stop fires vs when it should"""
+    stop_times = []
+    stopped = threading.Event()
+
+    def on_stop():
+        stop_times.append(time.monotonic())
+        stopped.set()
+
+    stopper = factory(on_stop)
+    interval = 1.0 / rate
+    errors_ms = []
+    for _ in range(bursts):
+        stopped.clear()
+        for _ in range(burst_len):
+            last = time.monotonic()
+            stopper.extend(timeout)
+            time.sleep(interval)
+        stopped.wait(timeout + 1.0)
+        if stop_times:
+            errors_ms.append((stop_times[-1] - (last + timeout)) * 1000.0)
+    threads = stopper.threads_created
+    stopper.shutdown()
+    return errors_ms, threads
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Motor stop scheduler benchmark")
+    parser.add_argument("--commands", type=int, default=2000, help="commands for the arm-rate test")
+    parser.add_argument("--rate", type=float, default=30.0, help="key-repeat rate (msg/s)")
+    parser.add_argument("--bursts", type=int, default=40, help="key-repeat bursts for the jitter test")
+    parser.add_argument("--burst-len", type=int, default=8, help="commands per burst")
+    parser.add_argument("--timeout", type=float, default=0.2, help="per-command drive duration (s)")
+    args = parser.parse_args()
+
+    print(f"{'approach':<12} {'cmds/s':>12} {'threads':>8} {'jitter p50':>11} {'jitter p99':>11} {'max':>8}")
+    for name, factory in (("timer", TimerStopper), ("scheduler", SchedulerStopper)):
+        rate, _ = bench_arm_rate(factory, args.commands)
+        errors_ms, threads = bench_stop_jitter(factory, args.bursts, args.rate, args.burst_len, args.timeout)
+        print(f"{name:<12} {rate:>12.0f} {threads:>8} "
+              f"{percentile(errors_ms, 50):>9.2f}ms {percentile(errors_ms, 99):>9.2f}ms "
+              f"{max(errors_ms) if errors_ms else float('nan'):>6.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+# bench_mqtt_hub.py
+"""
+Benchmark: one AWS IoT session per process vs one shared session (mqtt_hub).
+
+Each client process is spawned fresh (no memory shared with this one). It
+stands in for the motor process, the battery reader or system_control.
+
+before  Every client imports AWSIoTPythonSDK and opens its own WebSocket
+        session. With --credentials (the robot's mqtt_data_log.json) it
+        connects to AWS IoT and the TLS + SigV4 handshake is timed. Without
+        credentials only the SDK import and client construction are measured.
+        This mode is skipped when the SDK is not installed.
+after   An MqttHub in this process owns the only upstream session: the real
+        AWS session with --credentials, otherwise an in-process loopback
+        broker. Each client connects a HubClient and echoes --messages QoS 0
+        publishes through the hub and back.
+
+Per client: RSS growth from connecting (VmRSS after minus before), connect
+time, and for the hub the publish -> subscriber round trip. Totals:
+upstream sessions and summed RSS growth.
+
+Usage: python3 bench_mqtt_hub.py [--clients 3] [--messages 1000] [--credentials mqtt_data_log.json]
+"""
+
+import argparse
+import json
+import multiprocessing
+import threading
+import time
+
+from mqtt_hub import HubClient, HubMessage, MqttHub, topic_matches
+
+HUB_PATH = "/tmp/robot_mqtt_bench.sock"
+CA_PATH = "../cert/AmazonRootCA1.pem"
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def rss_kb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+class LoopbackUpstream:
+    """Broker stand-in for the hub's upstream: every publish is delivered back to matching subscriptions"""
+
+    def __init__(self):
+        self._subscriptions = {}
+
+    def publish(self, topic, payload, qos=0):
+        for topic_filter, callback in list(self._subscriptions.items()):
+            if topic_matches(topic_filter, topic):
+                callback(self, None, HubMessage(topic, payload, qos))
+        return True
+
+    def subscribe(self, topic, qos, callback):
+        self._subscriptions[topic] = callback
+        return True
+
+    def unsubscribe(self, topic):
+        self._subscriptions.pop(topic, None)
+        return True
+
+
+def make_sdk_client(client_id, credentials):
+    from AWSIoTPythonSDK.MQTTLib import AWSIoTMQTTClient
+    client = AWSIoTMQTTClient(client_id, useWebsocket=True)
+    if credentials:
+        client.configureEndpoint(credentials["awsHost"], 443)
+        client.configureCredentials(CA_PATH)
+        client.configureIAMCredentials(credentials["awsAccessKey"], credentials["awsSecretKey"],
+                                       credentials["awsSessionToken"])
+        client.configureConnectDisconnectTimeout(10)
+        client.configureMQTTOperationTimeout(5)
+    return client
+
+
+def sdk_worker(index, credentials, results):
+    before = rss_kb()
+    try:
+        started = time.perf_counter()
+        client = make_sdk_client(f"benchClient{index}", credentials)
+        connect_ms = None
+        if credentials:
+            client.connect()
+            connect_ms = (time.perf_counter() - started) * 1000
+        results.put({"rss_kb": rss_kb() - before, "connect_ms": connect_ms})
+        if credentials:
+            client.disconnect()
+    except Exception as e:
+        results.put({"error": f"{type(e).__name__}: {e}"})
+
+
+def hub_worker(index, messages, results):
+    before = rss_kb()
+    try:
+        started = time.perf_counter()
+        client = HubClient(f"benchClient{index}", HUB_PATH)
+        client.connect()
+        connect_ms = (time.perf_counter() - started) * 1000
+        topic = f"robot-bench/{index}"
+        latencies = []
+        done = threading.Event()
+
+        def on_message(client, userdata, message):
+            latencies.append(time.monotonic_ns() - int(message.payload))
+            if len(latencies) >= messages:
+                done.set()
+
+        client.subscribe(topic, 1, on_message)
+        client.stats()  # Round trip so the subscription is in place before publishing
+        for _ in range(messages):
+            client.publish(topic, str(time.monotonic_ns()), 0)
+            time.sleep(0.0005)
+        done.wait(10)
+        results.put({"rss_kb": rss_kb() - before, "connect_ms": connect_ms,
+                     "rtt_us": [value / 1000 for value in latencies]})
+        client.disconnect()
+    except Exception as e:
+        results.put({"error": f"{type(e).__name__}: {e}"})
+
+
+def run_workers(target, args_for, clients):
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    processes = [context.Process(target=target, args=args_for(i) + (results,)) for i in range(clients)]
+    for process in processes:
+        process.start()
+    reports = [results.get(timeout=120) for _ in processes]
+    for process in processes:
+        process.join()
+    return reports
+
+
+def print_reports(name, reports, sessions):
+    errors = [r["error"] for r in reports if "error" in r]
+    if errors:
+        print(f"{name:<7} unavailable: {errors[0]}")
+        return
+    total_rss = sum(r["rss_kb"] for r in reports)
+    connects = [r["connect_ms"] for r in reports if r["connect_ms"] is not None]
+    connect = f"{percentile(connects, 50):8.2f}ms" if connects else f"{'-':>10}"
+    line = (f"{name:<7} {sessions:>8} {len(reports):>7} {total_rss / len(reports) / 1024:9.1f}MB "
+            f"{total_rss / 1024:9.1f}MB {connect}")
+    rtts = [value for r in reports for value in r.get("rtt_us", ())]
+    if rtts:
+        line += f"   echo p50 {percentile(rtts, 50):.0f}us p99 {percentile(rtts, 99):.0f}us ({len(rtts)} msgs)"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared MQTT session benchmark")
+    parser.add_argument("--clients", type=int, default=3, help="client processes (motor, battery, system_control)")
+    parser.add_argument("--messages", type=int, default=1000, help="echo messages per hub client")
+    parser.add_argument("--credentials", help="mqtt_data_log.json for real AWS IoT connections")
+    args = parser.parse_args()
+
+    credentials = None
+    if args.credentials:
+        with open(args.credentials) as f:
+            credentials = json.load(f)["data"]["user"]
+
+    print(f"{'mode':<7} {'sessions':>8} {'clients':>7} {'RSS/client':>11} {'RSS total':>11} {'connect':>10}")
+    reports = run_workers(sdk_worker, lambda i: (i, credentials), args.clients)
+    print_reports("before", reports, args.clients)
+
+    if credentials:
+        upstream = make_sdk_client("benchHub", credentials)
+        started = time.perf_counter()
+        upstream.connect()
+        print(f"(hub upstream handshake {(time.perf_counter() - started) * 1000:.0f} ms, paid once)")
+    else:
+        upstream = LoopbackUpstream()
+    hub = MqttHub(upstream, HUB_PATH)
+    hub.start()
+    try:
+        reports = run_workers(hub_worker, lambda i: (i, args.messages), args.clients)
+        print_reports("after", reports, 1)
+        print(f"hub: {hub.stats()}")
+    finally:
+        hub.shutdown()
+        if credentials:
+            upstream.disconnect()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+# bench_obstacle_stop.py
+"""
+Benchmark: sample-to-stop latency of the obstacle emergency stop.
+
+1. Gate cost: time per ObstacleGate.on_sample (closing-rate fit plus
+   braking envelope) including the publish to the shared snapshot.
+2. Stop latency: a forked sensor process feeds a front distance closing at
+   the robot's cruise speed through an ObstacleGate at a fixed sample
+   period and records when the first blocking sample was taken. The parent
+   drives forward on the simulated GPIO with an ObstacleWatcher attached
+   and finds the moment the forward PWM was cut to 0 in the pin trace.
+   Compared against a watcher that only polls every 0.5 s, which is what
+   the old monitor_obstacles period gave at best.
+
+Usage: python3 bench_obstacle_stop.py [--trials 10] [--period 0.06] [--updates 20000]
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import time
+
+os.environ["ROBOT_GPIO_BACKEND"] = "sim"
+
+from gpio_backend import SimulatedGPIO  # noqa: E402
+from motor_driver import MotorDriver  # noqa: E402
+from obstacle_guard import BrakingEnvelope, ObstacleGate, ObstacleWatcher  # noqa: E402
+from sensor_snapshot import SensorSnapshot  # noqa: E402
+
+LEFT_PINS = (13, 27)
+RIGHT_PINS = (22, 23)
+CRUISE_CM_S = 30.0
+START_CM = 60.0      # Far enough out that the gate only blocks after a few samples
+
+
+def make_gate(event):
+    approach = multiprocessing.Array("d", [CRUISE_CM_S, 0.0])
+    return ObstacleGate(SensorSnapshot(2), event, BrakingEnvelope(brake_cm_s2=225.0), approach)
+
+
+def bench_gate(updates):
+    """ns per on_sample while the distance keeps closing and opening"""
+    gate = make_gate(multiprocessing.Event())
+    now = time.monotonic() - updates * 0.05
+    samples = []
+    for i in range(updates):
+        distance = 40.0 + 30.0 * ((i // 50) % 2) + (i % 50) * (-0.5 if (i // 50) % 2 else 0.5)
+        start = time.perf_counter_ns()
+        gate.on_sample(i & 1, distance, now + i * 0.05)
+        samples.append(time.perf_counter_ns() - start)
+    gate.snapshot.close()
+    return samples
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def sensor(gate, period, crossed_ns, offset):
+    """Approach an obstacle at a fixed sample period; note when the gate first blocks"""
+    time.sleep(offset)   # Random phase against the watcher's poll
+    distance = START_CM
+    while distance > 0:
+        time.sleep(period)
+        distance -= CRUISE_CM_S * period
+        sampled_ns = time.monotonic_ns()
+        if gate.on_sample(0, distance):
+            crossed_ns.value = sampled_ns
+            return
+
+
+def trial(period, poll_interval, event_driven):
+    gpio = SimulatedGPIO()
+    driver = MotorDriver(gpio, LEFT_PINS, RIGHT_PINS)
+    driver.start()
+    event = multiprocessing.Event()
+    gate = make_gate(event if event_driven else multiprocessing.Event())
+    # Both sensors start out fresh and clear so only the approach can stop the robot
+    gate.on_sample(0, START_CM)
+    gate.on_sample(1, START_CM)
+
+    def motion():
+        heading = driver.left.duty + driver.right.duty
+        return (0,) if heading > 0 else ((1,) if heading < 0 else ())
+
+    watcher = ObstacleWatcher(gate.snapshot, event, motion,
+                              lambda index, reason: driver.stop(immediate=True), poll_interval,
+                              stale_after=10.0)
+    watcher.start()
+    driver.set_targets(80, 80)
+    time.sleep(0.25)   # Ramp up to cruise
+
+    crossed_ns = multiprocessing.Value("q", 0)
+    offset = random.uniform(0, poll_interval)
+    child = multiprocessing.get_context("fork").Process(target=sensor, args=(gate, period, crossed_ns, offset))
+    child.start()
+    child.join()
+    deadline = time.monotonic() + 2 * poll_interval + 0.5
+    while driver.left.duty != 0.0 and time.monotonic() < deadline:
+        time.sleep(0.005)
+    watcher.shutdown()
+    driver.shutdown()
+    gate.snapshot.close()
+    cuts = [t for t in gpio.transitions(LEFT_PINS[0], crossed_ns.value) if t[2] == 0.0]
+    return (cuts[0][0] - crossed_ns.value) / 1e6 if cuts else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Obstacle emergency-stop latency benchmark")
+    parser.add_argument("--trials", type=int, default=10, help="trials per mode")
+    parser.add_argument("--period", type=float, default=0.06, help="ultrasonic sample period (s)")
+    parser.add_argument("--updates", type=int, default=20000, help="gate updates to time")
+    args = parser.parse_args()
+
+    costs = bench_gate(args.updates)
+    print(f"gate update: p50 {percentile(costs, 50) / 1000:.1f} us  p99 {percentile(costs, 99) / 1000:.1f} us  "
+          f"max {max(costs) / 1000:.1f} us")
+
+    print(f"sample period {args.period * 1000:.0f} ms, {args.trials} trials")
+    print(f"{'mode':<16} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'missed':>7}")
+    for name, poll, event_driven in (("event", 0.05, True), ("poll 0.5 s", 0.5, False)):
+        results = [trial(args.period, poll, event_driven) for _ in range(args.trials)]
+        latencies = [r for r in results if r is not None]
+        missed = len(results) - len(latencies)
+        if not latencies:
+            print(f"{name:<16} {'-':>8} {'-':>8} {'-':>8} {missed:>7}")
+            continue
+        print(f"{name:<16} {percentile(latencies, 50):8.2f} {percentile(latencies, 99):8.2f} "
+              f"{max(latencies):8.2f} {missed:>7}")
+
+
+if __name__ == "__main__":
+    main()
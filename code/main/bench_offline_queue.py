@@ -0,0 +1,282 @@
+# bench_offline_queue.py
+"""
+Benchmark: a Wi-Fi outage with the SDK's unbounded offline queue vs offline_queue.
+
+Virtual time (sim_clock). The robot publishes its usual mix on one topic:
+- a telemetry batch every 2 s, from a real TelemetryAggregator;
+- a pose every 1 s while driving;
+- a clock ping every 5 s;
+- a latency summary every 30 s;
+- the battery line every 60 s;
+- an obstacle_stop state change and a script_status ack now and then;
+- a warning log line every second.
+The session drops for --outage seconds (default 10 min) and then comes
+back. Traffic keeps flowing the whole time.
+
+before  AWSIoTMQTTClient with configureOfflinePublishQueueing(-1) and
+        configureDrainingFrequency(2): one FIFO, drained at 2 msgs/s.
+after   OfflinePublisher with DEFAULT_OFFLINE_QUEUE_CONFIG.
+
+Per mode:
+- peak queue memory, from tracemalloc and from the queue's own accounting;
+- messages kept and dropped;
+- time from reconnect until the first ack / state change is delivered;
+- time until the backlog is gone (if it ever is within --after seconds).
+
+A second case has no outage: --failures consecutive publishes fail (a
+QoS 1 timeout) while the session stays up, so the SDK never reports it
+offline. OfflinePublisher must retry on its own; reported are the
+messages delivered in the next minute and the time until nothing is
+queued.
+
+Usage: python3 bench_offline_queue.py [--outage 600] [--after 1800] [--failures 1] [--seed 0]
+"""
+
+import argparse
+import collections
+import json
+import math
+import random
+import tracemalloc
+
+from config_manager import DEFAULT_OFFLINE_QUEUE_CONFIG
+from offline_queue import ENTRY_OVERHEAD, OfflinePublisher, OfflineQueue
+from sim_clock import VirtualClock
+from telemetry import TelemetryAggregator
+
+TOPIC = "robot/bench"
+OUTAGE_START_S = 60.0
+SDK_DRAIN_INTERVAL_S = 0.5      # configureDrainingFrequency(2)
+IMPORTANT = {"script_status", "obstacle_stop"}
+
+
+class Broker:
+    """Upstream stand-in: records deliveries; raises while the session is down"""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.online = True
+        self.fail_next = 0      # Publishes that time out while the session stays up
+        self.delivered = []     # (virtual s, message type)
+
+    def publish(self, topic, payload, qos=0):
+        if not self.online:
+            raise ConnectionError("offline")
+        if self.fail_next:
+            self.fail_next -= 1
+            raise TimeoutError("publish timed out")
+        self.delivered.append((self.clock.monotonic(), json.loads(payload).get("type", "battery_percentage")))
+        return True
+
+
+class SdkQueue:
+    """configureOfflinePublishQueueing(-1) + configureDrainingFrequency(2)"""
+
+    def __init__(self, broker, clock):
+        self.broker = broker
+        self.clock = clock
+        self.queue = collections.deque()
+        self.bytes = 0
+        self.peak_bytes = 0
+        clock.call_every(SDK_DRAIN_INTERVAL_S, self._drain)
+
+    def publish(self, topic, payload, qos=0):
+        if self.broker.online and not self.queue:
+            return self.broker.publish(topic, payload, qos)
+        self.queue.append((topic, payload, qos))
+        self.bytes += len(payload) + len(topic) + ENTRY_OVERHEAD
+        self.peak_bytes = max(self.peak_bytes, self.bytes)
+        return True
+
+    def set_online(self, online):
+        self.broker.online = online
+
+    def backlog(self):
+        return len(self.queue)
+
+    def stats(self):
+        return {"peakBytes": self.peak_bytes, "dropped": 0}
+
+    def _drain(self):
+        if self.broker.online and self.queue:
+            topic, payload, qos = self.queue.popleft()
+            self.bytes -= len(payload) + len(topic) + ENTRY_OVERHEAD
+            self.broker.publish(topic, payload, qos)
+
+
+class QueuedPublisher:
+    """OfflinePublisher with its drain loop on the virtual clock instead of a thread"""
+
+    def __init__(self, broker, clock):
+        self.broker = broker
+        self.clock = clock
+        self.publisher = OfflinePublisher(broker, clock=clock)
+        self.interval = self.publisher.drain_interval
+        self._scheduled = False
+
+    def publish(self, topic, payload, qos=0):
+        queued = self.publisher.publish(topic, payload, qos)
+        self._schedule()
+        return queued
+
+    def set_online(self, online):
+        self.broker.online = online
+        self.publisher.set_online(online)
+        self._schedule()
+
+    def backlog(self):
+        return len(self.publisher.queue)
+
+    def stats(self):
+        stats = self.publisher.stats()
+        return {"peakBytes": stats["peakBytes"],
+                "dropped": sum(c["dropped"] for c in stats["classes"].values())}
+
+    def _schedule(self, delay=None):
+        # Like the drain thread: wait for next_drain_delay(), or for the next publish / set_online
+        delay = self.publisher.next_drain_delay() if delay is None else delay
+        if delay is not None and not self._scheduled:
+            self._scheduled = True
+            self.clock.call_later(delay, self._drain)
+
+    def _drain(self):
+        self._scheduled = False
+        self._schedule(self.interval if self.publisher.drain_once() else None)
+
+
+def robot_traffic(clock, publisher, seed):
+    """Schedule the robot's publishers on the virtual clock"""
+    rng = random.Random(seed)
+
+    def send(message):
+        publisher.publish(TOPIC, json.dumps(message, separators=(",", ":")), 0)
+
+    state = {"distance": [120.0, 200.0], "duty": 0.0, "battery": 90.0, "x": 0.0, "seq": 0}
+    telemetry = TelemetryAggregator(lambda payload: publisher.publish(TOPIC, payload, 0), clock=clock)
+    telemetry.add_channel("distance", ["d0", "d1", "blocked"],
+                          lambda: [d + rng.gauss(0, 3) for d in state["distance"]] + [0], scale=10, deadband=1.0)
+    telemetry.add_channel("motor", ["left", "right", "leftTarget", "rightTarget"],
+                          lambda: [state["duty"]] * 4, deadband=1.0)
+    telemetry.add_channel("battery", ["percent"], lambda: [state["battery"]], deadband=1.0)
+
+    def telemetry_step():
+        clock.call_later(telemetry.tick(), telemetry_step)
+
+    def drive():
+        state["duty"] = rng.choice([0.0, 0.0, 40.0, 60.0, -40.0])
+        state["distance"] = [rng.uniform(30, 300), rng.uniform(30, 300)]
+        state["battery"] -= 0.05
+
+    def pose():
+        state["x"] += state["duty"] / 10
+        send({"type": "pose", "x": round(state["x"], 1), "y": 0.0, "heading": 0.0, "distance": abs(state["x"]),
+              "ts": int(clock.time() * 1000)})
+
+    def ping():
+        state["seq"] += 1
+        send({"type": "clock_ping", "seq": state["seq"], "t0": round(clock.time() * 1000, 1)})
+
+    def event():
+        if rng.random() < 0.5:
+            send({"type": "obstacle_stop", "side": rng.choice(["front", "back"]), "reason": "obstacle",
+                  "distance": round(rng.uniform(10, 30), 1)})
+        else:
+            send({"type": "script_status", "id": f"dock-{state['seq']}", "status": "done", "step": 4})
+        clock.call_later(rng.expovariate(1 / 20.0), event)
+
+    clock.call_later(0.0, telemetry_step)
+    clock.call_every(3.0, drive)
+    clock.call_every(1.0, pose)
+    clock.call_every(5.0, ping)
+    clock.call_every(30.0, lambda: send({"type": "latency_summary", "unit": "us", "ts": int(clock.time() * 1000),
+                                        "stages": {"network": [12, 41000, 98000, 130000],
+                                                   "dispatch": [12, 60, 210, 400]}}))
+    clock.call_every(60.0, lambda: send({"battery_percentage": f"{state['battery']:.1f}"}))
+    clock.call_every(1.0, lambda: send({"type": "log", "level": "warning",
+                                       "msg": f"ultrasonic sensor 1 timeout (no echo) at {clock.time():.1f}"}))
+    clock.call_later(rng.expovariate(1 / 20.0), event)
+
+
+def run(mode, args):
+    clock = VirtualClock()
+    broker = Broker(clock)
+    tracemalloc.start()
+    publisher = SdkQueue(broker, clock) if mode == "before" else QueuedPublisher(broker, clock)
+    robot_traffic(clock, publisher, args.seed)
+    clock.run_until(OUTAGE_START_S)
+    publisher.set_online(False)
+    tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0]
+    clock.run_until(OUTAGE_START_S + args.outage)
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    backlog = publisher.backlog()
+    reconnect = clock.monotonic()
+    publisher.set_online(True)
+    drained_at = None
+    step = 1.0
+    while clock.monotonic() < reconnect + args.after:
+        clock.run_for(step)
+        if publisher.backlog() == 0:
+            drained_at = clock.monotonic()
+            break
+    tracemalloc.stop()
+
+    after = [(t, kind) for t, kind in broker.delivered if t >= reconnect]
+    first_important = next((t for t, kind in after if kind in IMPORTANT), None)
+    first_minute = sum(1 for t, _ in after if t < reconnect + 60)
+    stats = publisher.stats()
+    return {"mode": mode, "backlog": backlog, "peak_kb": peak / 1024, "accounted_kb": stats["peakBytes"] / 1024,
+            "dropped": stats["dropped"], "first_important_s": None if first_important is None else first_important - reconnect,
+            "drain_s": None if drained_at is None else drained_at - reconnect,
+            "left": publisher.backlog(), "first_minute": first_minute}
+
+
+def run_failure(args):
+    """Publishes fail on a live session; returns (delivered in the next minute, s until nothing is queued, failures)"""
+    clock = VirtualClock()
+    broker = Broker(clock)
+    publisher = QueuedPublisher(broker, clock)
+    robot_traffic(clock, publisher, args.seed)
+    clock.run_until(OUTAGE_START_S)
+    broker.fail_next = args.failures
+    started = clock.monotonic()
+    clear = None
+    while clock.monotonic() < started + max(60.0, args.after):
+        clock.run_for(0.1)
+        if clear is None and not broker.fail_next and publisher.backlog() == 0:
+            clear = clock.monotonic() - started
+        if clear is not None and clock.monotonic() >= started + 60:
+            break
+    minute = sum(1 for t, _ in broker.delivered if started <= t < started + 60)
+    return minute, clear, publisher.publisher.failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline publish queue benchmark (virtual time)")
+    parser.add_argument("--outage", type=float, default=600.0, help="seconds without a session")
+    parser.add_argument("--after", type=float, default=1800.0, help="how long to follow the drain after reconnect")
+    parser.add_argument("--failures", type=int, default=1, help="publishes that fail on a live session")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"outage {args.outage:.0f}s, cap {DEFAULT_OFFLINE_QUEUE_CONFIG['maxBytes'] // 1024} KiB, "
+          f"drain {DEFAULT_OFFLINE_QUEUE_CONFIG['drainPerSecond']} msgs/s (SDK: {1 / SDK_DRAIN_INTERVAL_S:.0f} msgs/s)")
+    print(f"{'mode':<7} {'queued':>7} {'dropped':>8} {'peak mem':>10} {'accounted':>10} "
+          f"{'1st ack':>8} {'drained':>9} {'sent 1st min':>13}")
+    for mode in ("before", "after"):
+        r = run(mode, args)
+        first = f"{r['first_important_s']:7.1f}s" if r["first_important_s"] is not None else f"{'-':>8}"
+        drained = f"{r['drain_s']:8.0f}s" if r["drain_s"] is not None else f"{'never':>9}"
+        line = (f"{mode:<7} {r['backlog']:>7} {r['dropped']:>8} {r['peak_kb']:8.0f}KB {r['accounted_kb']:8.0f}KB "
+                f"{first} {drained} {r['first_minute']:>13}")
+        if r["drain_s"] is None:
+            line += f"   ({r['left']} still queued after {args.after:.0f}s)"
+        print(line)
+    minute, clear, failures = run_failure(args)
+    print(f"{args.failures} failed publish(es) with the session up: {failures} failures seen, "
+          f"{minute} delivered in the next minute, "
+          + (f"queue empty after {clear:.0f}s" if clear is not None else f"still queued after {args.after:.0f}s"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+# bench_runtime.py
+"""
+Benchmark: a process / thread per worker vs one asyncio runtime (robot_runtime).
+
+Each topology runs as a freshly spawned "motor process" on the simulated GPIO
+backend, wired like motor_thread.main to a loopback MqttHub:
+
+before  sensor process + obstacle log process + battery reader process (a
+        HubClient publishing through the hub socket), and a thread each for
+        telemetry, acks, pose, clock pings, latency summary and the
+        credential watch. Commands are dispatched on the callback thread.
+        The legacy_* functions below are those old worker bodies; the robot
+        no longer has them.
+after   sensor process only. Obstacle log, battery reader and the periodic
+        publishers are tasks on one RobotRuntime; the callback thread hands
+        each command to it with runtime.submit().
+Both keep the motor driver, scheduler, obstacle watcher and hub threads.
+
+Drive commands go through motor_thread.customCallback at --rate per second.
+After a warmup, over --seconds, summed over the motor process and its children:
+- processes, threads, VmRSS and PSS (smaps_rollup; shares copy-on-write
+  pages fairly between the forked children);
+- CPU time and context switches per second (wakeups of mostly idle workers);
+- dispatch hop: callback receipt -> handle_drive_command start;
+- inter-process hops for a battery line (reader -> hub socket -> session).
+
+Usage: python3 bench_runtime.py [--seconds 10] [--warmup 3] [--rate 20]
+"""
+
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+
+HUB_PATH = "/tmp/robot_mqtt_runtime_bench.sock"
+TOPIC = "robot-bench/runtime"
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+
+
+class FakeMessage:
+    def __init__(self, payload):
+        self.payload = payload
+        self.topic = TOPIC
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def proc_usage(pid):
+    """(threads, rss kB, pss kB, cpu ticks, context switches) of one process"""
+    threads = rss = pss = 0
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("Threads:"):
+                threads = int(line.split()[1])
+            elif line.startswith("VmRSS:"):
+                rss = int(line.split()[1])
+    with contextlib.suppress(OSError), open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            if line.startswith("Pss:"):
+                pss = int(line.split()[1])
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    ticks = int(fields[11]) + int(fields[12])   # utime + stime
+    switches = 0
+    for tid in os.listdir(f"/proc/{pid}/task"):
+        with contextlib.suppress(OSError), open(f"/proc/{pid}/task/{tid}/status") as f:
+            for line in f:
+                if "ctxt_switches" in line:
+                    switches += int(line.split()[1])
+    return threads, rss, pss, ticks, switches
+
+
+def usage():
+    pids = [os.getpid()] + [child.pid for child in multiprocessing.active_children()]
+    totals = [len(pids), 0, 0, 0, 0, 0]
+    for pid in pids:
+        for i, value in enumerate(proc_usage(pid), 1):
+            totals[i] += value
+    return dict(zip(("processes", "threads", "rss_kb", "pss_kb", "ticks", "switches"), totals))
+
+
+def legacy_obstacle_log():
+    """The old obstacle_process body"""
+    import motor_thread as mt
+    while True:
+        print(mt.obstacle_report())
+        time.sleep(0.5)
+
+
+def legacy_battery_reader(hub_socket, topic, port="/dev/ttyUSB0", baudrate=9600, timeout=1):
+    """The old battery process body: its own interpreter, publishing through a HubClient"""
+    from gpio_backend import open_serial
+    from mqtt_hub import HubClient
+    client = HubClient("batteryClient", hub_socket)
+    client.connect()
+    ser = open_serial(port, baudrate, timeout=timeout)
+    while True:
+        line = ser.readline().decode("utf-8", errors="ignore").strip()
+        if line:
+            payload = json.dumps({"battery_percentage": line})
+            print(f"🔋 Publishing: {payload}")
+            client.publish(topic, payload, 0)
+            time.sleep(60)
+
+
+def legacy_thread(name, step, interval=None, woken=None):
+    """The old thread-per-worker loop: step() returns the next delay (None: wait for woken), or
+    with an interval the thread sleeps that long before every step"""
+
+    def loop():
+        while True:
+            if interval is not None:
+                time.sleep(interval)
+            try:
+                delay = step()
+            except Exception as e:
+                print(f"⚠️ Error in {name}: {e}")
+                delay = 1.0
+            if interval is not None:
+                continue
+            if delay is None:
+                woken.wait()
+                woken.clear()
+            else:
+                time.sleep(delay)
+
+    threading.Thread(target=loop, name=name, daemon=True).start()
+
+
+def run(mode, args, results):
+    os.environ["ROBOT_GPIO_BACKEND"] = "sim"
+    multiprocessing.set_start_method("fork", force=True)   # Robot children are forked, as on the Pi
+    from bench_mqtt_hub import LoopbackUpstream
+    from credential_rotation import POLL_INTERVAL_S, CredentialRotator, write_credentials
+    from mqtt_hub import MqttHub
+    from robot_runtime import RobotRuntime
+    import clock_sync
+    import command_ack
+    import latency_stats
+    import motor_thread as mt
+    import odometry
+    import read_battery_precentage
+
+    with open(os.devnull, "w") as sink, contextlib.redirect_stdout(sink):
+        hub = MqttHub(LoopbackUpstream(), HUB_PATH)
+        hub.start()
+        mt.mqtt_hub, mt.topic = hub, TOPIC
+        workdir = tempfile.mkdtemp()
+        credentials_path = os.path.join(workdir, "mqtt_data_log.json")
+        credentials = {"awsAccessKey": "AKIA0", "awsSecretKey": "secret0", "awsSessionToken": "token0",
+                       "awsHost": "loopback", "topic": TOPIC}
+        write_credentials(credentials, credentials_path)
+        rotator = CredentialRotator(hub.client, credentials, credentials_path, hub=hub)
+
+        def publish(payload):
+            hub.publish(TOPIC, payload, 0)
+
+        hops = []
+        handle_drive_command = mt.handle_drive_command
+
+        def timed_dispatch(command, received_ns, decode_start_ns, decoded_ns):
+            hops.append((time.monotonic_ns() - received_ns) / 1000.0)
+            handle_drive_command(command, received_ns, decode_start_ns, decoded_ns)
+
+        mt.handle_drive_command = timed_dispatch
+        mt.start_motor_driver()
+        mt.start_obstacle_watcher()
+        mt.ack_batcher = command_ack.AckBatcher(lambda payload: hub.publish(TOPIC + "/ack", payload, 0), mt.clock)
+        telemetry = mt.start_telemetry(publish)
+        ultrasonic = multiprocessing.Process(target=mt.measure_distance, args=(mt.open_sensor_snapshot(), mt.obstacle_gate))
+        ultrasonic.start()
+
+        if mode == "before":
+            legacy_thread("latency-summary", lambda: latency_stats.publish_summary(publish), interval=30.0)
+            acks_woken = threading.Event()
+            mt.ack_batcher.wake = acks_woken.set
+            legacy_thread("command-acks", mt.ack_batcher.tick, woken=acks_woken)
+            legacy_thread("telemetry", telemetry.tick)
+            legacy_thread("clock-ping", clock_sync.ping_sender(mt.link_clock, mt.publish_message))
+            legacy_thread("pose-publisher", odometry.pose_publisher(mt.odometry, mt.publish_message), interval=1.0)
+            legacy_thread("credential-watch", rotator.check, interval=POLL_INTERVAL_S)
+            multiprocessing.Process(target=legacy_obstacle_log, daemon=True).start()
+            multiprocessing.Process(target=legacy_battery_reader, args=(HUB_PATH, TOPIC), daemon=True).start()
+            battery_hops = 1    # Reader process -> hub socket -> session
+        else:
+            mt.runtime = runtime = RobotRuntime()
+            runtime.start()
+            runtime.every("credential-watch", POLL_INTERVAL_S, rotator.check, blocking=True)
+            runtime.every("latency-summary", 30.0, lambda: latency_stats.publish_summary(publish))
+            mt.ack_batcher.wake = lambda: runtime.wake("command-acks")
+            runtime.ticker("command-acks", mt.ack_batcher.tick)
+            runtime.ticker("telemetry", telemetry.tick)
+            runtime.ticker("clock-ping", clock_sync.ping_sender(mt.link_clock, mt.publish_message))
+            runtime.every("pose", 1.0, odometry.pose_publisher(mt.odometry, mt.publish_message))
+            runtime.every("obstacle-monitor", 0.5, mt.log_obstacles)
+            runtime.spawn("battery", read_battery_precentage.poll_battery_status(publish, on_level=mt.on_battery_level))
+            battery_hops = 0
+
+        stop = threading.Event()
+
+        def feed():
+            # The SDK's callback thread
+            keys = ["ArrowUp", "ArrowLeft", "ArrowDown", "ArrowRight"]
+            i = 0
+            while not stop.wait(1.0 / args.rate):
+                payload = json.dumps({"key": keys[i % len(keys)], "timestamp": int(time.time() * 1000),
+                                      "duration": 0.05}).encode()
+                mt.customCallback(None, None, FakeMessage(payload))
+                i += 1
+
+        feeder = threading.Thread(target=feed, name="sdk-callback", daemon=True)
+        feeder.start()
+        time.sleep(args.warmup)
+        hops.clear()
+        start, started = usage(), time.monotonic()
+        time.sleep(args.seconds)
+        end, elapsed = usage(), time.monotonic() - started
+        stop.set()
+        feeder.join()
+        lag = mt.runtime.stats()["maxLagMs"] if mt.runtime else None
+        hub_clients = hub.stats()["clients"]
+        if mt.runtime:
+            mt.runtime.stop()
+        mt.motor_stop(immediate=True)
+        for child in multiprocessing.active_children():
+            child.terminate()
+            child.join()
+        mt.close_sensor_snapshot()
+        hub.shutdown()
+
+    results.put({"mode": mode, "processes": end["processes"], "threads": end["threads"],
+                 "rss_mb": end["rss_kb"] / 1024, "pss_mb": end["pss_kb"] / 1024,
+                 "cpu_pct": (end["ticks"] - start["ticks"]) / CLOCK_TICKS / elapsed * 100,
+                 "switches_s": (end["switches"] - start["switches"]) / elapsed,
+                 "hop_p50": percentile(hops, 50), "hop_p99": percentile(hops, 99), "commands": len(hops),
+                 "battery_hops": battery_hops, "hub_clients": hub_clients, "lag_ms": lag})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-worker processes/threads vs one asyncio runtime")
+    parser.add_argument("--seconds", type=float, default=10.0, help="measurement window")
+    parser.add_argument("--warmup", type=float, default=3.0)
+    parser.add_argument("--rate", type=float, default=20.0, help="drive commands per second")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    rows = []
+    for mode in ("before", "after"):
+        results = context.Queue()
+        robot = context.Process(target=run, args=(mode, args, results))
+        robot.start()
+        rows.append(results.get(timeout=args.warmup + args.seconds + 60))
+        robot.join()
+
+    print(f"{args.seconds:.0f}s window, {args.rate:.0f} commands/s, simulated GPIO")
+    print(f"{'mode':<7} {'procs':>5} {'threads':>7} {'RSS':>8} {'PSS':>8} {'CPU':>6} {'ctxsw/s':>8} "
+          f"{'hop p50':>8} {'hop p99':>8} {'battery IPC':>11} {'hub clients':>11}")
+    for r in rows:
+        print(f"{r['mode']:<7} {r['processes']:>5} {r['threads']:>7} {r['rss_mb']:6.1f}MB {r['pss_mb']:6.1f}MB "
+              f"{r['cpu_pct']:5.1f}% {r['switches_s']:8.0f} {r['hop_p50']:6.0f}us {r['hop_p99']:6.0f}us "
+              f"{r['battery_hops']:>11} {r['hub_clients']:>11}")
+    before, after = rows
+    print(f"after vs before: {before['processes'] - after['processes']} fewer processes, "
+          f"{before['threads'] - after['threads']} fewer threads, "
+          f"RSS -{before['rss_mb'] - after['rss_mb']:.1f} MB, PSS -{before['pss_mb'] - after['pss_mb']:.1f} MB; "
+          f"runtime max loop lag {after['lag_ms']:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
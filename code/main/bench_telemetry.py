@@ -0,0 +1,119 @@
+# bench_telemetry.py
+"""
+Benchmark: per-sample JSON telemetry vs the batched, delta-encoded publisher.
+
+Runs the bench_soak operator scenario on sim_harness.SimulatedRobot in
+virtual time, with motor_thread.start_telemetry() sampling the real
+channels (filtered distances, motor duties, battery, latency). The battery
+drains slowly so that channel changes too.
+
+before  Every sample is its own compact JSON publish, e.g.
+        {"type":"motor","left":40,"right":40,...}, at the channel's rate.
+after   TelemetryAggregator batches: deadband, integer deltas, one message
+        per publishIntervalS at most, capped at maxPublishesPerMin.
+
+Reports messages and bytes per minute for both, the largest batch, and
+checks that decode_batch() reproduces every published sample within the
+channel's quantization step.
+
+Usage: python3 bench_telemetry.py [--minutes 10] [--seed 0] [--config telemetry_config.json]
+"""
+
+import argparse
+import json
+import math
+
+from bench_soak import operator_scenario
+from sim_harness import SimulatedRobot  # Selects the sim GPIO backend before motor_thread loads
+
+import motor_thread as mt
+from config_manager import DEFAULT_TELEMETRY_CONFIG
+from telemetry import decode_batch
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batched telemetry benchmark")
+    parser.add_argument("--minutes", type=float, default=10.0, help="simulated duration")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--config", help="telemetry config JSON overriding the defaults")
+    args = parser.parse_args()
+
+    config = json.loads(json.dumps(DEFAULT_TELEMETRY_CONFIG))
+    if args.config:
+        with open(args.config) as f:
+            overrides = json.load(f)
+        config["sampleHz"].update(overrides.pop("sampleHz", {}))
+        config.update(overrides)
+
+    seconds = args.minutes * 60
+    robot = SimulatedRobot(seed=args.seed)
+    clock = robot.clock
+    batches = []
+    telemetry = mt.start_telemetry(batches.append, config)
+
+    # Wrap every channel: the naive publisher sends each sample as it is taken
+    naive = {"messages": 0, "bytes": 0}
+    raw = {}   # (channel, epoch ms) -> sampled values
+
+    def wrap(channel):
+        sample = channel.sample
+
+        def sampled():
+            values = sample()
+            if values is not None:
+                message = dict(zip(channel.fields, values), type=channel.name)
+                naive["messages"] += 1
+                naive["bytes"] += len(json.dumps(message, separators=(",", ":")))
+                raw[(channel.name, int(clock.time() * 1000))] = values
+            return values
+
+        channel.sample = sampled
+
+    for channel in telemetry.channels.values():
+        wrap(channel)
+
+    def step():
+        clock.call_later(telemetry.tick(), step)
+
+    clock.call_later(0.0, step)
+    mt.battery_level = 100.0
+    clock.call_every(60.0, lambda: mt.on_battery_level(mt.battery_level - 0.4))
+
+    commands, obstacles = operator_scenario(seconds, args.seed)
+    try:
+        robot.schedule_commands(commands)
+        robot.schedule_obstacles(obstacles)
+        stats = robot.run(seconds)
+    finally:
+        robot.close()
+
+    # Round trip: every decoded sample matches what was sampled at that instant
+    schema, decoded, errors = None, 0, 0
+    for payload in batches:
+        message = json.loads(payload)
+        schema = message.get("schema", schema)
+        for name, (fields, samples) in decode_batch(message, schema).items():
+            step_size = 1.0 / schema[name]["scale"]
+            for ms, values in samples:
+                decoded += 1
+                expected = raw.get((name, ms))
+                if expected is None or any(
+                        abs(value - (0.0 if original is None or math.isnan(original) else original)) > step_size / 2 + 1e-9
+                        for value, original in zip(values, expected)):
+                    errors += 1
+
+    minutes = stats["sim_s"] / 60
+    batch_bytes = sum(len(payload) for payload in batches)
+    print(f"simulated {stats['sim_s']:.0f}s in {stats['wall_s']:.1f}s wall, channels {list(telemetry.channels)}")
+    print(f"{'mode':<7} {'msgs/min':>9} {'bytes/min':>10} {'samples':>8}")
+    print(f"{'before':<7} {naive['messages'] / minutes:9.1f} {naive['bytes'] / minutes:10.0f} {naive['messages']:>8}")
+    print(f"{'after':<7} {len(batches) / minutes:9.1f} {batch_bytes / minutes:10.0f} {telemetry.kept:>8}")
+    print(f"largest batch {max((len(p) for p in batches), default=0)} B, "
+          f"cap {config['maxPublishesPerMin']} msgs/min, "
+          f"reduction {naive['bytes'] / max(batch_bytes, 1):.1f}x bytes, "
+          f"{naive['messages'] / max(len(batches), 1):.1f}x messages")
+    print(f"round trip: {decoded} samples decoded, {errors} mismatches")
+
+
+if __name__ == "__main__":
+    main()
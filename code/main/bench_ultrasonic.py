@@ -0,0 +1,129 @@
+# bench_ultrasonic.py
+"""
+Benchmark: edge-timed vs busy-wait HC-SR04 echo measurement.
+
+Uses the simulated GPIO echo source: every trigger produces an echo pulse
+whose width matches the configured distance.
+
+1. Single sensor: for each mode the sensor is sampled at the ultrasonic
+   process cadence; reports process CPU time per measurement, CPU share at
+   that cadence, and the error and jitter (standard deviation) of the
+   measured distance.
+2. Arrays of N sensors facing evenly around the robot: per-sensor sample
+   rate of the old sequential loop (fixed 50 ms / 100 ms sleeps) against
+   the staggered UltrasonicArray schedule.
+
+Usage: python3 bench_ultrasonic.py [--samples 200] [--distance 100] [--gap 0.05]
+                                   [--arrays 2,4,6] [--seconds 3]
+"""
+
+import argparse
+import os
+import statistics
+import time
+
+os.environ["ROBOT_GPIO_BACKEND"] = "sim"
+
+from gpio_backend import SimulatedGPIO  # noqa: E402
+from ultrasonic_array import UltrasonicArray  # noqa: E402
+from ultrasonic_echo import EchoSensor  # noqa: E402
+
+TRIG, ECHO = 5, 6
+ARRAY_PINS = [(5, 6), (24, 25), (16, 20), (12, 26), (7, 8), (9, 11), (14, 15), (10, 21)]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def run(mode, samples, distance, gap):
+    gpio = SimulatedGPIO()
+    sensor = EchoSensor(gpio, TRIG, ECHO)
+    gpio.set_echo_distance(TRIG, ECHO, distance)
+    measure = sensor.measure if mode == "edge" else sensor.measure_polling
+    measure()   # Warm up the simulated event thread
+    readings = []
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    busy = 0.0
+    for _ in range(samples):
+        cpu = time.process_time()
+        value = measure()
+        busy += time.process_time() - cpu
+        if value is not None:
+            readings.append(value)
+        time.sleep(gap)
+    cpu_total = time.process_time() - cpu_start
+    wall_total = time.perf_counter() - wall_start
+    return readings, busy / samples, cpu_total / wall_total
+
+
+def make_array_config(count):
+    sensors = [{"name": f"s{i}", "trig": trig, "echo": echo, "facing": i * 360.0 / count}
+               for i, (trig, echo) in enumerate(ARRAY_PINS[:count])]
+    return {"sensors": sensors, "crosstalkAngleDeg": 90, "minPeriodS": 0.06, "settleS": 0.01}
+
+
+def run_sequential(count, distance, seconds):
+    """The previous loop: one sensor at a time, 50 ms after each, 100 ms per cycle"""
+    gpio = SimulatedGPIO()
+    config = make_array_config(count)
+    sensors = [EchoSensor(gpio, s["trig"], s["echo"]) for s in config["sensors"]]
+    for sensor in sensors:
+        gpio.set_echo_distance(sensor.trig_pin, sensor.echo_pin, distance)
+    samples = 0
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        for sensor in sensors:
+            sensor.measure()
+            samples += 1
+            time.sleep(0.05)
+        time.sleep(0.1)
+    return [samples / count / seconds] * count, [[i] for i in range(count)]
+
+
+def run_scheduled(count, distance, seconds):
+    gpio = SimulatedGPIO()
+    array = UltrasonicArray.from_config(gpio, make_array_config(count))
+    for sensor in array.sensors:
+        gpio.set_echo_distance(sensor.trig_pin, sensor.echo_pin, distance)
+    array.rates()
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        array.next_slot()
+    return array.rates(), array.slots
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ultrasonic echo timing benchmark")
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--distance", type=float, default=100.0, help="simulated obstacle (cm)")
+    parser.add_argument("--gap", type=float, default=0.05, help="sleep between readings (s)")
+    parser.add_argument("--arrays", default="2,4,6", help="comma-separated sensor counts")
+    parser.add_argument("--seconds", type=float, default=3.0, help="run time per array schedule")
+    args = parser.parse_args()
+
+    print(f"simulated obstacle at {args.distance:.0f} cm, {args.samples} samples, {args.gap * 1000:.0f} ms gap")
+    print(f"{'mode':<8} {'cpu/meas':>9} {'cpu %':>6} {'mean err':>9} {'jitter':>7} {'p99 err':>8} {'invalid':>8}")
+    for mode in ("polling", "edge"):
+        readings, cpu_per, cpu_share = run(mode, args.samples, args.distance, args.gap)
+        invalid = args.samples - len(readings)
+        if not readings:
+            print(f"{mode:<8} {cpu_per * 1000:7.2f}ms {cpu_share * 100:5.1f}% {'-':>9} {'-':>7} {'-':>8} {invalid:>8}")
+            continue
+        errors = [abs(r - args.distance) for r in readings]
+        jitter = statistics.pstdev(readings)
+        print(f"{mode:<8} {cpu_per * 1000:7.2f}ms {cpu_share * 100:5.1f}% "
+              f"{statistics.mean(readings) - args.distance:+7.2f}cm {jitter:5.2f}cm "
+              f"{percentile(errors, 99):6.2f}cm {invalid:>8}")
+
+    print()
+    print(f"{'sensors':>7} {'schedule':<10} {'min Hz':>7} {'max Hz':>7} {'total Hz':>9}  slots")
+    for count in (int(c) for c in args.arrays.split(",")):
+        for name, run_array in (("sequential", run_sequential), ("staggered", run_scheduled)):
+            rates, slots = run_array(count, args.distance, args.seconds)
+            print(f"{count:>7} {name:<10} {min(rates):7.1f} {max(rates):7.1f} {sum(rates):9.1f}  {slots}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# bench_wheel_encoder.py
+"""
+Benchmark: wheel encoder edge handling against simulated pulse trains.
+
+1. Handler cost: calls the edge callbacks directly and reports ns/edge and
+   the memory allocated per edge (tracemalloc) for single and quadrature.
+2. Pulse trains: drives a quadrature encoder through the simulated GPIO
+   bus at increasing tick rates and reports edges captured vs generated,
+   estimated speed vs true speed and the final position error.
+
+Usage: python3 bench_wheel_encoder.py [--edges 200000] [--rates 500,2000,5000]
+"""
+
+import argparse
+import os
+import time
+import tracemalloc
+
+os.environ["ROBOT_GPIO_BACKEND"] = "sim"
+
+from gpio_backend import SimulatedGPIO  # noqa: E402
+from wheel_encoder import WheelEncoder  # noqa: E402
+
+TICKS_PER_CM = 12.0
+
+
+def bench_handler(edges, quadrature):
+    gpio = SimulatedGPIO()
+    encoder = WheelEncoder(gpio, 17, 18 if quadrature else None, ticks_per_cm=TICKS_PER_CM)
+    handler = encoder._on_edge_quadrature if quadrature else encoder._on_edge_single
+    for _ in range(1000):
+        handler(17)   # Warm up
+    start = time.perf_counter_ns()
+    for _ in range(edges):
+        handler(17)
+    elapsed = time.perf_counter_ns() - start
+    # Memory is measured in a separate pass; tracemalloc slows every call down
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    for _ in range(edges):
+        handler(17)
+    after, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed / edges, (after - before) / edges, peak - before
+
+
+def bench_pulse_train(tick_rate, seconds):
+    """Quadrature forward motion at tick_rate A-edges per second"""
+    gpio = SimulatedGPIO()
+    encoder = WheelEncoder(gpio, 17, 18, ticks_per_cm=TICKS_PER_CM)
+    period_ns = int(1e9 / tick_rate)
+    start = time.monotonic_ns() + 10_000_000
+    total = int(tick_rate * seconds)
+    # A toggles every period; B toggles a quarter period later (A leads B = forward)
+    level = 0
+    for i in range(total):
+        level ^= 1
+        at = start + i * period_ns
+        gpio.schedule_input(at, 17, level)
+        gpio.schedule_input(at + period_ns // 2, 18, level)
+    time.sleep(seconds * 0.5 + 0.01)
+    true_speed = tick_rate / TICKS_PER_CM
+    mid_speed = encoder.speed_cm_s()
+    time.sleep(seconds * 0.5 + 0.3)
+    return encoder.edges, total, mid_speed, true_speed, encoder.count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Wheel encoder benchmark")
+    parser.add_argument("--edges", type=int, default=200000, help="direct handler calls")
+    parser.add_argument("--rates", default="500,2000,5000", help="comma-separated A-edge rates (Hz)")
+    parser.add_argument("--seconds", type=float, default=1.0, help="pulse train length")
+    args = parser.parse_args()
+
+    for quadrature in (False, True):
+        ns, per_edge, peak = bench_handler(args.edges, quadrature)
+        name = "quadrature" if quadrature else "single"
+        print(f"handler {name:<10}: {ns:7.0f} ns/edge (~{1e9 / ns:,.0f} edges/s)  "
+              f"retained {per_edge:.3f} B/edge  peak {peak} B")
+
+    print(f"{'rate Hz':>8} {'captured':>9} {'sent':>7} {'speed est':>10} {'true':>8} {'pos err':>8}")
+    for rate in (int(r) for r in args.rates.split(",")):
+        captured, sent, speed, true_speed, count = bench_pulse_train(rate, args.seconds)
+        print(f"{rate:>8} {captured:>9} {sent:>7} {speed:>8.1f}cm/s {true_speed:>6.1f}cm/s "
+              f"{count - sent:>8}")
+
+
+if __name__ == "__main__":
+    main()
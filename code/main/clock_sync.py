@@ -0,0 +1,182 @@
+# clock_sync.py
+"""
+NTP-style clock offset / drift estimation between the robot and its controllers.
+
+The robot publishes {"type":"clock_ping","seq":n,"t0":robot_ms} on its topic;
+a controller answers with {"type":"clock_pong","seq":n,"t0":..,"t1":recv_ms,
+"t2":send_ms,"sender":id} (see make_pong). Each exchange gives
+
+    offset = ((t1 - t0) + (t2 - t3)) / 2     controller clock - robot clock
+    delay  = (t3 - t0) - (t2 - t1)           network round trip
+
+Per controller we keep a short window of exchanges, take the offset of the
+minimum-delay one (the least queued, like NTP's clock filter) and fit the
+drift across the good ones. Command timestamps are then mapped onto the
+robot clock before the staleness check, and one-way latency is delay / 2.
+
+The robot side of every exchange uses robot_now_ms(), a wall-clock anchored
+monotonic clock, so NTP steps on the Pi itself do not disturb the estimate.
+
+Estimators are keyed by str(sender), so a JSON "1" and a binary 1 meet.
+Pongs without a sender id (or from the anonymous id 0) are ignored: their
+offsets would mix several controllers' clocks in one estimate. Commands
+from such senders are aged by the raw wall-clock comparison.
+"""
+
+import collections
+import threading
+import time
+
+_ANCHOR_WALL_MS = time.time() * 1000.0
+_ANCHOR_MONO_NS = time.monotonic_ns()
+
+WINDOW = 16
+MIN_DRIFT_SPAN_MS = 20_000
+MAX_DRIFT = 500e-6           # 500 ppm; anything larger is a bad fit, not a real crystal
+MAX_DELAY_MS = 5_000
+
+
+def sender_key(sender):
+    """Estimator key for a controller id, or None for a missing / anonymous one"""
+    if sender is None:
+        return None
+    key = str(sender).strip()
+    return None if key in ("", "0") else key
+
+
+def robot_now_ms():
+    """Milliseconds since the epoch, advancing monotonically from process start"""
+    return _ANCHOR_WALL_MS + (time.monotonic_ns() - _ANCHOR_MONO_NS) / 1e6
+
+
+def make_pong(ping, received_ms, sender):
+    """Controller side: answer a clock_ping (received_ms = controller clock at receipt, sender = its non-zero id)"""
+    return {"type": "clock_pong", "seq": ping["seq"], "t0": ping["t0"],
+            "t1": received_ms, "t2": time.time() * 1000.0, "sender": sender}
+
+
+class ClockOffsetEstimator:
+    """Offset/drift of one controller's clock relative to the robot clock"""
+
+    def __init__(self, window=WINDOW):
+        self._samples = collections.deque(maxlen=window)   # (robot ms, offset ms, delay ms)
+        self.offset_ms = 0.0
+        self.offset_at_ms = 0.0
+        self.drift = 0.0
+        self.delay_ms = None
+
+    @property
+    def ready(self):
+        return bool(self._samples)
+
+    def add_exchange(self, t0, t1, t2, t3):
+        """Feed one ping exchange; returns False if it was discarded"""
+        delay = (t3 - t0) - (t2 - t1)
+        if delay < 0 or delay > MAX_DELAY_MS:
+            return False
+        offset = ((t1 - t0) + (t2 - t3)) / 2.0
+        self._samples.append((t3, offset, delay))
+        self._update()
+        return True
+
+    def _update(self):
+        samples = self._samples
+        best = min(samples, key=lambda s: s[2])
+        self.offset_at_ms, self.offset_ms, self.delay_ms = best
+        # Drift from the exchanges that were not badly queued
+        good = [s for s in samples if s[2] <= best[2] * 2 + 2]
+        span = good[-1][0] - good[0][0] if len(good) >= 3 else 0
+        if span < MIN_DRIFT_SPAN_MS:
+            self.drift = 0.0
+            return
+        n = len(good)
+        mean_t = sum(s[0] for s in good) / n
+        mean_o = sum(s[1] for s in good) / n
+        var = sum((s[0] - mean_t) ** 2 for s in good)
+        cov = sum((s[0] - mean_t) * (s[1] - mean_o) for s in good)
+        drift = cov / var if var else 0.0
+        self.drift = max(-MAX_DRIFT, min(MAX_DRIFT, drift))
+
+    def offset_at(self, robot_ms):
+        return self.offset_ms + self.drift * (robot_ms - self.offset_at_ms)
+
+    def to_robot_ms(self, controller_ms, robot_ms=None):
+        """Map a controller timestamp onto the robot clock"""
+        robot_ms = robot_now_ms() if robot_ms is None else robot_ms
+        return controller_ms - self.offset_at(robot_ms)
+
+    def one_way_ms(self):
+        return None if self.delay_ms is None else self.delay_ms / 2.0
+
+
+class ClockSync:
+    """Robot side: issues pings, consumes pongs and corrects command ages per sender"""
+
+    def __init__(self, clock=time):
+        self._clock = clock     # Wall time for senders without an exchange yet (sim_clock in tests)
+        self._lock = threading.Lock()
+        self._estimators = {}
+        self._seq = 0
+        self._outstanding = collections.OrderedDict()   # seq -> t0
+
+    def make_ping(self):
+        with self._lock:
+            self._seq += 1
+            t0 = robot_now_ms()
+            self._outstanding[self._seq] = t0
+            while len(self._outstanding) > 32:
+                self._outstanding.popitem(last=False)
+            ping = {"type": "clock_ping", "seq": self._seq, "t0": round(t0, 1)}
+            owd = {sender: round(est.one_way_ms(), 1)
+                   for sender, est in self._estimators.items() if est.ready}
+            if owd:
+                # Piggy-back the current one-way latency estimate per controller
+                ping["oneWayMs"] = owd
+            return ping
+
+    def handle_pong(self, msg_data):
+        t3 = robot_now_ms()
+        with self._lock:
+            t0 = self._outstanding.get(msg_data.get("seq"))
+            if t0 is None:
+                return False
+            sender = sender_key(msg_data.get("sender"))
+            if sender is None:
+                return False
+            estimator = self._estimators.get(sender)
+            if estimator is None:
+                estimator = self._estimators[sender] = ClockOffsetEstimator()
+            # Use our own record of t0; the echoed one may have been rounded
+            return estimator.add_exchange(t0, float(msg_data["t1"]), float(msg_data["t2"]), t3)
+
+    def command_age_ms(self, timestamp, sender=0):
+        """Age of a command on the robot clock, corrected for the sender's clock offset"""
+        with self._lock:
+            estimator = self._estimators.get(sender_key(sender))
+            if estimator is None or not estimator.ready:
+                # No exchange yet with this sender: fall back to the raw wall-clock comparison
+                return self._clock.time() * 1000.0 - timestamp
+            now = robot_now_ms()
+            return now - estimator.to_robot_ms(timestamp, now)
+
+    def report(self):
+        with self._lock:
+            return {sender: {"offsetMs": round(est.offset_ms, 1),
+                                  "oneWayMs": round(est.one_way_ms(), 1),
+                                  "driftPpm": round(est.drift * 1e6, 1)}
+                    for sender, est in self._estimators.items() if est.ready}
+
+
+def ping_sender(clock, publish, interval=5.0, fast_pings=8, fast_interval=1.0):
+    """A step that publishes one clock ping and returns the delay until the next"""
+    sent = [0]
+
+    def step():
+        try:
+            publish(clock.make_ping())
+        except Exception as e:
+            print(f"⚠️ Error publishing clock ping: {e}")
+        sent[0] += 1
+        return fast_interval if sent[0] < fast_pings else interval
+
+    return step
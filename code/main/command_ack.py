@@ -0,0 +1,203 @@
+# command_ack.py
+"""
+Batched drive-command acknowledgements and controller-side RTT percentiles.
+
+Robot side: AckBatcher follows every drive command from receipt until its
+wheel targets reach the pins (MotorDriver.on_applied). It can also end
+rejected by the obstacle gate, dropped as stale, or finished without
+actuation (stop). The finished acks are coalesced and published on the
+reply topic (<robot topic> + ACK_TOPIC_SUFFIX, announced by "acks": 1 in
+robot_capabilities). There is at most one message per FLUSH_INTERVAL_S,
+however fast the operators send:
+
+    {"type": "ack", "v": 1, "t": robot epoch ms,
+     "acks": {"<sender>": [[seq, status, age_ms, exec_ms], ...]},
+     "coalesced": {"<sender>": [count, lowest seq, highest seq]}}
+
+- age_ms: time on the robot from receipt to this publish (queueing + batching).
+- exec_ms: receipt to actuation, or -1 if nothing was actuated.
+- Status values: EXECUTED, REJECTED, STALE, TIMEOUT (targets never
+  applied within ACTUATION_TIMEOUT_S) or COLLAPSED (a late command
+  replaced by a newer one from the same sender, see command_filter).
+- Past MAX_ACKS_PER_SENDER in one batch, a sender's oldest acks only
+  count towards "coalesced".
+Both times are robot-local differences, so no clock sync is needed.
+
+Controller side: AckTracker records when each seq was sent and turns acks
+into per-robot LatencyRecorder histograms:
+    rtt      send -> ack arrival (what the operator feels)
+    network  rtt minus the robot's age_ms (both network legs)
+    exec     robot receipt -> actuation
+    feedback send -> actuation, as far as the controller can tell (rtt - age + exec)
+"""
+
+import json
+import threading
+import time
+
+from latency_stats import LatencyRecorder
+
+ACK_TOPIC_SUFFIX = "/ack"
+FLUSH_INTERVAL_S = 0.1          # Coalescing window; bounds ack messages to 10/s per robot
+MAX_ACKS_PER_SENDER = 32        # Per batch; older ones are only counted
+ACTUATION_TIMEOUT_S = 1.0
+PENDING_LIMIT = 1024            # Commands awaiting actuation (a stuck driver must not grow this)
+
+EXECUTED, REJECTED, STALE, TIMEOUT, COLLAPSED = range(5)
+STATUS_NAMES = ("executed", "rejected", "stale", "timeout", "collapsed")
+TRACKER_STAGES = ("rtt", "network", "exec", "feedback")
+
+
+class AckBatcher:
+    def __init__(self, publish, clock=time, flush_interval=FLUSH_INTERVAL_S, wake=None):
+        """publish(payload) sends one JSON string on the reply topic; wake() is called when acks start coming"""
+        self.publish = publish
+        self.wake = wake
+        self.clock = clock
+        self.flush_interval = flush_interval
+        self.pending = {}           # received_ns -> (sender, seq)
+        self.ready = []             # (sender, seq, status, received_ns, actuated_ns or None)
+        self.published = 0
+        self.acked = 0
+        self.coalesced = 0
+        self._cond = threading.Condition()
+
+    # --- command lifecycle (motor process) ---
+    def received(self, command, received_ns):
+        if received_ns is None or command.seq is None:
+            return   # Nothing a controller could match the ack to
+        with self._cond:
+            idle = not self.pending and not self.ready
+            if len(self.pending) >= PENDING_LIMIT:
+                self._expire(self.clock.monotonic_ns(), force=True)
+            self.pending[received_ns] = (command.sender, command.seq)
+            self._cond.notify()   # Arms the flush loop's actuation timeout
+        if idle and self.wake:
+            self.wake()
+
+    def resolve(self, received_ns, status):
+        """The command ended without (further) actuation: rejected, stale or a plain stop"""
+        self._finish(received_ns, status, self.clock.monotonic_ns() if status == EXECUTED else None)
+
+    def actuated(self, received_ns):
+        """MotorDriver.on_applied: the command's targets are on the pins"""
+        self._finish(received_ns, EXECUTED, self.clock.monotonic_ns())
+
+    def _finish(self, received_ns, status, actuated_ns):
+        with self._cond:
+            entry = self.pending.pop(received_ns, None)
+            if entry is None:
+                return
+            self.ready.append((entry[0], entry[1], status, received_ns, actuated_ns))
+            self._cond.notify()
+
+    # --- batching ---
+    def flush(self):
+        """Publish everything finished (and time out stuck commands); returns the payload or None"""
+        now_ns = self.clock.monotonic_ns()
+        with self._cond:
+            self._expire(now_ns)
+            ready, self.ready = self.ready, []
+        if not ready:
+            return None
+        by_sender = {}
+        for sender, seq, status, received_ns, actuated_ns in ready:
+            by_sender.setdefault(sender, []).append(
+                [seq, status, round((now_ns - received_ns) / 1e6, 1),
+                 -1 if actuated_ns is None else round((actuated_ns - received_ns) / 1e6, 1)])
+        message = {"type": "ack", "v": 1, "t": int(self.clock.time() * 1000), "acks": {}}
+        for sender, acks in by_sender.items():
+            if len(acks) > MAX_ACKS_PER_SENDER:
+                skipped = acks[:-MAX_ACKS_PER_SENDER]
+                acks = acks[-MAX_ACKS_PER_SENDER:]
+                seqs = [ack[0] for ack in skipped]
+                message.setdefault("coalesced", {})[str(sender)] = [len(skipped), min(seqs), max(seqs)]
+                self.coalesced += len(skipped)
+            message["acks"][str(sender)] = acks
+            self.acked += len(acks)
+        payload = json.dumps(message, separators=(",", ":"))
+        try:
+            self.publish(payload)
+            self.published += 1
+        except Exception as e:
+            print(f"⚠️ Error publishing command acks: {e}")
+        return payload
+
+    def _expire(self, now_ns, force=False):
+        deadline = now_ns - ACTUATION_TIMEOUT_S * 1e9
+        for received_ns in [ns for ns in self.pending if force or ns < deadline]:
+            sender, seq = self.pending.pop(received_ns)
+            self.ready.append((sender, seq, TIMEOUT, received_ns, None))
+            if force:
+                break
+
+    def tick(self):
+        """Flush for a RobotRuntime ticker: again in one window while commands are in flight, else when woken"""
+        self.flush()
+        with self._cond:
+            busy = self.pending or self.ready
+        return self.flush_interval if busy else None
+
+
+class AckTracker:
+    """Controller side: RTT / execution percentiles per robot from the ack stream"""
+
+    def __init__(self, sender=0, clock=time, window=4096):
+        self.sender = sender
+        self.clock = clock
+        self.window = window        # Unacked sends remembered per robot
+        self.robots = {}            # robot -> {"sent": {seq: t}, "latency": LatencyRecorder, "status": [..], ...}
+
+    def _robot(self, robot):
+        state = self.robots.get(robot)
+        if state is None:
+            state = self.robots[robot] = {"sent": {}, "latency": LatencyRecorder(TRACKER_STAGES),
+                                          "status": [0] * len(STATUS_NAMES), "coalesced": 0, "unknown": 0,
+                                          "messages": 0}
+        return state
+
+    def sent(self, robot, seq, sent_at=None):
+        """Call when a drive command with this seq goes out"""
+        state = self._robot(robot)
+        sent = state["sent"]
+        sent[seq] = self.clock.monotonic() if sent_at is None else sent_at
+        if len(sent) > self.window:
+            del sent[next(iter(sent))]
+
+    def handle(self, robot, message, arrival=None):
+        """Feed one ack message (dict or JSON) from robot's reply topic"""
+        if isinstance(message, (str, bytes)):
+            message = json.loads(message)
+        arrival = self.clock.monotonic() if arrival is None else arrival
+        state = self._robot(robot)
+        state["messages"] += 1
+        latency = state["latency"]
+        for seq, status, age_ms, exec_ms in message["acks"].get(str(self.sender), ()):
+            state["status"][status] += 1
+            sent_at = state["sent"].pop(seq, None)
+            if exec_ms >= 0:
+                latency.record("exec", exec_ms * 1000)
+            if sent_at is None:
+                state["unknown"] += 1
+                continue
+            rtt_ms = (arrival - sent_at) * 1000
+            latency.record("rtt", rtt_ms * 1000)
+            latency.record("network", (rtt_ms - age_ms) * 1000)
+            if exec_ms >= 0:
+                latency.record("feedback", (rtt_ms - age_ms + exec_ms) * 1000)
+        coalesced = message.get("coalesced", {}).get(str(self.sender))
+        if coalesced:
+            count, low, high = coalesced
+            state["coalesced"] += count
+            for seq in [s for s in state["sent"] if low <= s <= high]:
+                del state["sent"][seq]
+
+    def summary(self, robot):
+        """{"rtt": {n, p50, p90, p99, max, mean (us)}, ..., "status": {...}, "unacked": n}"""
+        state = self._robot(robot)
+        summary = state["latency"].snapshot()
+        summary["status"] = dict(zip(STATUS_NAMES, state["status"]))
+        summary["coalesced"] = state["coalesced"]
+        summary["unacked"] = len(state["sent"])
+        summary["messages"] = state["messages"]
+        return summary
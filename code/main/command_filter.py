@@ -0,0 +1,171 @@
+# command_filter.py
+"""
+Duplicate suppression and late-burst collapsing for drive commands.
+
+Commands arrive at QoS 1. After a reconnect the broker may deliver some of
+them again, and whatever the SDK queued during a Wi-Fi blip arrives as one
+burst. Each command in that burst is younger than the 2 s staleness limit,
+so without this module the robot drives through every queued key repeat,
+one after another.
+
+SequenceFilter: each controller (DriveCommand.sender) numbers its commands
+(DriveCommand.seq, 32-bit in the binary codec, so comparisons wrap).
+A command is dropped if:
+- its (seq, timestamp) pair is in the sender's last WINDOW commands,
+  which makes it a redelivery; or
+- it is older than that window and not newer in time than the newest
+  command, which makes it a replay.
+A seen seq with a different timestamp, or a far older seq with a newer
+timestamp, means the controller restarted its numbering (page reload), and
+its window starts over. Commands without an integer seq always pass.
+
+BacklogCollapser: a command whose age is under LATE_AFTER_MS runs at once.
+A late one is held until no newer command from the same sender has arrived
+for COLLAPSE_WINDOW_S, but never longer than MAX_HOLD_S. A newer command
+replaces the held one, and the replaced command is reported through
+on_collapsed (acked as COLLAPSED). An on-time command replaces a held one
+and runs at once. So a burst runs only its newest motion intent, and
+sustained lag delays each command by COLLAPSE_WINDOW_S.
+"""
+
+import collections
+import threading
+import time
+
+WINDOW = 64                 # Recent commands remembered per sender
+SEQ_MODULUS = 1 << 32       # control_codec packs seq as uint32
+LATE_AFTER_MS = 250         # Older than this on arrival: part of a delayed burst
+COLLAPSE_WINDOW_S = 0.05    # How long a late command waits for newer ones
+MAX_HOLD_S = 0.25           # Longest a paced burst can keep deferring its newest command
+
+ACCEPT, DUPLICATE, REPLAY = range(3)
+VERDICT_NAMES = ("accept", "duplicate", "replay")
+
+
+def seq_delta(seq, newest):
+    """seq - newest in serial-number arithmetic: > 0 newer, < 0 older"""
+    delta = (seq - newest) % SEQ_MODULUS
+    return delta - SEQ_MODULUS if delta >= SEQ_MODULUS // 2 else delta
+
+
+class _Sender:
+    __slots__ = ("newest", "newest_timestamp", "recent")
+
+    def __init__(self):
+        self.newest = None
+        self.newest_timestamp = None
+        self.recent = collections.OrderedDict()     # seq -> timestamp, oldest first
+
+    def reset(self):
+        self.newest = None
+        self.newest_timestamp = None
+        self.recent.clear()
+
+    def remember(self, seq, timestamp):
+        self.recent[seq] = timestamp
+        self.recent.move_to_end(seq)
+        while len(self.recent) > WINDOW:
+            self.recent.popitem(last=False)
+        if self.newest is None or seq_delta(seq, self.newest) > 0:
+            self.newest = seq
+        if self.newest_timestamp is None or timestamp > self.newest_timestamp:
+            self.newest_timestamp = timestamp
+
+
+class SequenceFilter:
+    def __init__(self):
+        self._senders = {}
+        self._lock = threading.Lock()
+        self.counts = [0] * len(VERDICT_NAMES)
+        self.resets = 0
+
+    def check(self, command):
+        """ACCEPT, DUPLICATE or REPLAY for a DriveCommand (accepted ones are remembered)"""
+        if not isinstance(command.seq, int):
+            return ACCEPT            # Unnumbered (or non-numeric JSON seq): nothing to compare
+        seq, timestamp = command.seq % SEQ_MODULUS, command.timestamp
+        with self._lock:
+            state = self._senders.setdefault(command.sender, _Sender())
+            verdict = self._verdict(state, seq, timestamp)
+            if verdict == ACCEPT:
+                state.remember(seq, timestamp)
+            self.counts[verdict] += 1
+        return verdict
+
+    def _verdict(self, state, seq, timestamp):
+        if state.newest is None:
+            return ACCEPT
+        seen = state.recent.get(seq)
+        if seen is not None:
+            if seen == timestamp:
+                return DUPLICATE
+            self._restart(state)     # Same seq, different command: numbering started over
+            return ACCEPT
+        if seq_delta(seq, state.newest) > -WINDOW:
+            return ACCEPT            # New, or late but inside the window
+        if timestamp > state.newest_timestamp:
+            self._restart(state)
+            return ACCEPT
+        return REPLAY
+
+    def _restart(self, state):
+        state.reset()
+        self.resets += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(zip(VERDICT_NAMES, self.counts), resets=self.resets, senders=len(self._senders))
+
+
+class BacklogCollapser:
+    def __init__(self, execute, on_collapsed, schedule, late_after_ms=LATE_AFTER_MS, window=COLLAPSE_WINDOW_S,
+                 max_hold=MAX_HOLD_S, clock=time):
+        """execute(command, *context) runs a command; on_collapsed(command, *context) reports one
+        that was replaced; schedule(delay, fn, *args) is a timer (runtime, virtual clock, thread)"""
+        self.execute = execute
+        self.on_collapsed = on_collapsed
+        self.schedule = schedule
+        self.late_after_ms = late_after_ms
+        self.window = window
+        self.max_hold = max_hold
+        self.clock = clock
+        self._held = {}             # sender -> (command, context, token, held since)
+        self._tokens = 0
+        self._lock = threading.Lock()
+        self.held = 0
+        self.collapsed = 0
+
+    def offer(self, command, age_ms, *context):
+        """Run the command now, or hold it briefly if it arrived late (see module docstring)"""
+        late = age_ms > self.late_after_ms
+        with self._lock:
+            replaced = self._held.pop(command.sender, None)
+            if late:
+                now = self.clock.monotonic()
+                since = replaced[3] if replaced is not None else now
+                self._tokens += 1
+                token = self._tokens
+                self._held[command.sender] = (command, context, token, since)
+                self.held += 1
+            if replaced is not None:
+                self.collapsed += 1
+        if replaced is not None:
+            self.on_collapsed(replaced[0], *replaced[1])
+        if not late:
+            self.execute(command, *context)
+        else:
+            # Timers of replaced commands still fire; _release ignores their stale tokens
+            self.schedule(max(0.0, min(self.window, since + self.max_hold - now)), self._release,
+                          command.sender, token)
+
+    def _release(self, sender, token):
+        with self._lock:
+            entry = self._held.get(sender)
+            if entry is None or entry[2] != token:
+                return
+            del self._held[sender]
+        self.execute(entry[0], *entry[1])
+
+    def stats(self):
+        with self._lock:
+            return {"held": self.held, "collapsed": self.collapsed, "waiting": len(self._held)}
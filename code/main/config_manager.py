@@ -12,6 +12,83 @@ ROBOT_CREDENTIALS_FILE = "robot_mqtt_credentials.json"
 SERVER_CONFIG_FILE = "server_config_local.json"
 # SERVER_CONFIG_FILE = "server_config.json"
 SYSTEM_STATE_FILE = "system_state.json"
+MOTOR_CONFIG_FILE = "motor_config.json"
+SENSOR_CONFIG_FILE = "sensor_config.json"
+TELEMETRY_CONFIG_FILE = "telemetry_config.json"
+OFFLINE_QUEUE_CONFIG_FILE = "offline_queue_config.json"
+
+# Defaults for the PWM motor driver; any key can be overridden in MOTOR_CONFIG_FILE
+DEFAULT_MOTOR_CONFIG = {
+    "pwmFrequency": 1000,   # Hz, software PWM on IN1-IN4
+    "controlRate": 100,     # Hz, ramp control loop
+    "acceleration": 400.0,  # duty %/s when speeding up
+    "deceleration": 600.0,  # duty %/s when slowing down
+    "driveSpeed": 80.0,     # duty % for forward/backward
+    "turnSpeed": 60.0,      # duty % for each wheel when turning on the spot
+    # Odometry calibration, measured at driveSpeed / turnSpeed
+    "forwardSpeedCmS": 30.0,
+    "backwardSpeedCmS": 28.0,
+    "leftTurnDegS": 90.0,
+    "rightTurnDegS": 90.0,
+    # Obstacle braking envelope (see obstacle_guard.py)
+    "obstacleReactionS": 0.25,      # sample period + stop latency
+    "obstacleMarginCm": 15.0,       # added to the braking distance
+    "obstacleMinClearanceCm": 15.0, # always blocked inside this distance, even when stopped
+    # Optional wheel encoders, e.g. {"left": [17], "right": [18], "ticksPerCm": 12.0}
+    "encoders": None
+}
+
+# Ultrasonic array; any key can be overridden in SENSOR_CONFIG_FILE
+DEFAULT_SENSOR_CONFIG = {
+    # facing: degrees from the robot's forward axis; gates: drive key the sensor blocks (or null)
+    "sensors": [
+        {"name": "front", "trig": 5, "echo": 6, "facing": 0, "gates": "ArrowUp"},
+        {"name": "back", "trig": 24, "echo": 25, "facing": 180, "gates": "ArrowDown"}
+    ],
+    "crosstalkAngleDeg": 90,   # Sensors facing at least this far apart may ping together
+    "minPeriodS": 0.06,        # HC-SR04: at least 60 ms between triggers of one sensor
+    "settleS": 0.01,           # Quiet time after a slot for stray echoes to die out
+    "staleAfterS": 0.5         # Older readings count as blocked (sensor process hung or crashed)
+}
+
+# Telemetry aggregator (see telemetry.py); any key can be overridden in TELEMETRY_CONFIG_FILE
+DEFAULT_TELEMETRY_CONFIG = {
+    # Samples per second for each channel; 0 disables it (pose has its own publisher)
+    "sampleHz": {"distance": 5.0, "motor": 10.0, "battery": 0.1, "latency": 0.1, "pose": 0.0},
+    "publishIntervalS": 2.0,       # Batch period while anything changes
+    "heartbeatS": 30.0,            # Longest silence while nothing changes
+    "maxPublishesPerMin": 40,      # Hard cap on telemetry messages (AWS IoT quota)
+    "maxSamplesPerBatch": 100,     # Per channel; older samples are thinned out beyond this
+    "schemaIntervalS": 60.0        # How often a batch repeats the field names and scales
+}
+
+# Offline publish queue (see offline_queue.py); any key can be overridden in OFFLINE_QUEUE_CONFIG_FILE
+DEFAULT_OFFLINE_QUEUE_CONFIG = {
+    "maxBytes": 256 * 1024,        # All queued messages together; lowest priority classes are evicted first
+    "drainPerSecond": 20,          # Publish rate while catching up after a reconnect
+    "retryInitialS": 0.5,          # Wait before retrying after a failed publish on a live session, doubled per failure
+    "retryMaxS": 30.0,             # Longest such wait
+    # Message classes in drain order. Policies: keep (never dropped while anything else can go),
+    # latest (one message per topic + type), drop_oldest (bounded ring), drop (not queued at all)
+    "classes": {
+        "ack": {"policy": "keep"},
+        "state": {"policy": "keep"},
+        "telemetry": {"policy": "latest"},
+        "log": {"policy": "drop_oldest", "maxBytes": 64 * 1024},
+        "transient": {"policy": "drop"}
+    },
+    # Message "type" (or the only field of an untyped message) -> class
+    "types": {
+        "ack": "ack", "script_status": "ack",
+        "robot_capabilities": "state", "obstacle_stop": "state", "flight_dump": "state",
+        "credentials_rotated": "state",
+        "telemetry": "telemetry", "latency_summary": "telemetry", "pose": "telemetry",
+        "battery_percentage": "telemetry",
+        "log": "log",
+        "clock_ping": "transient"
+    },
+    "defaultClass": "state"
+}
 
 def load_robot_config():
     """Load robot credentials from config file"""
@@ -62,6 +139,60 @@ def load_system_state():
         print(f"Error loading system state: {e}")
     return {"connected": False, "processes": []}
 
+def load_motor_config():
+    """Load motor driver configuration, falling back to defaults"""
+    config = dict(DEFAULT_MOTOR_CONFIG)
+    try:
+        if os.path.exists(MOTOR_CONFIG_FILE):
+            with open(MOTOR_CONFIG_FILE, "r") as file:
+                config.update(json.load(file))
+    except Exception as e:
+        print(f"Error loading motor configuration: {e}")
+    return config
+
+def load_sensor_config():
+    """Load the ultrasonic sensor array configuration, falling back to defaults"""
+    config = dict(DEFAULT_SENSOR_CONFIG)
+    try:
+        if os.path.exists(SENSOR_CONFIG_FILE):
+            with open(SENSOR_CONFIG_FILE, "r") as file:
+                config.update(json.load(file))
+    except Exception as e:
+        print(f"Error loading sensor configuration: {e}")
+    return config
+
+def load_telemetry_config():
+    """Load the telemetry aggregator configuration, falling back to defaults"""
+    config = dict(DEFAULT_TELEMETRY_CONFIG)
+    config["sampleHz"] = dict(DEFAULT_TELEMETRY_CONFIG["sampleHz"])
+    try:
+        if os.path.exists(TELEMETRY_CONFIG_FILE):
+            with open(TELEMETRY_CONFIG_FILE, "r") as file:
+                overrides = json.load(file)
+            config["sampleHz"].update(overrides.pop("sampleHz", {}))
+            config.update(overrides)
+    except Exception as e:
+        print(f"Error loading telemetry configuration: {e}")
+    return config
+
+def load_offline_queue_config():
+    """Load the offline publish queue configuration, falling back to defaults"""
+    config = dict(DEFAULT_OFFLINE_QUEUE_CONFIG)
+    config["classes"] = {name: dict(policy) for name, policy in DEFAULT_OFFLINE_QUEUE_CONFIG["classes"].items()}
+    config["types"] = dict(DEFAULT_OFFLINE_QUEUE_CONFIG["types"])
+    try:
+        if os.path.exists(OFFLINE_QUEUE_CONFIG_FILE):
+            with open(OFFLINE_QUEUE_CONFIG_FILE, "r") as file:
+                overrides = json.load(file)
+            config["types"].update(overrides.pop("types", {}))
+            if "classes" in overrides:
+                # Replaces the class list, since its order is the drain order
+                config["classes"] = overrides.pop("classes")
+            config.update(overrides)
+    except Exception as e:
+        print(f"Error loading offline queue configuration: {e}")
+    return config
+
 def load_server_config():
     """Load server configuration from file"""
     try:
@@ -0,0 +1,110 @@
+# control_codec.py
+"""
+Compact fixed-layout binary encoding for drive commands.
+
+JSON drive commands ({"key":"ArrowUp","timestamp":...,"duration":...}) keep
+working unchanged; a binary command is recognised by its first byte, which
+can never start a JSON object. Both decoders apply the same limits: speed
+is a duty % clamped to 1..100 (0 or missing = robot default), duration is
+clamped to 0..MAX_DURATION_S (what the binary u16 ms field holds), and a
+JSON field of the wrong type, a negative speed or a non-positive distance
+raises ValueError before anything is scheduled. The robot announces support with a
+{"type":"robot_capabilities","binaryControl":1} message on connect and in
+reply to {"type":"hello"}, so controllers only switch once they see it.
+
+Layout (little-endian, 20 bytes):
+    magic      u8   0xA5
+    version    u8   1
+    opcode     u8   0=stop 1=ArrowUp 2=ArrowDown 3=ArrowLeft 4=ArrowRight
+    speed      u8   duty %, 0 = robot default
+    sender     u16  controller id, 0 = anonymous
+    duration   u16  milliseconds
+    seq        u32  per-sender sequence number
+    timestamp  u64  controller wall clock, milliseconds
+"""
+
+import math
+import struct
+
+MAGIC = 0xA5
+MAGIC_BYTE = bytes([MAGIC])
+VERSION = 1
+COMMAND = struct.Struct("<BBBBHHIQ")
+COMMAND_SIZE = COMMAND.size
+
+MAX_SPEED = 100                 # Duty %
+MAX_DURATION_S = 0xFFFF / 1000  # Largest duration the binary layout can carry
+DEFAULT_DURATION_S = 0.2
+
+OPCODE_KEYS = ("Stop", "ArrowUp", "ArrowDown", "ArrowLeft", "ArrowRight")
+KEY_OPCODES = {key: opcode for opcode, key in enumerate(OPCODE_KEYS)}
+
+CAPABILITIES = {"type": "robot_capabilities", "binaryControl": 1, "binaryVersion": VERSION,
+                "acks": 1}   # Drive commands are acknowledged on <topic>/ack (command_ack)
+
+
+class DriveCommand:
+    """Decoded drive command; same fields whichever wire format it arrived in"""
+
+    __slots__ = ("key", "seq", "timestamp", "duration", "speed", "sender", "distance")
+
+    def __init__(self, key, seq, timestamp, duration, speed=None, sender=0, distance=None):
+        self.key = key
+        self.seq = seq
+        self.timestamp = timestamp    # ms, controller clock
+        self.duration = duration      # seconds
+        self.speed = speed            # duty %, None = default
+        self.sender = sender
+        self.distance = distance      # cm for a closed-loop straight move (JSON only)
+
+
+def is_binary(payload):
+    return payload[:1] == MAGIC_BYTE
+
+
+def encode_command(key, seq, timestamp_ms, duration=0.2, speed=None, sender=0):
+    """Pack a drive command (controller side)"""
+    return COMMAND.pack(MAGIC, VERSION, KEY_OPCODES[key], int(speed or 0), sender,
+                        int(round(duration * 1000)), seq & 0xFFFFFFFF, int(timestamp_ms))
+
+
+def decode_command(payload):
+    """Unpack a binary drive command; raises ValueError on a malformed payload"""
+    if len(payload) < COMMAND_SIZE:
+        raise ValueError(f"binary command too short ({len(payload)} bytes)")
+    magic, version, opcode, speed, sender, duration_ms, seq, timestamp = COMMAND.unpack_from(payload)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"unsupported binary command (magic {magic:#x}, version {version})")
+    if opcode >= len(OPCODE_KEYS):
+        raise ValueError(f"unknown opcode {opcode}")
+    return DriveCommand(OPCODE_KEYS[opcode], seq, timestamp, duration_ms / 1000.0,
+                        min(speed, MAX_SPEED) or None, sender)
+
+
+def _number(msg_data, name):
+    """A JSON field as a finite int/float, or None when absent; raises ValueError otherwise"""
+    value = msg_data.get(name)
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        raise ValueError(f"{name} must be a number, got {value!r}")
+    return value
+
+
+def command_from_json(msg_data):
+    """Build a DriveCommand from a JSON drive message (duration defaults to 0.2 s); raises ValueError
+    on a field of the wrong type or out of range (see the module docstring)"""
+    timestamp = _number(msg_data, "timestamp")
+    if timestamp is None:
+        raise ValueError("timestamp missing")
+    speed = _number(msg_data, "speed")
+    if speed is not None and speed < 0:
+        raise ValueError(f"speed must not be negative, got {speed}")
+    duration = _number(msg_data, "duration")
+    duration = DEFAULT_DURATION_S if duration is None else max(0.0, min(MAX_DURATION_S, duration))
+    distance = _number(msg_data, "distance")
+    if distance is not None and distance <= 0:
+        raise ValueError(f"distance must be positive, got {distance}")
+    return DriveCommand(msg_data["key"], msg_data.get("seq"), timestamp, duration,
+                        min(speed, MAX_SPEED) or None if speed is not None else None,
+                        msg_data.get("sender", 0), distance)
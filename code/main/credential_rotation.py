@@ -0,0 +1,172 @@
+# credential_rotation.py
+"""
+Hot rotation of the AWS IoT session credentials.
+
+The motor process connects with the temporary IAM credentials in
+MQTT_LOG_FILE. Before they expire, fresh ones reach the robot in one of two
+ways. The backend can push them as {"type": "credentials", "user": {...}}
+on the robot topic while the old session still works. Or something else can
+rewrite MQTT_LOG_FILE (robot_main's login flow, an operator). Either way
+CredentialRotator swaps them into the existing AWSIoTMQTTClient:
+
+    configureIAMCredentials -> disconnect -> connect -> hub.resubscribe()
+
+GPIO, the motor driver, the sensor process, the runtime's workers and every
+HubClient keep running. Hub clients stay on the hub socket and only miss
+what arrives during the reconnect. Each rotation is timed per phase and
+reported through on_rotated(report). Before this, recovery took the full
+robot_main restart: Chrome, login, WebSocket.
+
+If the new credentials do not connect, the previous credentials and
+endpoint are configured again and the client reconnects with them
+(report["restored"]). Credentials pushed over MQTT are persisted by the
+caller only once a rotation with them succeeded.
+"""
+
+import json
+import os
+import threading
+import time
+
+from config_manager import MQTT_LOG_FILE
+
+CREDENTIAL_KEYS = ("awsAccessKey", "awsSecretKey", "awsSessionToken")
+POLL_INTERVAL_S = 5.0
+
+
+def read_credentials(path=MQTT_LOG_FILE):
+    """The "user" block of the MQTT log file (credentials, host, topic), or None"""
+    try:
+        with open(path, "r") as f:
+            user = json.load(f)["data"]["user"]
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    if not all(user.get(key) for key in CREDENTIAL_KEYS):
+        return None
+    return user
+
+
+def write_credentials(user, path=MQTT_LOG_FILE):
+    """Merge fresh credentials into the MQTT log file atomically (readers never see half a file)"""
+    try:
+        with open(path, "r") as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        entry = {"data": {}}
+    data = entry.setdefault("data", {})
+    data["user"] = dict(data.get("user") or {}, **user)
+    entry["timestamp"] = time.time()
+    entry["formatted_time"] = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+    temporary = f"{path}.tmp"
+    with open(temporary, "w") as f:
+        f.write(json.dumps(entry) + "\n")
+    os.replace(temporary, path)
+
+
+def same_credentials(a, b):
+    return all((a or {}).get(key) == (b or {}).get(key) for key in CREDENTIAL_KEYS)
+
+
+class CredentialRotator:
+    def __init__(self, client, credentials, path=MQTT_LOG_FILE, hub=None, on_rotated=None, clock=time):
+        """client: the connected AWSIoTMQTTClient; credentials: the user block it connected with"""
+        self.client = client
+        self.credentials = credentials
+        self.path = path
+        self.hub = hub
+        self.on_rotated = on_rotated   # on_rotated(report dict)
+        self.clock = clock
+        self.rotations = 0
+        self.failures = 0
+        self.last_report = None
+        self._lock = threading.Lock()
+        self._mtime = self._file_mtime()
+
+    def rotate(self, credentials, reason="file"):
+        """Swap credentials into the live client and reconnect; returns the report (ok False on failure)"""
+        with self._lock:
+            if same_credentials(credentials, self.credentials):
+                return None
+            report = {"type": "credentials_rotated", "reason": reason, "ok": False}
+            started = self.clock.perf_counter()
+            phase = started
+            host = credentials.get("awsHost")
+            moved = bool(host) and host != self.credentials.get("awsHost")
+            disconnected = False
+            try:
+                if moved:
+                    self.client.configureEndpoint(host, 443)
+                self.client.configureIAMCredentials(*(credentials[key] for key in CREDENTIAL_KEYS))
+                phase = self._phase(report, "swapMs", phase)
+                disconnected = True
+                try:
+                    self.client.disconnect()
+                except Exception as e:
+                    # Expired credentials often mean the old session is already gone
+                    print(f"⚠️ Disconnect before credential swap: {e}")
+                phase = self._phase(report, "disconnectMs", phase)
+                self.client.connect()
+                phase = self._phase(report, "connectMs", phase)
+                if self.hub:
+                    self.hub.resubscribe()
+                self._phase(report, "resubscribeMs", phase)
+                report["ok"] = True
+                self.credentials = credentials
+                self.rotations += 1
+            except Exception as e:
+                report["error"] = str(e)
+                self.failures += 1
+                report["restored"] = self._restore(moved, disconnected)
+            report["recoveryMs"] = round((self.clock.perf_counter() - started) * 1000, 1)
+            self.last_report = report
+        if report["ok"]:
+            print(f"🔑 MQTT credentials rotated ({reason}) in {report['recoveryMs']} ms")
+        else:
+            print(f"❌ MQTT credential rotation failed: {report['error']}")
+        if self.on_rotated:
+            self.on_rotated(report)
+        return report
+
+    def rotate_later(self, credentials, reason="message"):
+        """Rotate from a worker thread (safe to call from the SDK callback thread)"""
+        thread = threading.Thread(target=self.rotate, args=(credentials, reason), name="credential-rotation",
+                                  daemon=True)
+        thread.start()
+        return thread
+
+    def check(self):
+        """Rotate if the credentials file changed since the last check"""
+        mtime = self._file_mtime()
+        if mtime is None or mtime == self._mtime:
+            return None
+        credentials = read_credentials(self.path)
+        if credentials is None:
+            return None   # Half-written or cleared; look again next time
+        self._mtime = mtime
+        return self.rotate(credentials, "file")
+
+    def _restore(self, moved, disconnected):
+        """Put the last working credentials and endpoint back after a failed swap; True if the session is up"""
+        try:
+            if moved and self.credentials.get("awsHost"):
+                self.client.configureEndpoint(self.credentials["awsHost"], 443)
+            self.client.configureIAMCredentials(*(self.credentials[key] for key in CREDENTIAL_KEYS))
+            if disconnected:
+                self.client.connect()
+                if self.hub:
+                    self.hub.resubscribe()
+            return True
+        except Exception as e:
+            print(f"❌ Could not restore the previous MQTT credentials: {e}")
+            return False
+
+    def _file_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _phase(self, report, name, since):
+        now = self.clock.perf_counter()
+        report[name] = round((now - since) * 1000, 1)
+        return now
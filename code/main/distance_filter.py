@@ -0,0 +1,94 @@
+# distance_filter.py
+"""
+Per-sensor ultrasonic distance filtering.
+
+Each raw reading first goes into a fixed ring of the last MEDIAN_WINDOW
+readings, with a missing or invalid echo counted as MAX_RANGE_CM. A
+reading that jumps farther than the ring median by more than OUTLIER_CM is
+treated as an outlier and skipped, so a single dropout cannot open up a
+blocked direction. A sustained change still gets through once it holds the
+median. A reading that jumps closer is never rejected, because a late stop
+costs more than a false one. Any accepted jump larger than OUTLIER_CM
+restarts the track at the new reading.
+
+Accepted readings update a constant-velocity Kalman filter, state
+[distance, rate]. The filter outputs:
+    distance     filtered estimate, cm
+    confidence   0..1 from the estimate's standard deviation
+    closing      cm/s the gap is shrinking (negative when it opens)
+"""
+
+import numpy as np
+
+MAX_RANGE_CM = 400.0
+MIN_RANGE_CM = 2.0
+MEDIAN_WINDOW = 5
+OUTLIER_CM = 20.0               # Allowed jump away from the median
+MEASUREMENT_NOISE_CM = 2.0      # HC-SR04 reading standard deviation
+ACCEL_NOISE_CM_S2 = 150.0       # How hard the gap can change speed (people walking, robot braking)
+CONFIDENCE_SCALE_CM = 10.0      # Estimate sigma at which confidence is 0.5
+
+
+class DistanceFilter:
+    def __init__(self, sensors=2, window=MEDIAN_WINDOW, measurement_noise=MEASUREMENT_NOISE_CM,
+                 accel_noise=ACCEL_NOISE_CM_S2):
+        self._raw = np.full((sensors, window), MAX_RANGE_CM)
+        self._next = [0] * sensors
+        self._x = np.zeros((sensors, 2))
+        self._x[:, 0] = MAX_RANGE_CM
+        self._P = np.tile(np.diag([MAX_RANGE_CM ** 2, 100.0 ** 2]), (sensors, 1, 1))
+        self._last = [None] * sensors
+        self._r = measurement_noise ** 2
+        self._q = accel_noise ** 2
+        self.outliers = [0] * sensors
+
+    def update(self, index, distance, now):
+        """Feed one raw reading (None = no valid echo); returns (distance, confidence, closing)"""
+        x = self._x[index]
+        P = self._P[index]
+        last = self._last[index]
+        self._last[index] = now
+        if last is None:
+            reading = MAX_RANGE_CM if distance is None else distance
+            self._raw[index].fill(reading)
+            x[:] = (reading, 0.0)
+            P[:] = np.diag([self._r, 100.0 ** 2])
+            return self._output(x, P)
+
+        dt = now - last
+        if dt > 0:
+            F = np.array(((1.0, dt), (0.0, 1.0)))
+            x[:] = F @ x
+            P[:] = F @ P @ F.T + self._q * np.array(((dt ** 4 / 4, dt ** 3 / 2), (dt ** 3 / 2, dt ** 2)))
+
+        reading = self._accept(index, distance)
+        if reading is not None:
+            innovation = reading - x[0]
+            if abs(innovation) > OUTLIER_CM:
+                # A different surface (someone stepped in, or the obstacle left): restart the track
+                x[:] = (reading, 0.0)
+                P[:] = np.diag([self._r, 50.0 ** 2])
+            else:
+                gain = P[:, 0] / (P[0, 0] + self._r)
+                x += gain * innovation
+                P -= np.outer(gain, P[0])
+        x[0] = min(MAX_RANGE_CM, max(MIN_RANGE_CM, x[0]))
+        return self._output(x, P)
+
+    def _accept(self, index, distance):
+        """Median outlier gate; returns the reading to fuse or None"""
+        reading = MAX_RANGE_CM if distance is None else distance
+        ring = self._raw[index]
+        slot = self._next[index]
+        ring[slot] = reading
+        self._next[index] = (slot + 1) % len(ring)
+        if reading - np.median(ring) > OUTLIER_CM:
+            self.outliers[index] += 1
+            return None
+        return reading
+
+    @staticmethod
+    def _output(x, P):
+        sigma = float(np.sqrt(max(P[0, 0], 0.0)))
+        confidence = 1.0 / (1.0 + sigma / CONFIDENCE_SCALE_CM)
+        return float(x[0]), confidence, -float(x[1])
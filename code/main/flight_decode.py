@@ -0,0 +1,123 @@
+# flight_decode.py
+"""
+Decode flight recorder rings (a dump directory or individual .ring files) to CSV or NumPy.
+
+Records from all rings are merged in monotonic-clock order. The CSV has one
+row per record: time relative to the first record, ring, seq, kind,
+channel, the raw a/b/v1/v2/v3 fields and a readable summary. The .npz holds
+one structured array per ring (same field names as the record layout) plus
+"merged" with an extra "ring" column.
+
+Usage: python3 flight_decode.py flight_dumps/<dump> [--csv out.csv] [--npz out.npz]
+       (with neither option a summary is printed)
+"""
+
+import argparse
+import csv
+import glob
+import os
+import sys
+
+import numpy as np
+
+import flight_recorder as fr
+from control_codec import OPCODE_KEYS
+
+RECORD_DTYPE = np.dtype([
+    ("seq", "<u8"), ("timestamp_ns", "<i8"), ("kind", "u1"), ("channel", "u1"),
+    ("a", "<u2"), ("b", "<u4"), ("v1", "<f8"), ("v2", "<f8"), ("v3", "<f8"),
+])
+assert RECORD_DTYPE.itemsize == fr.RECORD.size
+
+
+def load_ring(path):
+    """(label, records ordered by seq) for one ring file; unwritten slots are dropped"""
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, version, record_size, capacity, _, clean, label, _ = fr.HEADER.unpack_from(data, 0)
+    if magic != fr.MAGIC or version != fr.VERSION or record_size != fr.RECORD.size:
+        raise ValueError(f"{path}: not a flight recorder v{fr.VERSION} ring")
+    records = np.frombuffer(data, RECORD_DTYPE, count=capacity, offset=fr.HEADER_SIZE)
+    records = records[records["seq"] != 0]
+    return label.rstrip(b"\0").decode(), np.sort(records, order="seq")
+
+
+def load(paths):
+    """{label: records} for every ring plus the time-merged array under "merged" """
+    rings = dict(load_ring(path) for path in paths)
+    merged_dtype = np.dtype(RECORD_DTYPE.descr + [("ring", "U16")])
+    parts = []
+    for label, records in rings.items():
+        part = np.empty(len(records), merged_dtype)
+        for name in RECORD_DTYPE.names:
+            part[name] = records[name]
+        part["ring"] = label
+        parts.append(part)
+    merged = np.concatenate(parts) if parts else np.empty(0, merged_dtype)
+    rings["merged"] = merged[np.argsort(merged["timestamp_ns"], kind="stable")]
+    return rings
+
+
+def describe(record):
+    kind, a, v1, v2, v3 = int(record["kind"]), int(record["a"]), record["v1"], record["v2"], record["v3"]
+    if kind == fr.SAMPLE:
+        raw = "none" if np.isnan(v1) else f"{v1:.1f}"
+        return (f"raw={raw} distance={v2:.1f} closing={v3:.1f} "
+                f"confidence={record['b'] / 1000:.2f}{' blocked' if a else ''}")
+    if kind == fr.COMMAND:
+        key = OPCODE_KEYS[a] if a < len(OPCODE_KEYS) else "unknown"
+        speed = "default" if np.isnan(v1) else f"{v1:.0f}"
+        return f"{key} seq={record['b']} speed={speed} duration={v2:.2f} age={v3:.0f}ms"
+    if kind == fr.PIN:
+        return f"pins {a}/{record['b']} duty={v1:.1f}"
+    if kind == fr.DECISION:
+        return f"{fr.DECISION_NAMES.get(a, a)} distance={v1:.1f}"
+    if kind == fr.MARK:
+        return {fr.MARK_START: "start", fr.MARK_DUMP: "dump", fr.MARK_ROTATION: "credential_rotation"}.get(a, str(a))
+    return ""
+
+
+def write_csv(merged, path):
+    start = merged["timestamp_ns"][0] if len(merged) else 0
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["t_s", "ring", "seq", "kind", "channel", "a", "b", "v1", "v2", "v3", "summary"])
+        for record in merged:
+            writer.writerow([f"{(record['timestamp_ns'] - start) / 1e9:.6f}", record["ring"], record["seq"],
+                             fr.KIND_NAMES.get(int(record["kind"]), record["kind"]), record["channel"],
+                             record["a"], record["b"], record["v1"], record["v2"], record["v3"],
+                             describe(record)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Flight recorder dump decoder")
+    parser.add_argument("paths", nargs="+", help="dump directories or .ring files")
+    parser.add_argument("--csv", help="write merged records as CSV")
+    parser.add_argument("--npz", help="write per-ring and merged structured arrays")
+    args = parser.parse_args()
+
+    paths = []
+    for path in args.paths:
+        paths.extend(sorted(glob.glob(os.path.join(path, "*.ring"))) if os.path.isdir(path) else [path])
+    if not paths:
+        sys.exit("no .ring files found")
+    rings = load(paths)
+    merged = rings["merged"]
+
+    if args.csv:
+        write_csv(merged, args.csv)
+        print(f"📝 {len(merged)} records -> {args.csv}")
+    if args.npz:
+        np.savez(args.npz, **rings)
+        print(f"📝 {len(merged)} records -> {args.npz}")
+    if not (args.csv or args.npz):
+        for label, records in rings.items():
+            if label == "merged" or not len(records):
+                continue
+            span = (records["timestamp_ns"][-1] - records["timestamp_ns"][0]) / 1e9
+            counts = ", ".join(f"{fr.KIND_NAMES[k]}={int(np.sum(records['kind'] == k))}" for k in fr.KIND_NAMES)
+            print(f"{label}: {len(records)} records over {span:.1f}s ({counts})")
+
+
+if __name__ == "__main__":
+    main()
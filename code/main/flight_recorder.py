@@ -0,0 +1,179 @@
+# flight_recorder.py
+"""
+Memory-mapped flight recorder: fixed-size binary ring logs of what the robot saw and did.
+
+Every recording process opens its own ring file in RING_DIR: motor.ring for
+commands, pin changes and stop decisions, sensor.ring for samples and
+gate decisions. RING_DIR is /dev/shm when it exists, so full-rate writes
+stay in RAM and never wear the SD card. A record is one fixed 48-byte
+struct packed straight into the mapping. Slots are claimed from an
+itertools counter, so threads need no lock and nothing is allocated or
+flushed per record. The ring wraps and keeps the newest `capacity`
+records.
+
+dump_rings() sets the frozen flag in every ring header, which writers check
+before each record, so the copy is stable. It then copies the rings into a
+timestamped directory under DUMP_DIR and thaws them. A ring that was not
+closed cleanly (crash, kill -9) is dumped as "recovered" the next time its
+process opens it. Decode dumps with flight_decode.py.
+
+Record (little-endian, 48 bytes):
+    seq u64          1-based per ring, 0 = never written
+    timestamp i64    monotonic_ns (system-wide, so rings merge by time)
+    kind u8          SAMPLE / COMMAND / PIN / DECISION / MARK
+    channel u8       sensor index, wheel index or command sender
+    a u16, b u32     kind-specific integers
+    v1, v2, v3 f64   kind-specific values
+
+    SAMPLE    channel=sensor  a=blocked  b=confidence x1000  v1=raw cm (nan = no echo)  v2=filtered cm  v3=closing cm/s
+    COMMAND   channel=sender  a=opcode   b=seq               v1=speed % (nan = default)  v2=duration s  v3=age ms
+    PIN       channel=wheel   a=forward pin  b=reverse pin   v1=signed duty %
+    DECISION  channel=sensor  a=decision code                v1=distance cm
+    MARK      a=mark code
+"""
+
+import itertools
+import mmap
+import os
+import shutil
+import struct
+import threading
+import time
+
+MAGIC = b"FREC"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIBB2x16sq")
+HEADER_SIZE = 64
+FROZEN_OFFSET = 12
+CLEAN_OFFSET = 13
+RECORD = struct.Struct("<QqBBHIddd")
+
+RING_DIR = "/dev/shm/robot_flight" if os.path.isdir("/dev/shm") else "flight_rings"
+DUMP_DIR = "flight_dumps"
+DEFAULT_CAPACITY = 65536        # Records per ring (3 MiB)
+POST_TRIGGER_S = 1.0            # Keep recording this long after a trigger before freezing
+MIN_DUMP_INTERVAL_S = 5.0
+MAX_DUMPS = 20
+
+# Record kinds
+SAMPLE, COMMAND, PIN, DECISION, MARK = range(1, 6)
+KIND_NAMES = {SAMPLE: "sample", COMMAND: "command", PIN: "pin", DECISION: "decision", MARK: "mark"}
+
+# COMMAND channel for motion script steps (controllers use their sender id)
+SCRIPT_SENDER = 255
+
+# DECISION codes
+BLOCKED, CLEARED, EMERGENCY_STOP, STALE_STOP, REJECTED = range(1, 6)
+DECISION_NAMES = {BLOCKED: "blocked", CLEARED: "cleared", EMERGENCY_STOP: "emergency_stop",
+                  STALE_STOP: "stale_stop", REJECTED: "rejected"}
+
+# MARK codes
+MARK_START, MARK_DUMP, MARK_ROTATION = range(1, 4)   # MARK_ROTATION: b = ok, v1 = recovery ms, v2 = connect ms
+
+
+class FlightRecorder:
+    def __init__(self, label, capacity=DEFAULT_CAPACITY, ring_dir=RING_DIR, dump_dir=DUMP_DIR):
+        self.label = label
+        self.capacity = capacity
+        self.ring_dir = ring_dir
+        self.dump_dir = dump_dir
+        self.path = os.path.join(ring_dir, f"{label}.ring")
+        os.makedirs(ring_dir, exist_ok=True)
+        if _unclean(self.path):
+            dump = dump_rings(ring_dir, dump_dir, f"recovered_{label}", paths=[self.path])
+            print(f"🛬 Recovered flight recorder ring from an unclean exit: {dump}")
+        size = HEADER_SIZE + capacity * RECORD.size
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(fd, size)
+            self._mm = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        HEADER.pack_into(self._mm, 0, MAGIC, VERSION, RECORD.size, capacity, 0, 0,
+                         label.encode()[:16], time.monotonic_ns())
+        self._counter = itertools.count(1)
+        self._pack = RECORD.pack_into
+        self._clock = time.monotonic_ns
+        self._dump_lock = threading.Lock()
+        self._last_dump = 0.0
+        self.record(MARK, a=MARK_START)
+
+    def record(self, kind, channel=0, a=0, b=0, v1=0.0, v2=0.0, v3=0.0):
+        """Append one record; cheap enough for every sample and pin change"""
+        mm = self._mm
+        if mm is None or mm[FROZEN_OFFSET]:
+            return
+        seq = next(self._counter)
+        self._pack(mm, HEADER_SIZE + (seq - 1) % self.capacity * RECORD.size,
+                   seq, self._clock(), kind, channel, a & 0xFFFF, b & 0xFFFFFFFF, v1, v2, v3)
+
+    def dump(self, reason):
+        """Freeze every ring in ring_dir and copy them to a new dump directory; returns its path"""
+        with self._dump_lock:
+            self.record(MARK, a=MARK_DUMP)
+            self._last_dump = time.monotonic()
+            return dump_rings(self.ring_dir, self.dump_dir, reason)
+
+    def dump_later(self, reason, delay=POST_TRIGGER_S, done=None):
+        """Dump in the background after delay seconds (so the aftermath is captured); rate limited"""
+        if time.monotonic() - self._last_dump < MIN_DUMP_INTERVAL_S:
+            return False
+        self._last_dump = time.monotonic()
+
+        def run():
+            time.sleep(delay)
+            try:
+                path = self.dump(reason)
+                print(f"🛬 Flight recorder dumped to {path}")
+                if done:
+                    done(path)
+            except Exception as e:
+                print(f"⚠️ Flight recorder dump failed: {e}")
+
+        threading.Thread(target=run, name="flight-dump", daemon=True).start()
+        return True
+
+    def close(self):
+        """Mark the ring as cleanly closed (it stays on disk for inspection)"""
+        mm, self._mm = self._mm, None
+        if mm is not None:
+            mm[CLEAN_OFFSET] = 1
+            mm.close()
+
+
+def _unclean(path):
+    try:
+        with open(path, "rb") as f:
+            header = f.read(HEADER_SIZE)
+    except OSError:
+        return False
+    if len(header) < HEADER.size or header[:4] != MAGIC:
+        return False
+    return header[CLEAN_OFFSET] == 0 and os.path.getsize(path) > HEADER_SIZE
+
+
+def dump_rings(ring_dir=RING_DIR, dump_dir=DUMP_DIR, reason="manual", paths=None):
+    """Freeze, copy and thaw ring files; returns the dump directory"""
+    if paths is None:
+        paths = [os.path.join(ring_dir, name) for name in sorted(os.listdir(ring_dir)) if name.endswith(".ring")]
+    target = os.path.join(dump_dir, time.strftime("%Y%m%d-%H%M%S") + f"_{reason}")
+    os.makedirs(target, exist_ok=True)
+    for path in paths:
+        with open(path, "r+b") as f:
+            mm = mmap.mmap(f.fileno(), 0)
+            try:
+                mm[FROZEN_OFFSET] = 1
+                time.sleep(0.001)   # Let a record in flight land
+                with open(os.path.join(target, os.path.basename(path)), "wb") as out:
+                    out.write(mm[:])
+            finally:
+                mm[FROZEN_OFFSET] = 0
+                mm.close()
+    _prune(dump_dir)
+    return target
+
+
+def _prune(dump_dir, keep=MAX_DUMPS):
+    dumps = sorted(os.path.join(dump_dir, name) for name in os.listdir(dump_dir))
+    for old in dumps[:-keep]:
+        shutil.rmtree(old, ignore_errors=True)
@@ -0,0 +1,304 @@
+# gpio_backend.py
+"""
+Hardware backend selection for GPIO and serial.
+
+On the robot `GPIO` is RPi.GPIO and `open_serial` opens a pyserial port.
+With ROBOT_GPIO_BACKEND=sim, `GPIO` is a SimulatedGPIO with the same API
+that records every pin transition with a nanosecond timestamp and can
+synthesize HC-SR04 echo pulses, so the motor and sensor paths can run and
+be benchmarked on a plain Linux box.
+
+ROBOT_GPIO_BACKEND: "rpi" (default; fail if RPi.GPIO cannot be imported or
+initialised), "sim", or "auto" (fall back to sim only when RPi.GPIO is not
+installed). Simulation is never chosen silently on the robot: an RPi.GPIO
+that is installed but raises RuntimeError (no /dev/mem access, unknown
+board) is an error in every mode, since a robot that acks commands and
+drives no pins is worse than one that does not start.
+"""
+
+import collections
+import heapq
+import os
+import threading
+import time
+
+SPEED_OF_SOUND_CM_S = 34300
+ECHO_START_DELAY_NS = 450_000   # HC-SR04 sends its 8-cycle burst before raising ECHO
+ECHO_TIMEOUT_NS = 38_000_000    # No-echo pulse width reported by the sensor
+EVENT_SPIN_NS = 300_000         # Timed waits undershoot by this much, then spin to the edge
+
+
+class SimulatedPWM:
+    """Software PWM channel; duty changes are recorded on the pin trace"""
+
+    def __init__(self, gpio, pin, frequency):
+        self._gpio = gpio
+        self.pin = pin
+        self.frequency = frequency
+        self.duty = 0.0
+        self.running = False
+
+    def start(self, duty):
+        self.running = True
+        self.ChangeDutyCycle(duty)
+
+    def ChangeDutyCycle(self, duty):
+        if duty != self.duty:
+            self.duty = duty
+            self._gpio._record(self.pin, duty)
+
+    def ChangeFrequency(self, frequency):
+        self.frequency = frequency
+
+    def stop(self):
+        self.running = False
+        self.ChangeDutyCycle(0.0)
+
+
+class SimulatedGPIO:
+    """In-memory stand-in for RPi.GPIO with a transition trace and echo synthesis"""
+
+    BCM = 11
+    BOARD = 10
+    OUT = 0
+    IN = 1
+    LOW = 0
+    HIGH = 1
+    PUD_OFF = 20
+    PUD_DOWN = 21
+    PUD_UP = 22
+    RISING = 31
+    FALLING = 32
+    BOTH = 33
+    RPI_INFO = {"TYPE": "Simulated"}
+
+    def __init__(self, trace_size=200_000):
+        self._lock = threading.RLock()
+        self._levels = {}
+        self._modes = {}
+        self._echoes = {}        # trig pin -> (echo pin, distance cm or None)
+        self._pulses = {}        # echo pin -> (rise ns, fall ns)
+        self._callbacks = {}     # pin -> (edge, [callbacks])
+        self._detected = set()
+        self._events = []        # heap of (ns, seq, pin, level)
+        self._event_seq = 0
+        self._event_cond = threading.Condition(self._lock)
+        self._event_thread = None
+        self.mode = None
+        self.trace = collections.deque(maxlen=trace_size)
+
+    # --- RPi.GPIO API ---
+    def setmode(self, mode):
+        self.mode = mode
+
+    def getmode(self):
+        return self.mode
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, pin, direction, pull_up_down=None, initial=None):
+        for p in self._pins(pin):
+            with self._lock:
+                self._modes[p] = direction
+                self._levels.setdefault(p, self.LOW)
+            if direction == self.OUT and initial is not None:
+                self.output(p, initial)
+
+    def output(self, pin, value):
+        pins = self._pins(pin)
+        values = value if isinstance(value, (list, tuple)) else [value] * len(pins)
+        for p, v in zip(pins, values):
+            level = self.HIGH if v else self.LOW
+            with self._lock:
+                old = self._levels.get(p, self.LOW)
+                self._levels[p] = level
+                if old == level:
+                    continue
+                self._record(p, level)
+                if level == self.LOW and p in self._echoes:
+                    self._schedule_echo(p)
+
+    def input(self, pin):
+        with self._lock:
+            pulse = self._pulses.get(pin)
+            if pulse is not None:
+                now = time.monotonic_ns()
+                return self.HIGH if pulse[0] <= now < pulse[1] else self.LOW
+            return self._levels.get(pin, self.LOW)
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        with self._lock:
+            self._callbacks[pin] = (edge, [callback] if callback else [])
+        self._ensure_event_thread()
+
+    def add_event_callback(self, pin, callback):
+        with self._lock:
+            self._callbacks[pin][1].append(callback)
+
+    def remove_event_detect(self, pin):
+        with self._lock:
+            self._callbacks.pop(pin, None)
+            self._detected.discard(pin)
+
+    def event_detected(self, pin):
+        with self._lock:
+            if pin in self._detected:
+                self._detected.discard(pin)
+                return True
+            return False
+
+    def cleanup(self, pin=None):
+        with self._lock:
+            pins = self._pins(pin) if pin is not None else list(self._levels)
+            for p in pins:
+                self._levels.pop(p, None)
+                self._modes.pop(p, None)
+                self._callbacks.pop(p, None)
+                self._pulses.pop(p, None)
+                self._detected.discard(p)
+
+    def PWM(self, pin, frequency):
+        return SimulatedPWM(self, pin, frequency)
+
+    # --- Simulation controls ---
+    def set_echo_distance(self, trig_pin, echo_pin, distance_cm):
+        """Make the next trigger on trig_pin echo back for distance_cm (None = no echo)"""
+        with self._lock:
+            self._echoes[trig_pin] = (echo_pin, distance_cm)
+
+    def set_input(self, pin, level):
+        """Drive an input pin from outside (e.g. an encoder), firing edge callbacks"""
+        self._schedule(time.monotonic_ns(), pin, self.HIGH if level else self.LOW)
+
+    def schedule_input(self, at_ns, pin, level):
+        """Drive an input pin at a future monotonic_ns timestamp"""
+        self._schedule(at_ns, pin, self.HIGH if level else self.LOW)
+
+    def transitions(self, pin=None, since_ns=0):
+        """Recorded (ns, pin, value) transitions; value is the level or the PWM duty"""
+        with self._lock:
+            return [t for t in self.trace if t[0] >= since_ns and (pin is None or t[1] == pin)]
+
+    def clear_trace(self):
+        with self._lock:
+            self.trace.clear()
+
+    # --- Internals ---
+    @staticmethod
+    def _pins(pin):
+        return list(pin) if isinstance(pin, (list, tuple)) else [pin]
+
+    def _record(self, pin, value):
+        self.trace.append((time.monotonic_ns(), pin, value))
+
+    def _schedule_echo(self, trig_pin):
+        echo_pin, distance = self._echoes[trig_pin]
+        rise = time.monotonic_ns() + ECHO_START_DELAY_NS
+        if distance is None:
+            width = ECHO_TIMEOUT_NS
+        else:
+            width = int(2 * distance / SPEED_OF_SOUND_CM_S * 1e9)
+        self._pulses[echo_pin] = (rise, rise + width)
+        self._schedule(rise, echo_pin, self.HIGH)
+        self._schedule(rise + width, echo_pin, self.LOW)
+
+    def _schedule(self, at_ns, pin, level):
+        with self._event_cond:
+            self._event_seq += 1
+            heapq.heappush(self._events, (at_ns, self._event_seq, pin, level))
+            self._event_cond.notify()
+        self._ensure_event_thread()
+
+    def _ensure_event_thread(self):
+        with self._lock:
+            if self._event_thread is None or not self._event_thread.is_alive():
+                self._event_thread = threading.Thread(target=self._event_loop, name="sim-gpio-events", daemon=True)
+                self._event_thread.start()
+
+    def _event_loop(self):
+        """Apply scheduled input edges in time order and fire edge callbacks, like RPi.GPIO's callback thread"""
+        while True:
+            with self._event_cond:
+                while not self._events:
+                    self._event_cond.wait()
+                at_ns, _, pin, level = self._events[0]
+                delay = at_ns - time.monotonic_ns()
+                if delay > EVENT_SPIN_NS:
+                    self._event_cond.wait((delay - EVENT_SPIN_NS) / 1e9)
+                    continue
+                if delay > 0:
+                    # Spin out the last stretch so edges land close to their scheduled time
+                    self._event_cond.wait(0)
+                    continue
+                heapq.heappop(self._events)
+                old = self._levels.get(pin, self.LOW)
+                self._levels[pin] = level
+                if old == level:
+                    continue
+                self.trace.append((at_ns, pin, level))
+                edge, callbacks = self._callbacks.get(pin, (None, ()))
+                fire = edge == self.BOTH or edge == (self.RISING if level else self.FALLING)
+                if fire:
+                    self._detected.add(pin)
+                    callbacks = list(callbacks)
+            if fire:
+                for callback in callbacks:
+                    try:
+                        callback(pin)
+                    except Exception as e:
+                        print(f"⚠️ Error in simulated GPIO callback for pin {pin}: {e}")
+
+
+class SimulatedSerial:
+    """Stand-in for serial.Serial that replays configured lines"""
+
+    def __init__(self, port, baudrate=9600, timeout=1, lines=None):
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.lines = collections.deque(lines or [b"100\n"])
+        self.is_open = True
+
+    def readline(self):
+        if not self.lines:
+            time.sleep(self.timeout or 0)
+            return b""
+        line = self.lines.popleft()
+        self.lines.append(line)
+        return line
+
+    def close(self):
+        self.is_open = False
+
+
+def _backend_name():
+    return os.environ.get("ROBOT_GPIO_BACKEND", "rpi").lower()
+
+
+def _load_gpio():
+    name = _backend_name()
+    if name != "sim":
+        try:
+            import RPi.GPIO as gpio
+            return gpio
+        except ImportError as e:
+            if name != "auto":
+                raise ImportError(f"RPi.GPIO not available ({e}); set ROBOT_GPIO_BACKEND=sim to simulate") from e
+            print(f"⚠️ RPi.GPIO not installed ({e}), using simulated GPIO")
+    return SimulatedGPIO()
+
+
+def is_simulated():
+    return isinstance(GPIO, SimulatedGPIO)
+
+
+def open_serial(port, baudrate=9600, timeout=1):
+    """Open the battery serial port, or a simulated one when GPIO is simulated"""
+    if is_simulated():
+        return SimulatedSerial(port, baudrate, timeout)
+    import serial
+    return serial.Serial(port, baudrate, timeout=timeout)
+
+
+GPIO = _load_gpio()
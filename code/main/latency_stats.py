@@ -0,0 +1,262 @@
+# latency_stats.py
+"""
+Per-stage command latency recording for the robot control path.
+
+Each stage (network age, JSON decode, dispatch, GPIO write completion, ...)
+is kept in a fixed-memory log-linear histogram in the spirit of
+HdrHistogram: 32 sub-buckets per power of two (~3% relative error) over
+0 us .. ~67 s, so memory does not grow with the number of commands.
+
+Stats can be queried locally over a Unix socket:
+    python3 latency_stats.py          # print current percentiles
+    python3 latency_stats.py reset    # clear all histograms
+    python3 latency_stats.py pose     # any extra handler registered by the robot (raw JSON)
+and a compact interval summary is published periodically over MQTT.
+"""
+
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from array import array
+
+SUB_BUCKET_BITS = 5
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+HALF_SUB_BUCKETS = SUB_BUCKETS // 2
+MAX_VALUE_US = (1 << 26) - 1   # ~67 s
+BUCKET_COUNT = (MAX_VALUE_US.bit_length() - SUB_BUCKET_BITS + 1) * HALF_SUB_BUCKETS + HALF_SUB_BUCKETS
+
+LATENCY_SOCKET = "/tmp/robot_latency.sock"
+STAGES = ("network", "decode", "dispatch", "gpio")
+
+
+def _bucket_index(value):
+    if value < SUB_BUCKETS:
+        return value
+    shift = value.bit_length() - SUB_BUCKET_BITS
+    return shift * HALF_SUB_BUCKETS + (value >> shift)
+
+
+def _bucket_value(index):
+    """Midpoint of the values that map to a bucket"""
+    if index < SUB_BUCKETS:
+        return index
+    shift = (index - HALF_SUB_BUCKETS) // HALF_SUB_BUCKETS
+    low = (index - shift * HALF_SUB_BUCKETS) << shift
+    return low + ((1 << shift) - 1) // 2
+
+
+class LatencyHistogram:
+    """Fixed-size log-linear histogram of microsecond latencies"""
+
+    __slots__ = ("counts", "total", "clamped", "max_value", "sum_value")
+
+    def __init__(self):
+        self.counts = array("Q", bytes(8 * BUCKET_COUNT))
+        self.total = 0
+        self.clamped = 0     # Values outside 0..MAX_VALUE_US (e.g. negative network age from clock skew)
+        self.max_value = 0
+        self.sum_value = 0
+
+    def record(self, value_us):
+        value = int(value_us)
+        if value < 0 or value > MAX_VALUE_US:
+            self.clamped += 1
+            value = 0 if value < 0 else MAX_VALUE_US
+        self.counts[_bucket_index(value)] += 1
+        self.total += 1
+        self.sum_value += value
+        if value > self.max_value:
+            self.max_value = value
+
+    def percentile(self, pct):
+        if self.total == 0:
+            return 0
+        rank = max(1, int(self.total * pct / 100.0 + 0.5))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count:
+                seen += count
+                if seen >= rank:
+                    return min(_bucket_value(index), self.max_value)
+        return self.max_value
+
+    def mean(self):
+        return self.sum_value / self.total if self.total else 0.0
+
+    def copy(self):
+        other = LatencyHistogram()
+        other.counts = array("Q", self.counts)
+        other.total = self.total
+        other.clamped = self.clamped
+        other.max_value = self.max_value
+        other.sum_value = self.sum_value
+        return other
+
+    def merge(self, other):
+        """Add another histogram's values (e.g. from another process) to this one"""
+        for index, count in enumerate(other.counts):
+            if count:
+                self.counts[index] += count
+        self.total += other.total
+        self.clamped += other.clamped
+        self.sum_value += other.sum_value
+        self.max_value = max(self.max_value, other.max_value)
+
+    def since(self, earlier):
+        """Histogram of the values recorded after the `earlier` copy was taken"""
+        other = LatencyHistogram()
+        other.counts = array("Q", (a - b for a, b in zip(self.counts, earlier.counts)))
+        other.total = self.total - earlier.total
+        other.clamped = self.clamped - earlier.clamped
+        other.sum_value = self.sum_value - earlier.sum_value
+        # The exact interval max is unknown; bound it by the top populated bucket
+        top = max((i for i, c in enumerate(other.counts) if c), default=None)
+        other.max_value = min(self.max_value, _bucket_value(top)) if top is not None else 0
+        return other
+
+    def summary(self):
+        return {
+            "n": self.total,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "max": self.max_value,
+            "mean": round(self.mean(), 1),
+            "clamped": self.clamped,
+        }
+
+
+class LatencyRecorder:
+    """Thread-safe set of per-stage histograms"""
+
+    def __init__(self, stages=STAGES):
+        self._lock = threading.Lock()
+        self.histograms = {stage: LatencyHistogram() for stage in stages}
+        self._last_published = {stage: LatencyHistogram() for stage in stages}
+
+    def record(self, stage, value_us):
+        with self._lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = LatencyHistogram()
+                self._last_published[stage] = LatencyHistogram()
+            histogram.record(value_us)
+
+    def record_ns(self, stage, start_ns, end_ns=None):
+        end_ns = time.monotonic_ns() if end_ns is None else end_ns
+        self.record(stage, (end_ns - start_ns) // 1000)
+
+    def snapshot(self):
+        with self._lock:
+            return {stage: h.summary() for stage, h in self.histograms.items()}
+
+    def interval_summary(self):
+        """Compact per-stage [n, p50, p99, max] since the previous call, in us"""
+        with self._lock:
+            summary = {}
+            for stage, histogram in self.histograms.items():
+                interval = histogram.since(self._last_published[stage])
+                self._last_published[stage] = histogram.copy()
+                if interval.total:
+                    summary[stage] = [interval.total, interval.percentile(50),
+                                      interval.percentile(99), interval.max_value]
+            return summary
+
+    def reset(self):
+        with self._lock:
+            for stage in list(self.histograms):
+                self.histograms[stage] = LatencyHistogram()
+                self._last_published[stage] = LatencyHistogram()
+
+
+# Process-wide recorder used by the command path
+recorder = LatencyRecorder()
+
+
+def start_query_server(latency_recorder=recorder, path=LATENCY_SOCKET, handlers=None):
+    """Serve JSON snapshots over a Unix socket ("stats" / "reset" per connection).
+
+    handlers maps extra request names to callables returning JSON-able data.
+    """
+    handlers = dict(handlers or {})
+    try:
+        if os.path.exists(path):
+            os.remove(path)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(path)
+        server.listen(4)
+    except OSError as e:
+        print(f"⚠️ Latency query socket unavailable: {e}")
+        return None
+
+    def serve():
+        while True:
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                return
+            with conn:
+                try:
+                    request = conn.recv(64).decode().strip() or "stats"
+                    if request == "reset":
+                        latency_recorder.reset()
+                        reply = {"reset": True}
+                    elif request in handlers:
+                        reply = handlers[request]()
+                    else:
+                        reply = latency_recorder.snapshot()
+                    conn.sendall((json.dumps(reply) + "\n").encode())
+                except OSError:
+                    pass
+
+    threading.Thread(target=serve, name="latency-query", daemon=True).start()
+    return server
+
+
+def publish_summary(publish, latency_recorder=recorder):
+    """publish(payload) the compact summary of the interval since the last call, if anything was recorded"""
+    summary = latency_recorder.interval_summary()
+    if not summary:
+        return
+    payload = json.dumps({"type": "latency_summary", "unit": "us",
+                          "ts": int(time.time() * 1000), "stages": summary},
+                         separators=(",", ":"))
+    try:
+        publish(payload)
+    except Exception as e:
+        print(f"⚠️ Error publishing latency summary: {e}")
+
+
+def query(request="stats", path=LATENCY_SOCKET):
+    """Ask a running robot process for its latency stats"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(2)
+        client.connect(path)
+        client.sendall(request.encode())
+        data = b""
+        while not data.endswith(b"\n"):
+            chunk = client.recv(4096)
+            if not chunk:
+                break
+            data += chunk
+    return json.loads(data)
+
+
+if __name__ == "__main__":
+    try:
+        result = query(sys.argv[1] if len(sys.argv) > 1 else "stats")
+    except OSError as e:
+        print(f"❌ Could not reach robot latency socket {LATENCY_SOCKET}: {e}")
+        sys.exit(1)
+    if "reset" in result:
+        print("✅ Latency histograms reset")
+        sys.exit(0)
+    if len(sys.argv) > 1 and sys.argv[1] != "stats":
+        print(json.dumps(result, indent=2))
+        sys.exit(0)
+    print(f"{'stage':<10} {'n':>8} {'p50 us':>10} {'p90 us':>10} {'p99 us':>10} {'max us':>10}")
+    for stage, s in result.items():
+        print(f"{stage:<10} {s['n']:>8} {s['p50']:>10} {s['p90']:>10} {s['p99']:>10} {s['max']:>10}")
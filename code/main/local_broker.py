@@ -0,0 +1,187 @@
+# local_broker.py
+"""
+Offline stand-in for the AWS IoT broker, for benchmarks on a developer machine.
+
+LocalBroker has the AWSIoTMQTTClient methods the robot code uses (connect,
+disconnect, publish, subscribe, unsubscribe and the configure* calls, which
+are accepted and ignored). serve() puts it behind an MqttHub on a Unix
+socket. Every process can then reach it with a HubClient as if it were the
+shared AWS IoT session: the robot (motor_thread.customCallback subscribed to
+its topic) and any number of synthetic controllers.
+
+Like a real broker, each subscription has a bounded queue (max_queued
+messages) drained by its own delivery thread. A subscriber that cannot keep
+up loses new messages once its queue is full; they are counted per
+subscription in stats(). latency=(low, high) delays every delivery by a
+uniform random one-way latency in seconds; the order per subscription is
+kept.
+
+    python3 local_broker.py [--socket /tmp/robot_local_broker.sock] [--max-queued 1000] [--latency-ms 20,150]
+"""
+
+import argparse
+import collections
+import random
+import threading
+import time
+
+from mqtt_hub import HubMessage, MqttHub, topic_matches
+
+LOCAL_BROKER_SOCKET = "/tmp/robot_local_broker.sock"
+MAX_QUEUED = 1000
+
+
+class _Subscription:
+    def __init__(self, broker, topic_filter, qos, callback):
+        self.broker = broker
+        self.topic_filter = topic_filter
+        self.qos = qos
+        self.callback = callback
+        self.queue = collections.deque()    # (due monotonic s, HubMessage)
+        self.cond = threading.Condition()
+        self.active = True
+        self.delivered = 0
+        self.dropped = 0
+        self.peak = 0
+        threading.Thread(target=self._run, name=f"broker-{topic_filter}", daemon=True).start()
+
+    def put(self, due, message):
+        with self.cond:
+            if len(self.queue) >= self.broker.max_queued:
+                self.dropped += 1
+                return False
+            self.queue.append((due, message))
+            self.peak = max(self.peak, len(self.queue))
+            self.cond.notify()
+        return True
+
+    def close(self):
+        with self.cond:
+            self.active = False
+            self.cond.notify()
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while self.active and not self.queue:
+                    self.cond.wait()
+                if not self.active:
+                    return
+                due, message = self.queue[0]
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            with self.cond:
+                if not self.active:
+                    return
+                self.queue.popleft()
+            try:
+                self.callback(self.broker, None, message)
+                self.delivered += 1
+            except Exception as e:
+                print(f"⚠️ Local broker subscriber for {self.topic_filter} failed: {e}")
+
+
+class LocalBroker:
+    """In-process broker with the AWSIoTMQTTClient surface (see module docstring)"""
+
+    def __init__(self, max_queued=MAX_QUEUED, latency=None, seed=None):
+        self.max_queued = max_queued
+        self.latency = latency
+        self.rng = random.Random(seed)
+        self.connected = True
+        self.published = 0
+        self._lock = threading.Lock()
+        self._subscriptions = {}    # topic filter -> _Subscription
+        self._closed = []           # Unsubscribed ones, still counted in stats()
+
+    def __getattr__(self, name):
+        if name.startswith("configure"):
+            return lambda *args, **kwargs: True
+        raise AttributeError(name)
+
+    def connect(self):
+        self.connected = True
+        return True
+
+    def disconnect(self):
+        self.connected = False
+        return True
+
+    def publish(self, topic, payload, qos=0):
+        if not self.connected:
+            raise ConnectionError("local broker: not connected")
+        self.published += 1
+        due = time.monotonic() + (self.rng.uniform(*self.latency) if self.latency else 0.0)
+        message = HubMessage(topic, payload if isinstance(payload, (bytes, bytearray)) else payload.encode(), qos)
+        with self._lock:
+            subscriptions = [s for f, s in self._subscriptions.items() if topic_matches(f, topic)]
+        for subscription in subscriptions:
+            subscription.put(due, message)
+        return True
+
+    def subscribe(self, topic, qos, callback):
+        with self._lock:
+            previous = self._subscriptions.pop(topic, None)
+            self._subscriptions[topic] = _Subscription(self, topic, qos, callback)
+        if previous:
+            self._close(previous)
+        return True
+
+    def unsubscribe(self, topic):
+        with self._lock:
+            subscription = self._subscriptions.pop(topic, None)
+        if subscription:
+            self._close(subscription)
+        return True
+
+    def stats(self):
+        """Per topic filter, summed over every subscription it had (a hub resubscribes per session)"""
+        with self._lock:
+            subscriptions = self._closed + list(self._subscriptions.values())
+        by_filter = {}
+        for s in subscriptions:
+            entry = by_filter.setdefault(s.topic_filter, {"delivered": 0, "dropped": 0, "queued": 0, "peakQueued": 0})
+            entry["delivered"] += s.delivered
+            entry["dropped"] += s.dropped
+            entry["queued"] += len(s.queue) if s.active else 0
+            entry["peakQueued"] = max(entry["peakQueued"], s.peak)
+        return {"published": self.published, "subscriptions": by_filter}
+
+    def _close(self, subscription):
+        subscription.close()
+        with self._lock:
+            self._closed.append(subscription)
+
+
+def serve(path=LOCAL_BROKER_SOCKET, **options):
+    """Start a LocalBroker behind an MqttHub on path; returns the hub (hub.client is the broker)"""
+    hub = MqttHub(LocalBroker(**options), path)
+    if not hub.start():
+        raise OSError(f"cannot listen on {path}")
+    return hub
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local MQTT broker stand-in (HubClient protocol)")
+    parser.add_argument("--socket", default=LOCAL_BROKER_SOCKET)
+    parser.add_argument("--max-queued", type=int, default=MAX_QUEUED, help="per-subscription queue limit")
+    parser.add_argument("--latency-ms", help="one-way delivery latency range, e.g. 20,150")
+    parser.add_argument("--stats", type=float, default=10.0, help="print stats every N seconds")
+    args = parser.parse_args()
+
+    latency = tuple(float(v) / 1000 for v in args.latency_ms.split(",")) if args.latency_ms else None
+    hub = serve(args.socket, max_queued=args.max_queued, latency=latency)
+    print(f"🧪 Local broker on {args.socket} (max {args.max_queued} queued per subscription)")
+    try:
+        while True:
+            time.sleep(args.stats)
+            print(f"📊 {hub.client.stats()}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        hub.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+# motion_script.py
+"""
+On-robot execution of multi-step motion scripts.
+
+A script message replaces N separate drive messages (and N round trips):
+
+    {"type": "script", "id": "dock-17", "timestamp": 1712345678901,
+     "steps": [["ArrowLeft", 0.2], ["ArrowLeft", 0.2], {"key": "ArrowUp", "duration": 0.3}]}
+
+Steps may be [key, duration], {"key", "duration", "speed"} or a bare key
+(default duration). The script runs as one unit on a resident worker thread;
+any manual drive command or newer script pre-empts it. Forward/backward
+steps are still gated on the obstacle flags before and during the step,
+and a script_status message reports how it ended.
+"""
+
+import threading
+import time
+
+DEFAULT_STEP_DURATION = 0.2
+MAX_STEPS = 64
+MAX_SCRIPT_SECONDS = 30.0
+STEP_OVERLAP = 0.05          # Stop deadline slack so consecutive steps blend without a stop in between
+OBSTACLE_POLL_INTERVAL = 0.02
+SCRIPT_KEYS = ("ArrowUp", "ArrowDown", "ArrowLeft", "ArrowRight")
+
+
+def parse_steps(raw_steps):
+    """Normalise script steps to [(key, duration, speed)]; raises ValueError on bad input"""
+    if not isinstance(raw_steps, list) or not raw_steps:
+        raise ValueError("script has no steps")
+    if len(raw_steps) > MAX_STEPS:
+        raise ValueError(f"script has {len(raw_steps)} steps (max {MAX_STEPS})")
+    steps = []
+    for raw in raw_steps:
+        speed = None
+        if isinstance(raw, str):
+            key, duration = raw, DEFAULT_STEP_DURATION
+        elif isinstance(raw, (list, tuple)) and raw:
+            key = raw[0]
+            duration = raw[1] if len(raw) > 1 else DEFAULT_STEP_DURATION
+        elif isinstance(raw, dict):
+            key = raw.get("key")
+            duration = raw.get("duration", DEFAULT_STEP_DURATION)
+            speed = raw.get("speed")
+        else:
+            raise ValueError(f"bad script step {raw!r}")
+        if key not in SCRIPT_KEYS:
+            raise ValueError(f"unknown script step key {key!r}")
+        duration = float(duration)
+        if duration <= 0:
+            raise ValueError(f"non-positive step duration {duration}")
+        steps.append((key, duration, speed))
+    if sum(step[1] for step in steps) > MAX_SCRIPT_SECONDS:
+        raise ValueError(f"script longer than {MAX_SCRIPT_SECONDS:.0f}s")
+    return steps
+
+
+class MotionScript:
+    def __init__(self, script_id, steps):
+        self.id = script_id
+        self.steps = steps
+        self.done_steps = 0
+        self.status = "pending"
+        self.started = None
+
+
+class ScriptRunner:
+    """Resident worker that runs one motion script at a time.
+
+    step(key, duration, speed) drives the motors and arms their stop
+    deadline, stop() stops them, is_blocked(key) applies obstacle gating and
+    report(status_dict) publishes the outcome.
+    """
+
+    def __init__(self, step, stop, is_blocked, report):
+        self._step = step
+        self._stop = stop
+        self._is_blocked = is_blocked
+        self._report = report
+        self._cond = threading.Condition()
+        self._pending = None
+        self._active = None
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name="motion-script", daemon=True)
+        self._thread.start()
+
+    def shutdown(self):
+        with self._cond:
+            self._running = False
+            self._preempt_locked()
+            self._cond.notify_all()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(1.0)
+        self._thread = None
+
+    def submit(self, script_id, steps):
+        """Queue a parsed script, pre-empting whatever is running"""
+        script = MotionScript(script_id, steps)
+        with self._cond:
+            self._preempt_locked()
+            self._pending = script
+            self._cond.notify_all()
+        return script
+
+    def preempt(self):
+        """Cancel the running script (e.g. a manual command arrived); returns True if one was running"""
+        with self._cond:
+            return self._preempt_locked()
+
+    def is_active(self):
+        with self._cond:
+            return self._active is not None
+
+    def _preempt_locked(self):
+        preempted = False
+        if self._pending is not None:
+            self._finish(self._pending, "preempted")
+            self._pending = None
+            preempted = True
+        if self._active is not None and self._active.status == "running":
+            # Checked under the same lock before every step, so no further step is issued
+            self._active.status = "preempted"
+            self._cond.notify_all()
+            preempted = True
+        return preempted
+
+    def _finish(self, script, status):
+        script.status = status
+        elapsed = 0 if script.started is None else int((time.monotonic() - script.started) * 1000)
+        try:
+            self._report({"type": "script_status", "id": script.id, "status": status,
+                          "steps": script.done_steps, "total": len(script.steps),
+                          "elapsedMs": elapsed})
+        except Exception as e:
+            print(f"⚠️ Error reporting script status: {e}")
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and self._pending is None:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                script, self._pending = self._pending, None
+                script.status = "running"
+                script.started = time.monotonic()
+                self._active = script
+            print(f"📜 Running motion script {script.id} ({len(script.steps)} steps)")
+            status = self._execute(script)
+            with self._cond:
+                self._active = None
+            if status != "completed":
+                print(f"📜 Motion script {script.id} {status} after {script.done_steps}/{len(script.steps)} steps")
+            self._finish(script, status)
+
+    def _execute(self, script):
+        last = len(script.steps) - 1
+        for index, (key, duration, speed) in enumerate(script.steps):
+            with self._cond:
+                if script.status != "running":
+                    return script.status
+                if self._is_blocked(key):
+                    self._stop(True)
+                    return "blocked"
+                overlap = 0.0 if index == last else STEP_OVERLAP
+                self._step(key, duration + overlap, speed)
+            end = time.monotonic() + duration
+            with self._cond:
+                while script.status == "running":
+                    remaining = end - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(min(remaining, OBSTACLE_POLL_INTERVAL))
+                    if script.status == "running" and self._is_blocked(key):
+                        self._stop(True)
+                        return "blocked"
+                if script.status != "running":
+                    # Pre-empted: the new command owns the motors now
+                    return script.status
+            script.done_steps += 1
+        with self._cond:
+            if script.status != "running":
+                return script.status
+            self._stop(False)
+        return "completed"
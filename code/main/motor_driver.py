@@ -0,0 +1,176 @@
+# motor_driver.py
+import threading
+import time
+
+
+class Wheel:
+    """One L298 channel driven by software PWM on its two direction pins"""
+
+    def __init__(self, gpio, forward_pin, reverse_pin, frequency):
+        self.forward_pwm = gpio.PWM(forward_pin, frequency)
+        self.reverse_pwm = gpio.PWM(reverse_pin, frequency)
+        self.forward_pwm.start(0)
+        self.reverse_pwm.start(0)
+        self.pins = (forward_pin, reverse_pin)
+        self.on_write = None  # on_write(wheel, duty) after the pins have changed
+        self.duty = 0.0      # Signed duty actually on the pins (-100..100)
+        self.target = 0.0    # Signed duty we are ramping towards
+
+    def write(self, duty):
+        """Drive the pins for a signed duty; only touches the PWM that changes"""
+        old = self.duty
+        self.duty = duty
+        if duty >= 0:
+            if old < 0:
+                self.reverse_pwm.ChangeDutyCycle(0)
+            self.forward_pwm.ChangeDutyCycle(duty)
+        else:
+            if old > 0:
+                self.forward_pwm.ChangeDutyCycle(0)
+            self.reverse_pwm.ChangeDutyCycle(-duty)
+        if self.on_write:
+            self.on_write(self, duty)
+
+    def stop(self):
+        self.forward_pwm.stop()
+        self.reverse_pwm.stop()
+
+
+class MotorDriver:
+    """Per-wheel PWM speed targets applied by a fixed-rate control loop with ramps.
+
+    Motion commands only set targets; the control loop moves each wheel's duty
+    towards its target by at most accel (or decel, when slowing) percent per
+    second, and sleeps on a condition while both wheels are stopped.
+    """
+
+    def __init__(self, gpio, left_pins, right_pins, pwm_frequency=1000,
+                 rate_hz=100, accel=400.0, decel=600.0, clock=time):
+        self.left = Wheel(gpio, left_pins[0], left_pins[1], pwm_frequency)
+        self.right = Wheel(gpio, right_pins[0], right_pins[1], pwm_frequency)
+        self.wheels = (self.left, self.right)
+        self.period = 1.0 / rate_hz
+        self.accel = accel
+        self.decel = decel
+        self.ticks = 0
+        self.clock = clock
+        self.on_applied = None   # on_applied(issued_ns) once a target reaches the control loop
+        self.on_tick = None      # on_tick(left_duty, right_duty, dt): duties held over the last dt seconds
+        self._pending_ns = []    # issued_ns of commands set since the last tick, oldest first
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        """Start the control loop thread (idempotent)"""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name="motor-driver", daemon=True)
+        self._thread.start()
+
+    def shutdown(self):
+        """Stop the control loop, cut both wheels and release the PWM channels"""
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(1.0)
+        self._thread = None
+        self.stop(immediate=True)
+        for wheel in self.wheels:
+            wheel.stop()
+
+    def set_targets(self, left, right, issued_ns=None):
+        """Set signed duty targets (-100..100) for the left and right wheels.
+
+        issued_ns (monotonic_ns when the command arrived) is handed to
+        on_applied once the control loop has written the new duties.
+        """
+        left = max(-100.0, min(100.0, float(left)))
+        right = max(-100.0, min(100.0, float(right)))
+        with self._cond:
+            self.left.target = left
+            self.right.target = right
+            if issued_ns is not None and self.on_applied:
+                if self.left.duty == left and self.right.duty == right:
+                    # Pins already carry these duties (key repeat); nothing left to write
+                    self.on_applied(issued_ns)
+                else:
+                    # Kept per command: a second one before the next tick must not hide the first
+                    self._pending_ns.append(issued_ns)
+            self._cond.notify()
+
+    def stop(self, immediate=False):
+        """Ramp both wheels down, or cut them on the spot when immediate"""
+        with self._cond:
+            for wheel in self.wheels:
+                wheel.target = 0.0
+                if immediate and wheel.duty != 0.0:
+                    wheel.write(0.0)
+            self._cond.notify()
+
+    def is_moving(self):
+        return any(wheel.duty != 0.0 or wheel.target != 0.0 for wheel in self.wheels)
+
+    def tick(self, dt):
+        """Advance every wheel one ramp step; returns True while any wheel is still ramping"""
+        ramping = False
+        for wheel in self.wheels:
+            duty, target = wheel.duty, wheel.target
+            if duty == target:
+                continue
+            if duty != 0.0 and (duty > 0) != (target > 0):
+                # Stopping or reversing: brake to zero first
+                goal, rate = 0.0, self.decel
+            elif abs(target) < abs(duty):
+                goal, rate = target, self.decel
+            else:
+                goal, rate = target, self.accel
+            step = rate * dt
+            if duty < goal:
+                duty = min(goal, duty + step)
+            else:
+                duty = max(goal, duty - step)
+            wheel.write(duty)
+            if duty != target:
+                ramping = True
+        self.ticks += 1
+        if self._pending_ns:
+            pending, self._pending_ns = self._pending_ns, []
+            for issued_ns in pending:
+                self.on_applied(issued_ns)
+        return ramping
+
+    def step(self, dt):
+        """One control-loop iteration: report the duties held over dt, then ramp.
+        Returns True while the wheels are moving or ramping."""
+        with self._cond:
+            if self.on_tick:
+                self.on_tick(self.left.duty, self.right.duty, dt)
+            ramping = self.tick(dt)
+            return ramping or self.left.duty != 0.0 or self.right.duty != 0.0
+
+    def _run(self):
+        clock = self.clock
+        last_tick = next_tick = clock.monotonic()
+        with self._cond:
+            while self._running:
+                now = clock.monotonic()
+                # Use the real elapsed time so early wake-ups don't speed up the ramp
+                dt = min(now - last_tick, 2 * self.period)
+                last_tick = now
+                if not self.step(dt):
+                    # Stopped: sleep until a new target arrives
+                    self._cond.wait_for(lambda: not self._running or any(
+                        wheel.duty != wheel.target for wheel in self.wheels))
+                    last_tick = next_tick = clock.monotonic() - self.period
+                    continue
+                next_tick += self.period
+                delay = next_tick - clock.monotonic()
+                if delay > 0:
+                    self._cond.wait(delay)
+                else:
+                    # Fell behind (e.g. scheduler hiccup); resync rather than burst
+                    next_tick = clock.monotonic()
@@ -0,0 +1,96 @@
+# motor_scheduler.py
+import threading
+import time
+
+
+class MotorScheduler:
+    """One resident thread that stops the motors when the current stop deadline passes.
+
+    Every drive command replaces the deadline instead of spawning a new
+    threading.Timer, so a burst of key-repeat commands costs a lock and a
+    float store each and the thread only wakes when the deadline moves earlier.
+    """
+
+    def __init__(self, stop_callback, name="motor-scheduler", clock=time):
+        self._stop_callback = stop_callback
+        self._name = name
+        self._clock = clock
+        self._cond = threading.Condition()
+        self._deadline = None
+        self._running = False
+        self._thread = None
+        self.commands = 0
+        self.stops = 0
+
+    def start(self):
+        """Start the scheduler thread (idempotent)"""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name=self._name, daemon=True)
+        self._thread.start()
+
+    def shutdown(self, timeout=1.0):
+        """Stop the scheduler thread without firing the pending stop"""
+        with self._cond:
+            self._running = False
+            self._deadline = None
+            self._cond.notify()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self._thread = None
+
+    def extend(self, timeout):
+        """Replace the stop deadline with now + timeout seconds"""
+        deadline = self._clock.monotonic() + timeout
+        with self._cond:
+            self.commands += 1
+            earlier = self._deadline is None or deadline < self._deadline
+            self._deadline = deadline
+            # A later deadline is picked up when the thread wakes for the old one
+            if earlier:
+                self._cond.notify()
+
+    def cancel(self):
+        """Drop the pending stop deadline"""
+        with self._cond:
+            self._deadline = None
+
+    def pending(self):
+        """Seconds until the pending stop, or None when idle"""
+        with self._cond:
+            if self._deadline is None:
+                return None
+            return max(0.0, self._deadline - self._clock.monotonic())
+
+    def poll(self):
+        """Fire the stop if its deadline has passed, for callers that drive the
+        scheduler without its thread (sim_harness); returns pending()"""
+        with self._cond:
+            return self._fire_due()
+
+    def _fire_due(self):
+        # Caller holds self._cond
+        if self._deadline is None:
+            return None
+        remaining = self._deadline - self._clock.monotonic()
+        if remaining > 0:
+            return remaining
+        self._deadline = None
+        self.stops += 1
+        # Called under the lock so a command arriving now cannot have
+        # its freshly driven pins overwritten by this stop
+        try:
+            self._stop_callback()
+        except Exception as e:
+            print(f"⚠️ Error in motor stop callback: {e}")
+        return None
+
+    def _run(self):
+        with self._cond:
+            while self._running:
+                remaining = self._fire_due()
+                if remaining is None and self._deadline is not None:
+                    continue    # The stop callback armed a new deadline
+                self._cond.wait(remaining)
@@ -6,12 +6,30 @@ import threading
 import multiprocessing
 import signal
 import sys
-from AWSIoTPythonSDK.MQTTLib import AWSIoTMQTTClient
 from ultrasonic_thread2 import measure_distance
-import RPi.GPIO as GPIO
+from gpio_backend import GPIO
 import subprocess
 import signal
 import read_battery_precentage
+from motor_scheduler import MotorScheduler
+from motor_driver import MotorDriver
+from config_manager import load_motor_config, load_sensor_config, load_telemetry_config, load_offline_queue_config
+import latency_stats
+import control_codec
+import motion_script
+import clock_sync
+from odometry import Odometry, pose_publisher
+from wheel_encoder import create_encoders
+import obstacle_guard
+import sensor_snapshot
+import flight_recorder
+from mqtt_hub import MqttHub
+from offline_queue import OfflinePublisher
+import command_ack
+import command_filter
+from telemetry import TelemetryAggregator
+from credential_rotation import CREDENTIAL_KEYS, POLL_INTERVAL_S, CredentialRotator, write_credentials
+from robot_runtime import RobotRuntime
 
 # Motor GPIO pins
 IN1, IN2 = 13, 27
@@ -25,13 +43,41 @@ GPIO.setup(IN3, GPIO.OUT)
 GPIO.setup(IN4, GPIO.OUT)
 
 # Global variables
-distence = 50
-shared_distances = multiprocessing.Array('d', [100.0, 100.0])  # [front, back]
-blocked_directions = multiprocessing.Array('b', [0, 0])        # [front_blocked, back_blocked]
-motor_timer = None
+clock = time   # Time source for dispatch, stop deadlines and obstacle checks (sim_harness swaps in a VirtualClock)
+motor_config = load_motor_config()
+sensor_config = load_sensor_config()
+SENSOR_NAMES = [sensor.get("name", f"sensor{i}") for i, sensor in enumerate(sensor_config["sensors"])]
+SENSOR_COUNT = len(SENSOR_NAMES)
+# Sensor indices whose obstacles block each straight drive key (turns are never gated)
+GATED_SENSORS = {key: [i for i, sensor in enumerate(sensor_config["sensors"]) if sensor.get("gates") == key]
+                 for key in ("ArrowUp", "ArrowDown")}
+STALE_AFTER_S = sensor_config["staleAfterS"]
+# Shared with the ultrasonic process, one slot per configured sensor; created by open_sensor_snapshot()
+sensor_readings = None                                              # Seqlock: distance, confidence, closing, blocked, timestamp
+approach_speeds = multiprocessing.Array('d', [0.0] * SENSOR_COUNT)  # cm/s we are driving towards the sensor
+obstacle_event = multiprocessing.Event()                            # Set by the sensor process when a sensor becomes blocked
+battery_level = float("nan")                                        # Last battery percentage parsed by the battery task
+obstacle_envelope = obstacle_guard.envelope_from_config(motor_config, SENSOR_COUNT)
+obstacle_gate = None                                                # Sensor-process side of the snapshot, with it
+obstacle_watcher = None
+motor_scheduler = None
+motor_driver = None
+encoders = None
+script_runner = None
+link_clock = clock_sync.ClockSync(clock)   # Per-controller clock offset for staleness / latency
+odometry = Odometry(motor_config)
+flight = None   # Motor-process flight recorder ring, opened in main()
+telemetry = None   # Batched telemetry publisher, started in main()
 mqtt_client = None
+mqtt_hub = None   # Shares mqtt_client's session with system_control and local tools
+offline_publisher = None   # Bounded, prioritised queue for publishes while the session is down
+credential_rotator = None   # Swaps fresh IAM credentials into mqtt_client without a restart
+ack_batcher = None   # Coalesced drive-command acks on <topic>/ack, started in main()
+runtime = None   # asyncio loop hosting dispatch and the periodic workers, started in main()
+command_sequences = command_filter.SequenceFilter()   # Per-controller seq window: drops QoS 1 redeliveries
+command_backlog = None   # Late bursts run only their newest command (set below execute_drive_command)
+topic = None
 ultrasonic_process = None
-obstacle_process = None
 system_running = True
 video_process = None
 
@@ -57,19 +103,38 @@ def save_system_state(state):
 
 def cleanup_and_exit():
     """Clean up resources and exit"""
-    global mqtt_client, ultrasonic_process, obstacle_process, motor_timer, system_running,read_battery_precentage_process
+    global mqtt_client, ultrasonic_process, motor_scheduler, motor_driver, script_runner, obstacle_watcher, system_running
     
     print("🧹 Starting cleanup process...")
     system_running = False
+
+    # Stop the runtime's workers (dispatch, telemetry, battery, ...)
+    if runtime:
+        runtime.stop()
+    
+    # Stop any running motion script
+    if script_runner:
+        script_runner.shutdown()
+    
+    # Stop the obstacle watcher
+    if obstacle_watcher:
+        obstacle_watcher.shutdown()
     
-    # Stop motor timer
-    if motor_timer:
-        motor_timer.cancel()
+    # Stop motor scheduler
+    if motor_scheduler:
+        motor_scheduler.shutdown()
     
     # Stop motors
-    motor_stop()
+    motor_stop(immediate=True)
+    if motor_driver:
+        motor_driver.shutdown()
+        motor_driver = None
     
     # Disconnect MQTT
+    if mqtt_hub:
+        mqtt_hub.shutdown()
+    if offline_publisher:
+        offline_publisher.shutdown()
     if mqtt_client:
         try:
             mqtt_client.disconnect()
@@ -85,22 +150,16 @@ def cleanup_and_exit():
             ultrasonic_process.kill()
         print("📏 Ultrasonic process terminated")
     
-    if obstacle_process and obstacle_process.is_alive():
-        obstacle_process.terminate()
-        obstacle_process.join(timeout=5)
-        if obstacle_process.is_alive():
-            obstacle_process.kill()
-        print("🚧 Obstacle monitoring process terminated")
-
     if video_process and video_process.poll() is None:
         print("🛑 Terminating video process...")
         video_process.terminate()
         video_process.wait()
 
-    if read_battery_precentage_process and read_battery_precentage_process.is_alive():
-        print("🛑 Terminating read battery precentage process...")
-        read_battery_precentage_process.terminate()
-        read_battery_precentage_process.wait()
+    if flight:
+        flight.close()
+
+    # Release the sensor snapshot once its writer is gone
+    close_sensor_snapshot()
 
     # GPIO cleanup
     GPIO.cleanup()
@@ -155,88 +214,567 @@ def reconnect_system():
 
 # === Motor control functions ===
 def stop_motor_after_timeout(timeout=0.2):
-    global motor_timer
-    if motor_timer:
-        motor_timer.cancel()
-    motor_timer = threading.Timer(timeout, motor_stop)
-    motor_timer.start()
+    """Arm the stop deadline; called before the pins are driven so a stop
+    firing for the previous deadline cannot land after them"""
+    global motor_scheduler
+    if motor_scheduler is None:
+        motor_scheduler = MotorScheduler(motor_stop, clock=clock)
+        motor_scheduler.start()
+    motor_scheduler.extend(timeout)
+
+def approach_speed(forward_duty):
+    """Calibrated straight-line speed (cm/s) for a signed forward duty %"""
+    calibrated = motor_config["forwardSpeedCmS" if forward_duty >= 0 else "backwardSpeedCmS"]
+    return abs(forward_duty) / motor_config["driveSpeed"] * calibrated
+
+def update_approach_speeds():
+    """Share the speed we are driving (or about to drive) towards each sensor with the obstacle gate"""
+    if motor_driver is None:
+        return
+    left, right = motor_driver.left, motor_driver.right
+    duty = (left.duty + right.duty) / 2.0
+    target = (left.target + right.target) / 2.0
+    speeds = {"ArrowUp": approach_speed(max(duty, target, 0.0)),
+              "ArrowDown": approach_speed(min(duty, target, 0.0))}
+    for key, indices in GATED_SENSORS.items():
+        for i in indices:
+            if approach_speeds[i] != speeds[key]:
+                approach_speeds[i] = speeds[key]
+
+def on_motor_tick(left_duty, right_duty, dt):
+    """Control-loop hook: integrate odometry, check closed-loop distance moves and
+    keep the obstacle gate's view of our speed current"""
+    odometry.update(left_duty, right_duty, dt)
+    if encoders:
+        encoders.on_tick(left_duty, right_duty, dt)
+    update_approach_speeds()
 
-def motor_forward(timeout=0.2):
+def record_pin_write(wheel, duty):
+    """Wheel hook: log every duty written to the motor pins"""
+    if flight:
+        flight.record(flight_recorder.PIN, motor_driver.wheels.index(wheel), *wheel.pins, v1=duty)
+
+def on_command_applied(issued_ns):
+    """Driver hook: a command's targets reached the pins"""
+    latency_stats.recorder.record_ns("gpio", issued_ns, clock.monotonic_ns())
+    if ack_batcher:
+        ack_batcher.actuated(issued_ns)
+
+def start_motor_driver():
+    """Create the PWM motor driver (and optional encoders) and start its ramp control loop"""
+    global motor_driver, encoders
+    if motor_driver is None:
+        motor_driver = MotorDriver(
+            GPIO, (IN1, IN2), (IN3, IN4),
+            pwm_frequency=motor_config["pwmFrequency"],
+            rate_hz=motor_config["controlRate"],
+            accel=motor_config["acceleration"],
+            decel=motor_config["deceleration"],
+            clock=clock
+        )
+        motor_driver.on_applied = on_command_applied
+        motor_driver.on_tick = on_motor_tick
+        for wheel in motor_driver.wheels:
+            wheel.on_write = record_pin_write
+        try:
+            encoders = create_encoders(GPIO, motor_config.get("encoders"), motor_driver)
+            if encoders:
+                print("⚙️ Wheel encoders enabled")
+        except Exception as e:
+            print(f"⚠️ Wheel encoders unavailable, driving open-loop: {e}")
+            encoders = None
+    motor_driver.start()
+
+def drive(left, right, received_ns=None):
+    """Set signed wheel speed targets (duty %); the driver ramps towards them"""
+    if motor_driver is None:
+        start_motor_driver()
+    if encoders:
+        # New targets supersede any distance move in progress
+        encoders.cancel_move()
+        encoders.set_direction(left, right)
+    motor_driver.set_targets(left, right, issued_ns=received_ns)
+    update_approach_speeds()
+
+def motor_forward(timeout=0.2, speed=None, received_ns=None):
     if not system_running:
         return
     print("🚀 Moving forward")
-    GPIO.output(IN1, GPIO.HIGH)
-    GPIO.output(IN2, GPIO.LOW)
-    GPIO.output(IN3, GPIO.HIGH)
-    GPIO.output(IN4, GPIO.LOW)
     stop_motor_after_timeout(timeout)
+    speed = motor_config["driveSpeed"] if speed is None else speed
+    drive(speed, speed, received_ns)
 
-def motor_backward(timeout=0.2):
+def motor_backward(timeout=0.2, speed=None, received_ns=None):
     if not system_running:
         return
     print("🔄 Moving backward")
-    GPIO.output(IN1, GPIO.LOW)
-    GPIO.output(IN2, GPIO.HIGH)
-    GPIO.output(IN3, GPIO.LOW)
-    GPIO.output(IN4, GPIO.HIGH)
     stop_motor_after_timeout(timeout)
+    speed = motor_config["driveSpeed"] if speed is None else speed
+    drive(-speed, -speed, received_ns)
 
-def motor_left(timeout=0.2):
+def motor_left(timeout=0.2, speed=None, received_ns=None):
     if not system_running:
         return
     print("⬅️ Turning left")
-    GPIO.output(IN1, GPIO.LOW)
-    GPIO.output(IN2, GPIO.HIGH)
-    GPIO.output(IN3, GPIO.HIGH)
-    GPIO.output(IN4, GPIO.LOW)
     stop_motor_after_timeout(timeout)
+    speed = motor_config["turnSpeed"] if speed is None else speed
+    drive(-speed, speed, received_ns)
 
-def motor_right(timeout=0.2):
+def motor_right(timeout=0.2, speed=None, received_ns=None):
     if not system_running:
         return
     print("➡️ Turning right")
-    GPIO.output(IN1, GPIO.HIGH)
-    GPIO.output(IN2, GPIO.LOW)
-    GPIO.output(IN3, GPIO.LOW)
-    GPIO.output(IN4, GPIO.HIGH)
     stop_motor_after_timeout(timeout)
+    speed = motor_config["turnSpeed"] if speed is None else speed
+    drive(speed, -speed, received_ns)
+
+def move_distance(key, distance, speed=None, received_ns=None):
+    """Drive straight for distance cm: closed-loop on the encoders, timed from the
+    odometry calibration without them"""
+    forward = key == "ArrowUp"
+    speed = motor_config["driveSpeed"] if speed is None else speed
+    calibrated = motor_config["forwardSpeedCmS" if forward else "backwardSpeedCmS"]
+    expected = abs(distance) / max(1e-3, calibrated * speed / motor_config["driveSpeed"])
+    move = motor_forward if forward else motor_backward
+    if not encoders:
+        move(timeout=expected, speed=speed, received_ns=received_ns)
+        return
+    # Encoders stop the move; the deadline is only a safety net for a stalled wheel
+    move(timeout=expected * 3 + 0.5, speed=speed, received_ns=received_ns)
+    encoders.start_move(abs(distance), on_done=lambda travelled: print(f"📐 Distance move done: {travelled:.1f} cm"))
 
-def motor_stop():
+def motor_stop(immediate=False):
+    """Ramp the wheels down; immediate cuts them at once (obstacles, shutdown)"""
     print("🛑 Stopping motors")
+    if encoders:
+        encoders.cancel_move()
+    if motor_driver:
+        motor_driver.stop(immediate=immediate)
+        update_approach_speeds()
+        return
     GPIO.output(IN1, GPIO.LOW)
     GPIO.output(IN2, GPIO.LOW)
     GPIO.output(IN3, GPIO.LOW)
     GPIO.output(IN4, GPIO.LOW)
 
-# === Obstacle monitoring thread ===
-def monitor_obstacles():
-    global system_running
-    while system_running:
+MOTION_FUNCTIONS = {
+    "ArrowUp": motor_forward,
+    "ArrowDown": motor_backward,
+    "ArrowLeft": motor_left,
+    "ArrowRight": motor_right,
+}
+
+def is_direction_blocked(key, speed=None):
+    """Obstacle gate for a drive key (turns on the spot are never gated).
+
+    Besides the sensor process's flags, the braking envelope is checked for
+    the speed the command is about to drive at (default driveSpeed). Stale
+    or unreadable sensor data counts as blocked.
+    """
+    indices = GATED_SENSORS.get(key)
+    if not indices:
+        return False
+    readings = read_sensors()
+    if readings is None:
+        return True
+    speed = motor_config["driveSpeed"] if speed is None else speed
+    approach = approach_speed(speed if key == "ArrowUp" else -speed)
+    now_ns = clock.monotonic_ns()
+    for i in indices:
+        reading = readings[i]
+        if sensor_snapshot.is_unsafe(reading, now_ns, STALE_AFTER_S):
+            return True
+        if reading.distance < obstacle_envelope.stopping_distance(approach, reading.closing):
+            return True
+    return False
+
+# === Motion scripts ===
+def run_script_step(key, duration, speed):
+    if flight:
+        flight.record(flight_recorder.COMMAND, flight_recorder.SCRIPT_SENDER, control_codec.KEY_OPCODES[key],
+                      v1=float("nan") if speed is None else speed, v2=duration)
+    MOTION_FUNCTIONS[key](timeout=duration, speed=speed)
+
+def get_script_runner():
+    """Create and start the resident motion script runner on first use"""
+    global script_runner
+    if script_runner is None:
+        script_runner = motion_script.ScriptRunner(
+            step=run_script_step,
+            stop=lambda immediate: motor_stop(immediate=immediate),
+            is_blocked=is_direction_blocked,
+            report=publish_message
+        )
+        script_runner.start()
+    return script_runner
+
+def handle_script_message(msg_data):
+    """Validate a script message and hand it to the runner (pre-empting any running script)"""
+    script_id = msg_data.get("id")
+    timestamp = msg_data.get("timestamp")
+    if timestamp is not None:
+        age = link_clock.command_age_ms(timestamp, msg_data.get("sender", 0))
+        if age > 2000:
+            print(f"⏰ Script {script_id} too old, ignoring. Age: {age:.0f}ms")
+            publish_message({"type": "script_status", "id": script_id, "status": "stale"})
+            return
+    try:
+        steps = motion_script.parse_steps(msg_data.get("steps"))
+    except (ValueError, TypeError) as e:
+        print(f"⚠️ Rejecting motion script {script_id}: {e}")
+        publish_message({"type": "script_status", "id": script_id, "status": "rejected", "error": str(e)})
+        return
+    get_script_runner().submit(script_id, steps)
+
+# === Obstacle monitoring ===
+def current_motion_sensors():
+    """Indices of the sensors gating the way the robot is driving (empty when turning/stopped)"""
+    if motor_driver is None:
+        return ()
+    left, right = motor_driver.left, motor_driver.right
+    heading = (left.duty + right.duty) or (left.target + right.target)
+    if heading > 0:
+        return GATED_SENSORS["ArrowUp"]
+    if heading < 0:
+        return GATED_SENSORS["ArrowDown"]
+    return ()
+
+def obstacle_emergency_stop(index, reason="obstacle"):
+    """Cut the active motion the moment a sample blocks (or the sensor goes stale on) the side we are driving towards"""
+    side = SENSOR_NAMES[index]
+    if reason == "stale":
+        print(f"🚨 No fresh {side} sensor data during motion, emergency stop")
+    else:
+        print(f"🚨 Obstacle {side} during motion, emergency stop")
+    if motor_scheduler:
+        motor_scheduler.cancel()
+    motor_stop(immediate=True)
+    readings = read_sensors()
+    distance = round(readings[index].distance, 1) if readings else None
+    publish_message({"type": "obstacle_stop", "side": side, "reason": reason, "distance": distance})
+    if flight:
+        decision = flight_recorder.STALE_STOP if reason == "stale" else flight_recorder.EMERGENCY_STOP
+        flight.record(flight_recorder.DECISION, index, decision, v1=float("nan") if distance is None else distance)
+        # Keep recording through the stop, then freeze and dump
+        flight.dump_later(f"obstacle_stop_{side}")
+
+def request_flight_dump():
+    """MQTT "flight_dump": dump both rings now and report where they went"""
+    if not flight:
+        publish_message({"type": "flight_dump", "status": "unavailable"})
+        return
+    started = flight.dump_later("mqtt_request", delay=0,
+                                done=lambda path: publish_message({"type": "flight_dump", "status": "ok", "path": path}))
+    if not started:
+        publish_message({"type": "flight_dump", "status": "busy"})
+
+def dump_flight(reason):
+    """Freeze and dump the flight recorder right away (crash paths)"""
+    try:
+        print(f"🛬 Flight recorder dumped to {flight.dump(reason)}")
+    except Exception as e:
+        print(f"⚠️ Flight recorder dump failed: {e}")
+
+def install_crash_dump():
+    """Dump the flight recorder when an exception escapes the main thread or any worker thread"""
+    previous_hook, previous_thread_hook = sys.excepthook, threading.excepthook
+
+    def on_crash(exc_type, exc, tb):
+        dump_flight("crash")
+        previous_hook(exc_type, exc, tb)
+
+    def on_thread_crash(args):
+        dump_flight(f"crash_{args.thread.name if args.thread else 'thread'}")
+        previous_thread_hook(args)
+
+    sys.excepthook = on_crash
+    threading.excepthook = on_thread_crash
+
+def open_sensor_snapshot():
+    """Create the shared sensor snapshot and the gate that writes it (before forking the sensor process)"""
+    global sensor_readings, obstacle_gate
+    if sensor_readings is None:
+        sensor_readings = sensor_snapshot.SensorSnapshot(SENSOR_COUNT)
+        obstacle_gate = obstacle_guard.ObstacleGate(sensor_readings, obstacle_event, obstacle_envelope,
+                                                    approach_speeds)
+    return sensor_readings
+
+def close_sensor_snapshot():
+    """Release and unlink the snapshot's shared memory"""
+    global sensor_readings, obstacle_gate
+    if sensor_readings is None:
+        return
+    try:
+        sensor_readings.close()
+    except Exception as e:
+        print(f"⚠️ Error releasing sensor snapshot: {e}")
+    sensor_readings = obstacle_gate = None
+
+def read_sensors():
+    """sensor_readings.read(), or None (unreadable, so blocked) before the snapshot exists"""
+    return sensor_readings.read() if sensor_readings is not None else None
+
+def start_obstacle_watcher():
+    global obstacle_watcher
+    if obstacle_watcher is None:
+        open_sensor_snapshot()
+        obstacle_watcher = obstacle_guard.ObstacleWatcher(
+            sensor_readings, obstacle_event, current_motion_sensors, obstacle_emergency_stop,
+            stale_after=STALE_AFTER_S, clock=clock
+        )
+    obstacle_watcher.start()
+
+def obstacle_report():
+    """One log line of distances, confidence, time to collision and blocked flags"""
+    readings = read_sensors()
+    if readings is None:
+        return "⚠️ Sensor snapshot unreadable"
+    now_ns = clock.monotonic_ns()
+    lines = []
+    for name, reading in zip(SENSOR_NAMES, readings):
+        if sensor_snapshot.is_stale(reading, now_ns, STALE_AFTER_S):
+            lines.append(f"{name}: stale 🚫")
+            continue
+        ttc = obstacle_guard.time_to_collision(reading.distance, reading.closing)
+        flag = " 🚫" if reading.blocked else ""
+        lines.append(f"{name}: {reading.distance:.2f} cm ({reading.confidence:.0%}, TTC {ttc:.1f}s){flag}")
+    return "📏 " + " | ".join(lines)
+
+def log_obstacles():
+    """Log distances and blocked flags (runtime task); the flags are set per sample by the sensor process"""
+    print(obstacle_report())
+
+def on_battery_level(percent):
+    global battery_level
+    battery_level = percent
+
+def publish_message(data, qos=0):
+    """Publish a JSON message on the robot topic (QoS 0 is safe from the SDK callback thread)"""
+    if mqtt_hub is None or topic is None:
+        return
+    try:
+        mqtt_hub.publish(topic, json.dumps(data, separators=(",", ":")), qos)
+    except Exception as e:
+        print(f"⚠️ Error publishing {data.get('type', 'message')}: {e}")
+
+# === Telemetry ===
+def start_telemetry(publish, config=None):
+    """Sample distances, motor duties, battery, latency and pose into batched telemetry messages"""
+    global telemetry
+    telemetry = TelemetryAggregator(publish, config or load_telemetry_config(), clock)
+
+    def distances():
+        readings = read_sensors()
+        if readings is None:
+            return None
+        mask = sum(1 << i for i, reading in enumerate(readings) if reading.blocked)
+        return [reading.distance for reading in readings] + [mask]
+
+    def motor():
+        if motor_driver is None:
+            return None
+        left, right = motor_driver.left, motor_driver.right
+        return [left.duty, right.duty, left.target, right.target]
+
+    def battery():
+        level = battery_level
+        return None if level != level else [level]   # NaN until the first serial line
+
+    def latency():
+        snapshot = latency_stats.recorder.snapshot()
+        return [snapshot[stage][key] for stage in latency_stats.STAGES for key in ("p50", "p99")]
+
+    def pose():
+        current = odometry.pose()
+        return [current["x"], current["y"], current["heading"]]
+
+    telemetry.add_channel("distance", [f"d{i}" for i in range(SENSOR_COUNT)] + ["blocked"],
+                          distances, scale=10, deadband=1.0)
+    telemetry.add_channel("motor", ["left", "right", "leftTarget", "rightTarget"], motor, scale=1, deadband=1.0)
+    telemetry.add_channel("battery", ["percent"], battery, scale=1, deadband=1.0)
+    telemetry.add_channel("latency", [f"{stage}{key}" for stage in latency_stats.STAGES for key in ("P50", "P99")],
+                          latency, scale=1, deadband=50)
+    telemetry.add_channel("pose", ["x", "y", "heading"], pose, scale=10, deadband=1.0)
+    return telemetry
+
+# === Credential rotation ===
+def on_credentials_rotated(report):
+    """Report a credential swap (and how long the session was down)"""
+    if flight:
+        flight.record(flight_recorder.MARK, a=flight_recorder.MARK_ROTATION, b=1 if report["ok"] else 0,
+                      v1=report["recoveryMs"], v2=report.get("connectMs", 0.0))
+    if report["ok"] and report["reason"] == "message":
         try:
-            front, back = shared_distances[0], shared_distances[1]
-            blocked_directions[0] = 1 if front < distence else 0
-            blocked_directions[1] = 1 if back < distence else 0
-            print(f"📏 Front: {front:.2f} cm | Back: {back:.2f} cm | Blocked: F={blocked_directions[0]} B={blocked_directions[1]}")
-            time.sleep(0.5)
-        except Exception as e:
-            if system_running:
-                print(f"⚠️ Error in obstacle monitoring: {e}")
-            time.sleep(1)
+            # Only keys that connected reach the file, so a restart uses them too; the watcher sees nothing new
+            write_credentials({key: credential_rotator.credentials[key] for key in CREDENTIAL_KEYS}, MQTT_LOG_FILE)
+        except OSError as e:
+            print(f"⚠️ Could not save rotated credentials: {e}")
+    publish_message(report)
+
+def handle_credentials_message(msg_data):
+    """Fresh IAM credentials pushed by the backend before the current ones expire"""
+    user = msg_data.get("user") or {}
+    # Only the IAM keys are taken from the topic; the endpoint stays what the login flow configured
+    fresh = {key: user.get(key) for key in CREDENTIAL_KEYS}
+    if credential_rotator is None or not all(isinstance(value, str) and value for value in fresh.values()):
+        publish_message({"type": "credentials_rotated", "reason": "message", "ok": False, "error": "incomplete"})
+        return
+    # Reconnecting blocks, and this runs on the dispatch loop
+    credential_rotator.rotate_later(dict(credential_rotator.credentials, **fresh), "message")
+
+# === Drive command dispatch ===
+def acknowledge(received_ns, status):
+    """End a command's ack without waiting for actuation"""
+    if ack_batcher:
+        ack_batcher.resolve(received_ns, status)
+
+def record_rejection(key):
+    if flight:
+        index = GATED_SENSORS[key][0]
+        readings = read_sensors()
+        flight.record(flight_recorder.DECISION, index, flight_recorder.REJECTED,
+                      v1=readings[index].distance if readings else float("nan"))
+
+def schedule_later(delay, fn, *args):
+    """Timer for dispatch: on the runtime loop, or a thread when dispatching without one"""
+    if runtime:
+        runtime.call_later(delay, fn, *args)
+    else:
+        threading.Timer(delay, fn, args).start()
+
+def on_command_collapsed(command, received_ns, decoded_ns):
+    """A late command replaced by a newer one from the same controller before it ran"""
+    acknowledge(received_ns, command_ack.COLLAPSED)
+
+def handle_drive_command(command, received_ns, decode_start_ns, decoded_ns):
+    """Apply one drive command (JSON or binary) after the duplicate, staleness and backlog checks"""
+    # Age on the robot clock, corrected for the controller's clock offset
+    time_diff = link_clock.command_age_ms(command.timestamp, command.sender)
+    duration = command.duration
+    speed = command.speed
+    
+    if flight:
+        # JSON controllers may omit seq or send a non-numeric sender id; record those as 0. The record
+        # packs doubles, so anything but a number is logged as NaN speed / 0 duration rather than raising
+        flight.record(flight_recorder.COMMAND, command.sender & 0xFF if isinstance(command.sender, int) else 0,
+                      control_codec.KEY_OPCODES.get(command.key, 0xFFFF),
+                      command.seq if isinstance(command.seq, int) else 0,
+                      speed if isinstance(speed, (int, float)) else float("nan"),
+                      duration if isinstance(duration, (int, float)) else 0.0, time_diff)
+
+    # QoS 1 redelivery after a reconnect (or an old replay): already handled once
+    verdict = command_sequences.check(command)
+    if verdict != command_filter.ACCEPT:
+        print(f"🔁 Ignoring {command_filter.VERDICT_NAMES[verdict]} command seq={command.seq} from {command.sender}")
+        return
+
+    if ack_batcher:
+        ack_batcher.received(command, received_ns)
+    
+    # Check if command is too old (e.g., older than 2 seconds)
+    if time_diff > 2000:
+        print(f"⏰ Command too old, ignoring. Age: {time_diff:.0f}ms")
+        acknowledge(received_ns, command_ack.STALE)
+        return
+    
+    latency = latency_stats.recorder
+    latency.record("network", time_diff * 1000)
+    latency.record_ns("decode", decode_start_ns, decoded_ns)
+
+    # A burst delayed by a Wi-Fi blip runs only its newest command
+    command_backlog.offer(command, time_diff, received_ns, decoded_ns)
+
+def execute_drive_command(command, received_ns, decoded_ns):
+    """Drive for one accepted command: obstacle gate, then the motion"""
+    latency = latency_stats.recorder
+    key = command.key
+    duration = command.duration
+    speed = command.speed
+    
+    # Manual driving always wins over a running motion script
+    if script_runner:
+        script_runner.preempt()
+    
+    try:
+        if key == "ArrowUp":
+            if is_direction_blocked(key, speed):
+                print("🚫 Obstacle ahead!")
+                record_rejection(key)
+                acknowledge(received_ns, command_ack.REJECTED)
+                motor_stop(immediate=True)
+                return
+            if command.distance:
+                move_distance(key, command.distance, speed=speed, received_ns=received_ns)
+            else:
+                motor_forward(timeout=duration, speed=speed, received_ns=received_ns)
+
+        elif key == "ArrowDown": 
+            if is_direction_blocked(key, speed):
+                print("🚫 Obstacle behind!")
+                record_rejection(key)
+                acknowledge(received_ns, command_ack.REJECTED)
+                motor_stop(immediate=True)
+                return
+            if command.distance:
+                move_distance(key, command.distance, speed=speed, received_ns=received_ns)
+            else:
+                motor_backward(timeout=duration, speed=speed, received_ns=received_ns)
+
+        elif key == "ArrowLeft":
+            motor_left(timeout=duration, speed=speed, received_ns=received_ns)
+
+        elif key == "ArrowRight":
+            motor_right(timeout=duration, speed=speed, received_ns=received_ns)
+
+        else:
+            if key != "Stop":
+                print("❓ Unknown command key")
+            if motor_scheduler:
+                motor_scheduler.cancel()
+            motor_stop()
+            acknowledge(received_ns, command_ack.EXECUTED)
+    finally:
+        latency.record_ns("dispatch", decoded_ns)
+
+command_backlog = command_filter.BacklogCollapser(execute_drive_command, on_command_collapsed, schedule_later,
+                                                  clock=clock)
 
 # === MQTT message handler ===
 def customCallback(client, userdata, message):
-    global motor_timer, system_running, video_process, topic
-    
+    """SDK callback thread: timestamp the message and hand it to the runtime"""
+    received_ns = time.monotonic_ns()
     if not system_running:
         return
-        
+    if runtime:
+        runtime.submit(handle_message, message, received_ns)
+    else:
+        handle_message(message, received_ns)
+
+def handle_message(message, received_ns):
+    global system_running, video_process, topic
+
     try:
+        # Compact binary drive command (see control_codec)
+        if control_codec.is_binary(message.payload):
+            decode_start_ns = time.monotonic_ns()
+            try:
+                command = control_codec.decode_command(message.payload)
+            except ValueError as e:
+                print(f"⚠️ Ignoring binary command: {e}")
+                return
+            decoded_ns = time.monotonic_ns()
+            print(f"📩 Received binary command: {command.key} seq={command.seq}")
+            handle_drive_command(command, received_ns, decode_start_ns, decoded_ns)
+            return
+
         payload = message.payload.decode()
         print(f"📩 Received message: {payload}")
         
         # Try to parse as JSON for system commands
         try:
+            decode_start_ns = time.monotonic_ns()
             msg_data = json.loads(payload)
+            decoded_ns = time.monotonic_ns()
             
             # Handle system commands
             if msg_data.get("type") == "disconnect":
@@ -247,6 +785,33 @@ def customCallback(client, userdata, message):
                 print("🔄 Reconnect command received")
                 reconnect_system()
                 return
+            elif msg_data.get("type") == "clock_pong":
+                link_clock.handle_pong(msg_data)
+                return
+            elif msg_data.get("type") == "clock_ping":
+                return  # Our own ping echoed back by the broker
+            elif msg_data.get("type") == "pose_query":
+                publish_message(dict(odometry.pose(), type="pose"))
+                return
+            elif msg_data.get("type") == "pose_reset":
+                odometry.reset(msg_data.get("x", 0), msg_data.get("y", 0), msg_data.get("heading", 0))
+                print(f"📍 Pose reset to {odometry.pose()}")
+                return
+            elif msg_data.get("type") == "script":
+                handle_script_message(msg_data)
+                return
+            elif msg_data.get("type") == "flight_dump":
+                request_flight_dump()
+                return
+            elif msg_data.get("type") == "credentials":
+                handle_credentials_message(msg_data)
+                return
+            elif msg_data.get("type") == "credentials_rotated":
+                return  # Our own report echoed back by the broker
+            elif msg_data.get("type") == "hello":
+                # Controllers only switch to binary commands after seeing this
+                publish_message(control_codec.CAPABILITIES)
+                return
             if msg_data.get("type") == "videocall_on" and msg_data.get("callId"):
                 call_id = msg_data["callId"]
                 if video_process is None:
@@ -258,51 +823,22 @@ def customCallback(client, userdata, message):
                 if video_process and video_process.poll() is None:
                     print("📴 Stopping video call process...")
                     video_process.send_signal(signal.SIGINT)
-                    video_process.wait()
+                    # Waiting for the call to hang up must not hold up dispatch
+                    if runtime:
+                        runtime.offload(video_process.wait)
+                    else:
+                        video_process.wait()
                     video_process = None
                 return
 
             # Handle regular commands with timestamp checking
             if msg_data.get("key") and msg_data.get("timestamp"):
-                if msg_data.get("duration") is None:
-                    msg_data["duration"] = 0.2
-                command_time = msg_data["timestamp"]
-                current_time = int(time.time() * 1000)  # Current time in milliseconds
-                time_diff = current_time - command_time
-                duration = msg_data["duration"]
-                
-                # Check if command is too old (e.g., older than 2 seconds)
-                if time_diff > 2000:
-                    print(f"⏰ Command too old, ignoring. Age: {time_diff}ms")
+                try:
+                    command = control_codec.command_from_json(msg_data)
+                except ValueError as e:
+                    print(f"⚠️ Ignoring drive command: {e}")
                     return
-                
-                key = msg_data["key"]
-                
-                if key == "ArrowUp":
-                    if blocked_directions[0]:
-                        print("🚫 Obstacle ahead!")
-                        motor_stop()
-                        return
-                    motor_forward(timeout=duration)
-
-                elif key == "ArrowDown": 
-                    if blocked_directions[1]:
-                        print("🚫 Obstacle behind!")
-                        motor_stop()
-                        return
-                    motor_backward(timeout=duration)
-
-                elif key == "ArrowLeft":
-                    motor_left(timeout=duration)
-
-                elif key == "ArrowRight":
-                    motor_right(timeout=duration)
-
-                else:
-                    print("❓ Unknown command key")
-                    motor_stop()
-                    if motor_timer:
-                        motor_timer.cancel()
+                handle_drive_command(command, received_ns, decode_start_ns, decoded_ns)
                 return
 
         except json.JSONDecodeError:
@@ -342,12 +878,16 @@ def customCallback(client, userdata, message):
 
 def main():
     """Main function to initialize and run the robot control system"""
-    global mqtt_client, ultrasonic_process, obstacle_process, system_running,read_battery_precentage_process
+    global mqtt_client, mqtt_hub, offline_publisher, topic, ultrasonic_process, system_running, flight, credential_rotator, ack_batcher, runtime
     
     # Set up signal handlers
     signal.signal(signal.SIGTERM, signal_handler)
     signal.signal(signal.SIGINT, signal_handler)
     
+    # === Flight recorder: binary ring of commands, pin writes and stop decisions ===
+    flight = flight_recorder.FlightRecorder("motor")
+    install_crash_dump()
+    
     try:
         # === Load MQTT credentials from file ===
         if not os.path.exists(MQTT_LOG_FILE):
@@ -366,7 +906,16 @@ def main():
 
         print(f"🔑 Loaded MQTT credentials for topic: {topic}")
 
+        # === Start the PWM motor driver before any command can arrive ===
+        start_motor_driver()
+
+        # === One asyncio loop for command dispatch and every periodic worker below ===
+        runtime = RobotRuntime()
+        runtime.start()
+
         # === Setup AWSIoTPythonSDK MQTT Client with WebSocket ===
+        # Imported here so the command path can be loaded off-robot without the SDK
+        from AWSIoTPythonSDK.MQTTLib import AWSIoTMQTTClient
         mqtt_client = AWSIoTMQTTClient("pythonClient", useWebsocket=True)
         mqtt_client.configureEndpoint(endpoint, 443)
         mqtt_client.configureCredentials("../cert/AmazonRootCA1.pem")  # Only the CA is needed for WebSocket
@@ -376,53 +925,78 @@ def main():
 
         # Configurations (timeouts and more)
         mqtt_client.configureAutoReconnectBackoffTime(1, 32, 20)
-        mqtt_client.configureOfflinePublishQueueing(-1)  # Infinite queueing
-        mqtt_client.configureDrainingFrequency(2)
+        mqtt_client.configureOfflinePublishQueueing(0)  # Disabled: offline_publisher queues instead
         mqtt_client.configureConnectDisconnectTimeout(10)
         mqtt_client.configureMQTTOperationTimeout(5)
 
         # Connect and subscribe
         print(f"🔗 Connecting to {endpoint} using WebSocket...")
+        # While offline, publishes wait in a bounded queue: acks and state first, latest telemetry only
+        offline_publisher = OfflinePublisher(mqtt_client, load_offline_queue_config())
+        mqtt_client.onOnline = lambda: offline_publisher.set_online(True)
+        mqtt_client.onOffline = lambda: offline_publisher.set_online(False)
+        offline_publisher.start()
         mqtt_client.connect()
-        mqtt_client.subscribe(topic, 1, customCallback) 
+
+        # Every other process reaches AWS IoT through this session via the hub socket
+        mqtt_hub = MqttHub(mqtt_client, publisher=offline_publisher)
+        mqtt_hub.start()
+        mqtt_hub.subscribe(topic, 1, customCallback)
         print(f"✅ Subscribed to {topic}. Waiting for messages...")
 
+        # === Fresh IAM credentials (MQTT push or a rewritten log file) reconnect in place ===
+        credential_rotator = CredentialRotator(mqtt_client, data["data"]["user"], MQTT_LOG_FILE,
+                                               hub=mqtt_hub, on_rotated=on_credentials_rotated)
+        runtime.every("credential-watch", POLL_INTERVAL_S, credential_rotator.check, blocking=True)   # A rotation reconnects
+        publish_message(control_codec.CAPABILITIES)
+
+        # === Command latency: local query socket + periodic compact MQTT summary ===
+        latency_stats.start_query_server(handlers={"pose": odometry.pose})
+        runtime.every("latency-summary", 30.0,
+                      lambda: latency_stats.publish_summary(lambda payload: mqtt_hub.publish(topic, payload, 0)))
+
+        # === Coalesced drive-command acks for the controllers' RTT / execution percentiles ===
+        ack_batcher = command_ack.AckBatcher(
+            lambda payload: mqtt_hub.publish(topic + command_ack.ACK_TOPIC_SUFFIX, payload, 0), clock,
+            wake=lambda: runtime.wake("command-acks"))
+        runtime.ticker("command-acks", ack_batcher.tick)
+
+        # === Batched, delta-encoded telemetry (rates in telemetry_config.json) ===
+        runtime.ticker("telemetry", start_telemetry(lambda payload: mqtt_hub.publish(topic, payload, 0)).tick)
+
+        # === Clock offset pings (also carry the one-way latency estimate) ===
+        runtime.ticker("clock-ping", clock_sync.ping_sender(link_clock, publish_message))
+
+        # === Dead-reckoning pose (also queryable locally: python3 latency_stats.py pose) ===
+        runtime.every("pose", 1.0, pose_publisher(odometry, publish_message))
+
         # === Start background processes ===
         print("🚀 Starting ultrasonic sensor process...")
-        ultrasonic_process = multiprocessing.Process(target=measure_distance, args=(shared_distances,))
+        open_sensor_snapshot()
+        ultrasonic_process = multiprocessing.Process(target=measure_distance, args=(sensor_readings, obstacle_gate))
         ultrasonic_process.start()
 
-        print("🚧 Starting obstacle monitoring process...")
-        obstacle_process = multiprocessing.Process(target=monitor_obstacles)
-        obstacle_process.start()
-
-        print("Starting battery precentage monitoring process...")
-        mqtt_config = {
-            "endpoint": endpoint,
-            "access_key": aws_access_key,
-            "secret_key": aws_secret_key,
-            "session_token": aws_session_token,
-            "ca_path": "../cert/AmazonRootCA1.pem",
-            "topic": topic
-        }
-
-        read_battery_precentage_process = multiprocessing.Process(
-            target=read_battery_precentage.read_serial_batter_status,
-            args=(mqtt_config,)
-        )
-        read_battery_precentage_process.start()
+        print("🚨 Starting event-driven obstacle watcher...")
+        start_obstacle_watcher()
 
+        print("🚧 Starting obstacle monitoring task...")
+        runtime.every("obstacle-monitor", 0.5, log_obstacles)
+
+        print("🔋 Starting battery percentage monitoring task...")
+        # Same session, same thread: no hub socket or second interpreter for one line a minute
+        runtime.spawn("battery", read_battery_precentage.poll_battery_status(
+            lambda payload: mqtt_hub.publish(topic, payload, 0), on_level=on_battery_level))
 
         # Update system state
         save_system_state({
             "connected": True, 
-            "processes": [ultrasonic_process.pid, obstacle_process.pid, read_battery_precentage_process.pid]
+            "processes": [ultrasonic_process.pid]
         })
 
         print("🤖 Robot control system fully initialized!")
         print("📡 Listening for MQTT commands...")
         print("🎯 System commands: disconnect, reconnect")
-        print("🎮 Control commands: ArrowUp, ArrowDown, ArrowLeft, ArrowRight")
+        print("🎮 Control commands: ArrowUp, ArrowDown, ArrowLeft, ArrowRight, script")
 
         # === Keep the main thread alive ===
         while system_running:
@@ -430,13 +1004,13 @@ def main():
                 # Check if processes are still alive
                 if ultrasonic_process and not ultrasonic_process.is_alive():
                     print("⚠️ Ultrasonic process died, restarting...")
-                    ultrasonic_process = multiprocessing.Process(target=measure_distance, args=(shared_distances,))
+                    ultrasonic_process = multiprocessing.Process(target=measure_distance, args=(sensor_readings, obstacle_gate))
                     ultrasonic_process.start()
-                
-                if obstacle_process and not obstacle_process.is_alive():
-                    print("⚠️ Obstacle monitoring process died, restarting...")
-                    obstacle_process = multiprocessing.Process(target=monitor_obstacles)
-                    obstacle_process.start()
+
+
+                if not runtime.is_running():
+                    print("⚠️ Robot runtime stopped, shutting down...")
+                    break
                 
                 time.sleep(5)  # Check every 5 seconds
                 
@@ -449,6 +1023,7 @@ def main():
 
     except Exception as e:
         print(f"❌ Critical error in robot control: {e}")
+        dump_flight("crash")
     
     finally:
         cleanup_and_exit()
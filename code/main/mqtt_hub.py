@@ -0,0 +1,411 @@
+# mqtt_hub.py
+"""
+One upstream MQTT session shared by every robot process.
+
+The motor process owns the only AWSIoTMQTTClient (one TLS + SigV4
+WebSocket handshake) and runs an MqttHub next to it. Other processes
+(system_control.py and tools) use HubClient. It talks
+newline-delimited JSON over the Unix socket HUB_SOCKET and has the
+connect / publish / subscribe / disconnect methods of AWSIoTMQTTClient they
+used before. A HubClient costs a socket connect instead of a handshake and
+does not load the SDK.
+
+Frames (one JSON object per line):
+    client -> hub  {"op": "publish", "topic": t, "payload": str, "qos": 0, "id": n}
+                   {"op": "subscribe", "topic": filter, "qos": 1}
+                   {"op": "unsubscribe", "topic": filter}
+                   {"op": "stats", "id": n}
+    hub -> client  {"op": "message", "topic": t, "filter": subscribed filter, "payload": str}
+                   {"op": "ack", "id": n, "ok": bool}      (requests that carry an id)
+                   {"op": "stats", "id": n, ...}
+Binary payloads (control_codec commands) travel base64-encoded as "payload_b64".
+
+The hub subscribes upstream once per topic filter and fans each message out
+to its subscribers. The SDK keeps one callback per topic, so subscribers in
+the owner process (motor_thread's customCallback) register through
+hub.subscribe() as well.
+"""
+
+import base64
+import itertools
+import json
+import os
+import socket
+import struct
+import threading
+
+HUB_SOCKET = "/tmp/robot_mqtt.sock"
+SEND_TIMEOUT_S = 1.0        # A client that cannot take a message this fast is dropped
+REQUEST_TIMEOUT_S = 5.0
+
+
+class HubMessage:
+    """Same fields as the SDK's message object handed to subscribe callbacks"""
+    __slots__ = ("topic", "payload", "qos")
+
+    def __init__(self, topic, payload, qos=0):
+        self.topic = topic
+        self.payload = payload
+        self.qos = qos
+
+
+def topic_matches(topic_filter, topic):
+    """MQTT topic filter match with + and # wildcards"""
+    filter_levels = topic_filter.split("/")
+    topic_levels = topic.split("/")
+    for i, level in enumerate(filter_levels):
+        if level == "#":
+            return True
+        if i >= len(topic_levels) or (level != "+" and level != topic_levels[i]):
+            return False
+    return len(filter_levels) == len(topic_levels)
+
+
+def encode_frame(frame, payload=None):
+    if payload is not None:
+        if isinstance(payload, (bytes, bytearray)):
+            try:
+                frame["payload"] = payload.decode()
+            except UnicodeDecodeError:
+                frame["payload_b64"] = base64.b64encode(payload).decode()
+        else:
+            frame["payload"] = payload
+    return (json.dumps(frame, separators=(",", ":")) + "\n").encode()
+
+
+def frame_payload(frame):
+    if "payload_b64" in frame:
+        return base64.b64decode(frame["payload_b64"])
+    return frame.get("payload", "").encode()
+
+
+def read_frames(sock):
+    """Yield decoded frames from a stream socket until it closes"""
+    buffer = b""
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            return
+        buffer += chunk
+        while b"\n" in buffer:
+            line, buffer = buffer.split(b"\n", 1)
+            if line:
+                yield json.loads(line)
+
+
+class _Connection:
+    def __init__(self, sock):
+        self.sock = sock
+        self.lock = threading.Lock()
+        self.filters = set()
+
+    def send(self, data):
+        with self.lock:
+            self.sock.sendall(data)
+
+
+class MqttHub:
+    """Owner side: shares `client` (an AWSIoTMQTTClient, or anything with its
+    publish / subscribe / unsubscribe) with local callbacks and socket clients.
+    Publishes go through `publisher` (an offline_queue.OfflinePublisher) when given."""
+
+    def __init__(self, client, path=HUB_SOCKET, publisher=None):
+        self.client = client
+        self.path = path
+        self.publisher = publisher
+        self._lock = threading.Lock()
+        self._subscribers = {}      # topic filter -> [callback or _Connection]
+        self._qos = {}              # topic filter -> QoS of the upstream subscription
+        self._connections = set()
+        self._server = None
+        self.published = 0
+        self.delivered = 0
+        self.clients_served = 0
+
+    # --- owner-process API ---
+    def publish(self, topic, payload, qos=0):
+        self.published += 1
+        return (self.publisher or self.client).publish(topic, payload, qos)
+
+    def subscribe(self, topic, qos, callback):
+        """callback(client, userdata, message), like AWSIoTMQTTClient.subscribe"""
+        self._add(topic, qos, callback)
+
+    def unsubscribe(self, topic, callback):
+        self._remove(topic, callback)
+
+    def resubscribe(self):
+        """Re-issue every upstream subscription after the client reconnected on a fresh session"""
+        with self._lock:
+            filters = [(topic_filter, self._qos[topic_filter]) for topic_filter in self._subscribers]
+        for topic_filter, qos in filters:
+            self._subscribe_upstream(topic_filter, qos)
+
+    def stats(self):
+        with self._lock:
+            stats = {"upstreamSessions": 1, "clients": len(self._connections),
+                     "clientsServed": self.clients_served, "filters": len(self._subscribers),
+                     "published": self.published, "delivered": self.delivered}
+        if self.publisher:
+            stats["offline"] = self.publisher.stats()
+        return stats
+
+    # --- socket service ---
+    def start(self):
+        """Listen on the Unix socket; returns False if it cannot be bound"""
+        try:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            server.bind(self.path)
+            os.chmod(self.path, 0o600)
+            server.listen(16)
+        except OSError as e:
+            print(f"⚠️ MQTT hub socket unavailable: {e}")
+            return False
+        self._server = server
+        threading.Thread(target=self._accept, name="mqtt-hub", daemon=True).start()
+        print(f"🔀 MQTT hub sharing the upstream session on {self.path}")
+        return True
+
+    def shutdown(self):
+        server, self._server = self._server, None
+        if server:
+            server.close()
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+        with self._lock:
+            connections = list(self._connections)
+        for connection in connections:
+            self._drop(connection)
+
+    def _accept(self):
+        while self._server:
+            try:
+                sock, _ = self._server.accept()
+            except OSError:
+                return
+            # Blocking reads, but a client that stops reading must not stall the SDK callback thread
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDTIMEO, struct.pack("ll", int(SEND_TIMEOUT_S), 0))
+            connection = _Connection(sock)
+            with self._lock:
+                self._connections.add(connection)
+                self.clients_served += 1
+            threading.Thread(target=self._serve, args=(connection,), name="mqtt-hub-client", daemon=True).start()
+
+    def _serve(self, connection):
+        try:
+            for frame in read_frames(connection.sock):
+                self._handle(connection, frame)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ MQTT hub client error: {e}")
+        finally:
+            self._drop(connection)
+
+    def _handle(self, connection, frame):
+        op = frame.get("op")
+        request_id = frame.get("id")
+        ok = True
+        if op == "publish":
+            try:
+                self.publish(frame["topic"], frame_payload(frame), frame.get("qos", 0))
+            except Exception as e:
+                print(f"⚠️ MQTT hub publish to {frame.get('topic')} failed: {e}")
+                ok = False
+        elif op == "subscribe":
+            if frame["topic"] not in connection.filters:
+                connection.filters.add(frame["topic"])
+                self._add(frame["topic"], frame.get("qos", 0), connection)
+        elif op == "unsubscribe":
+            connection.filters.discard(frame["topic"])
+            self._remove(frame["topic"], connection)
+        elif op == "stats":
+            connection.send(encode_frame(dict(self.stats(), op="stats", id=request_id)))
+            return
+        else:
+            ok = False
+        if request_id is not None:
+            connection.send(encode_frame({"op": "ack", "id": request_id, "ok": ok}))
+
+    def _drop(self, connection):
+        with self._lock:
+            if connection not in self._connections:
+                return
+            self._connections.discard(connection)
+        for topic_filter in list(connection.filters):
+            self._remove(topic_filter, connection)
+        try:
+            connection.sock.shutdown(socket.SHUT_RDWR)   # Wakes the reader thread and tells the client
+        except OSError:
+            pass
+        connection.sock.close()
+
+    # --- fan-out ---
+    def _add(self, topic_filter, qos, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(topic_filter)
+            first = subscribers is None
+            if first:
+                subscribers = self._subscribers[topic_filter] = []
+                self._qos[topic_filter] = qos
+            subscribers.append(subscriber)
+        if first:
+            # One upstream subscription per filter, however many processes listen
+            self._subscribe_upstream(topic_filter, qos)
+
+    def _subscribe_upstream(self, topic_filter, qos):
+        self.client.subscribe(topic_filter, qos,
+                              lambda client, userdata, message: self._deliver(topic_filter, client, userdata, message))
+
+    def _remove(self, topic_filter, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(topic_filter)
+            if not subscribers or subscriber not in subscribers:
+                return
+            subscribers.remove(subscriber)
+            last = not subscribers
+            if last:
+                del self._subscribers[topic_filter]
+                del self._qos[topic_filter]
+        if last:
+            try:
+                self.client.unsubscribe(topic_filter)
+            except Exception as e:
+                print(f"⚠️ MQTT hub unsubscribe from {topic_filter} failed: {e}")
+
+    def _deliver(self, topic_filter, client, userdata, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(topic_filter, ()))
+        frame = None
+        for subscriber in subscribers:
+            self.delivered += 1
+            if isinstance(subscriber, _Connection):
+                if frame is None:
+                    frame = encode_frame({"op": "message", "topic": message.topic, "filter": topic_filter},
+                                         message.payload)
+                try:
+                    subscriber.send(frame)
+                except OSError:
+                    self._drop(subscriber)
+            else:
+                try:
+                    subscriber(client, userdata, message)
+                except Exception as e:
+                    print(f"⚠️ Error in MQTT subscriber for {topic_filter}: {e}")
+
+
+class HubClient:
+    """Client side: the AWSIoTMQTTClient methods the robot uses, over the hub socket"""
+
+    def __init__(self, client_id="hubClient", path=HUB_SOCKET):
+        self.client_id = client_id
+        self.path = path
+        self._sock = None
+        self._send_lock = threading.Lock()
+        self._subscriptions = {}        # topic filter -> (qos, callback)
+        self._ids = itertools.count(1)
+        self._replies = {}              # request id -> [Event, frame]
+        self._reader = None
+
+    def connect(self, timeout=REQUEST_TIMEOUT_S):
+        """Connect to the hub; raises OSError when no robot process is serving it"""
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        try:
+            sock.connect(self.path)
+        except OSError:
+            sock.close()
+            raise
+        sock.settimeout(None)
+        for topic_filter, (qos, _) in self._subscriptions.items():
+            sock.sendall(encode_frame({"op": "subscribe", "topic": topic_filter, "qos": qos}))
+        self._sock = sock
+        self._reader = threading.Thread(target=self._read, args=(sock,), name=f"{self.client_id}-reader", daemon=True)
+        self._reader.start()
+        return True
+
+    def disconnect(self):
+        sock, self._sock = self._sock, None
+        if sock:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+        return True
+
+    def publish(self, topic, payload, qos=0):
+        """QoS 0 is fire-and-forget; QoS 1 waits until the hub has handed it upstream"""
+        if qos:
+            reply = self._request({"op": "publish", "topic": topic, "qos": qos}, payload)
+            return bool(reply and reply.get("ok"))
+        self._send({"op": "publish", "topic": topic, "qos": qos}, payload)
+        return True
+
+    def subscribe(self, topic, qos, callback):
+        connected = self._sock is not None
+        self._subscriptions[topic] = (qos, callback)
+        if connected:
+            self._send({"op": "subscribe", "topic": topic, "qos": qos})
+        return True
+
+    def unsubscribe(self, topic):
+        self._subscriptions.pop(topic, None)
+        self._send({"op": "unsubscribe", "topic": topic})
+        return True
+
+    def stats(self):
+        return self._request({"op": "stats"})
+
+    def _send(self, frame, payload=None):
+        data = encode_frame(frame, payload)
+        with self._send_lock:
+            if self._sock is None:
+                self.connect()
+            try:
+                self._sock.sendall(data)
+            except OSError:
+                # Hub restarted with the robot: reconnect (resubscribes) and retry once
+                self.disconnect()
+                self.connect()
+                self._sock.sendall(data)
+
+    def _request(self, frame, payload=None, timeout=REQUEST_TIMEOUT_S):
+        request_id = next(self._ids)
+        waiter = self._replies[request_id] = [threading.Event(), None]
+        frame["id"] = request_id
+        try:
+            self._send(frame, payload)
+            if not waiter[0].wait(timeout):
+                return None
+            return waiter[1]
+        finally:
+            self._replies.pop(request_id, None)
+
+    def _read(self, sock):
+        try:
+            for frame in read_frames(sock):
+                if frame.get("op") == "message":
+                    self._dispatch(frame)
+                    continue
+                waiter = self._replies.get(frame.get("id"))
+                if waiter:
+                    waiter[1] = frame
+                    waiter[0].set()
+        except (OSError, ValueError):
+            pass
+        if self._sock is sock:
+            # Hub went away (robot restarting): the next call reconnects and resubscribes
+            self._sock = None
+            sock.close()
+
+    def _dispatch(self, frame):
+        subscription = self._subscriptions.get(frame.get("filter"))
+        if subscription is None:
+            return
+        try:
+            subscription[1](self, None, HubMessage(frame["topic"], frame_payload(frame)))
+        except Exception as e:
+            print(f"⚠️ Error in MQTT subscriber for {frame.get('filter')}: {e}")
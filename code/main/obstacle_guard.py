@@ -0,0 +1,221 @@
+# obstacle_guard.py
+"""
+Event-driven obstacle gating.
+
+The sensor process evaluates every ultrasonic sample against a braking
+envelope the moment it is taken (ObstacleGate) and writes the blocked flag
+itself. When a direction becomes blocked it sets a multiprocessing.Event,
+which wakes the ObstacleWatcher thread in the motor process; the watcher
+cuts the active motion if it is heading into the blocked side. Worst-case
+sample-to-stop latency is one event hop instead of the old 0.5 s
+monitor_obstacles period plus waiting for the next command.
+
+The envelope replaces the old fixed 50 cm threshold. It takes the closing
+rate (how fast the gap shrinks, which includes a person walking towards the
+robot) from the distance filter, or fits it over a short sample window
+itself, combines it with the speed the motor process is driving towards
+that sensor and blocks when the distance falls inside what it takes to
+react and brake:
+
+    stop = v * reaction + v_robot^2 / (2 * brake) + v_obstacle * t_brake + margin
+
+never less than the minimum clearance. Slow approaches can get close to a
+table; fast ones, or a closing person, stop early.
+
+Samples and blocked flags are published per configured sensor
+(sensor_config.json) through the seqlock SensorSnapshot; the motor process
+maps each drive key to the sensors that gate it and treats a stale reading
+as blocked.
+"""
+
+import threading
+import time
+
+import numpy as np
+
+import sensor_snapshot
+
+WATCHER_POLL_INTERVAL = 0.05   # Fallback re-check even without an event
+WINDOW = 8                     # Samples per sensor in the closing-rate fit
+HORIZON_S = 1.5                # Older samples are left out of the fit
+MAX_RANGE_CM = 400             # Invalid/no-echo readings are reported as this
+HYSTERESIS_CM = 5.0            # Extra clearance needed before a side unblocks
+
+
+class BrakingEnvelope:
+    """Dynamic stopping distance from the robot speed and the measured closing rate.
+
+    Samples go into fixed per-sensor numpy rings; the closing rate is the
+    least-squares slope of distance over time across the fresh, in-range
+    samples (the fit does not care about ring order, so nothing is rolled).
+    """
+
+    def __init__(self, brake_cm_s2, reaction_s=0.25, margin_cm=15.0, min_clearance_cm=15.0,
+                 sensors=2, window=WINDOW, horizon_s=HORIZON_S):
+        self.brake = float(brake_cm_s2)
+        self.reaction = float(reaction_s)
+        self.margin = float(margin_cm)
+        self.min_clearance = float(min_clearance_cm)
+        self.window = window
+        self.horizon = horizon_s
+        self._times = np.full((sensors, window), -1e9)
+        self._distances = np.zeros((sensors, window))
+        self._next = [0] * sensors
+
+    def closing_rate(self, index, distance, now):
+        """Add a sample and return the closing rate in cm/s (0 when the gap is not shrinking)"""
+        slot = self._next[index]
+        self._next[index] = (slot + 1) % self.window
+        times = self._times[index]
+        distances = self._distances[index]
+        times[slot] = now
+        distances[slot] = distance
+        fresh = (times > now - self.horizon) & (distances < MAX_RANGE_CM)
+        if np.count_nonzero(fresh) < 3:
+            return 0.0
+        t = times[fresh]
+        d = distances[fresh]
+        t = t - t.mean()
+        spread = np.dot(t, t)
+        if spread <= 0.0:
+            return 0.0
+        return max(0.0, -float(np.dot(t, d - d.mean())) / spread)
+
+    def stopping_distance(self, robot_speed, closing_rate=0.0):
+        """Distance (cm) the robot needs to react and brake at robot_speed cm/s"""
+        robot_speed = max(0.0, robot_speed)
+        brake_time = robot_speed / self.brake if self.brake > 0 else 0.0
+        obstacle_speed = max(0.0, closing_rate - robot_speed)
+        speed = max(robot_speed, closing_rate)
+        distance = (speed * self.reaction + robot_speed * brake_time / 2.0
+                    + obstacle_speed * brake_time + self.margin)
+        return max(self.min_clearance, distance)
+
+
+def time_to_collision(distance, closing_rate):
+    """Seconds until contact at the current closing rate (inf when not closing)"""
+    if closing_rate <= 0.0:
+        return float("inf")
+    return distance / closing_rate
+
+
+def envelope_from_config(motor_config, sensors=2):
+    """BrakingEnvelope calibrated from motor_config (deceleration and odometry speeds)"""
+    # cm/s per duty % times duty %/s; the slower direction gives the conservative figure
+    cm_s_per_duty = min(motor_config["forwardSpeedCmS"], motor_config["backwardSpeedCmS"]) / motor_config["driveSpeed"]
+    return BrakingEnvelope(
+        brake_cm_s2=cm_s_per_duty * motor_config["deceleration"],
+        reaction_s=motor_config["obstacleReactionS"],
+        margin_cm=motor_config["obstacleMarginCm"],
+        min_clearance_cm=motor_config["obstacleMinClearanceCm"],
+        sensors=sensors
+    )
+
+
+class ObstacleGate:
+    """Sensor-process side: check each sample against the envelope as soon as it is measured.
+
+    Publishes every filtered sample with its blocked flag to the shared
+    SensorSnapshot; approach_speeds[i] is the speed (cm/s) the motor process
+    is driving towards sensor i.
+    """
+
+    def __init__(self, snapshot, obstacle_event, envelope, approach_speeds):
+        self.snapshot = snapshot
+        self.event = obstacle_event
+        self.envelope = envelope
+        self.approach_speeds = approach_speeds
+        self.blocked = [False] * snapshot.count
+
+    def on_sample(self, index, distance, now=None, closing_rate=None, confidence=1.0):
+        """Publish a sample for sensor index and update its blocked flag; returns True while blocked.
+
+        closing_rate, when the caller already tracks it (distance_filter),
+        replaces the envelope's own fit over the sample window.
+        """
+        if index >= len(self.blocked):
+            return False
+        now = time.monotonic() if now is None else now
+        if closing_rate is None:
+            closing = self.envelope.closing_rate(index, distance, now)
+        else:
+            closing = max(0.0, closing_rate)
+        limit = self.envelope.stopping_distance(self.approach_speeds[index], closing)
+        was_blocked = self.blocked[index]
+        if was_blocked:
+            limit += HYSTERESIS_CM
+        blocked = distance < limit
+        self.blocked[index] = blocked
+        # Published before the event so a woken watcher already sees the flag
+        self.snapshot.write(index, distance, confidence, closing, blocked, int(now * 1e9))
+        if blocked and not was_blocked:
+            self.event.set()
+        return blocked
+
+
+class ObstacleWatcher:
+    """Motor-process side: cut motion heading into a direction that just became blocked.
+
+    motion() returns the indices of the sensors the robot is currently driving
+    towards (empty when turning or stopped); emergency_stop(index, reason)
+    cuts the motors. A sensor whose snapshot reading has gone stale stops
+    the robot just like a blocked one (reason "stale").
+    """
+
+    def __init__(self, snapshot, obstacle_event, motion, emergency_stop,
+                 poll_interval=WATCHER_POLL_INTERVAL, stale_after=sensor_snapshot.STALE_AFTER_S, clock=time):
+        self.snapshot = snapshot
+        self.clock = clock
+        self.stale_after = stale_after
+        self.event = obstacle_event
+        self._motion = motion
+        self._emergency_stop = emergency_stop
+        self._poll_interval = poll_interval
+        self._running = False
+        self._thread = None
+        self.stops = 0
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="obstacle-watcher", daemon=True)
+        self._thread.start()
+
+    def shutdown(self):
+        self._running = False
+        self.event.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(1.0)
+        self._thread = None
+
+    def check(self):
+        """Stop now if the current motion heads into a blocked direction; returns True if it did"""
+        indices = self._motion()
+        if not indices:
+            return False
+        readings = self.snapshot.read()
+        now_ns = self.clock.monotonic_ns()
+        for index in indices:
+            if readings is None or readings[index].blocked:
+                reason = "obstacle" if readings else "stale"
+            elif sensor_snapshot.is_stale(readings[index], now_ns, self.stale_after):
+                reason = "stale"
+            else:
+                continue
+            self.stops += 1
+            self._emergency_stop(index, reason)
+            return True
+        return False
+
+    def _run(self):
+        while self._running:
+            self.event.wait(self._poll_interval)
+            self.event.clear()
+            if not self._running:
+                return
+            try:
+                self.check()
+            except Exception as e:
+                print(f"⚠️ Error in obstacle watcher: {e}")
+                time.sleep(self._poll_interval)
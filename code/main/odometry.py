@@ -0,0 +1,90 @@
+# odometry.py
+"""
+Dead-reckoning pose estimate from executed motor commands.
+
+The motor driver reports the duties it actually applied on every control
+tick, so ramps, pre-empted scripts and early stops are all integrated as
+executed rather than as commanded. Each tick is split into a forward
+component (mean of the wheel duties) and a turn component (half their
+difference) and scaled by the calibrated per-direction speeds, which are
+measured at the configured driveSpeed / turnSpeed duties:
+
+    forwardSpeedCmS / backwardSpeedCmS   straight-line speed
+    leftTurnDegS / rightTurnDegS         on-the-spot turn rate
+
+Pose is (x cm, y cm, heading deg) with heading 0 along +x at start and
+positive headings turning left (counter-clockwise).
+"""
+
+import math
+import threading
+import time
+
+
+class Odometry:
+    def __init__(self, motor_config):
+        self._lock = threading.Lock()
+        self.drive_ref = float(motor_config["driveSpeed"])
+        self.turn_ref = float(motor_config["turnSpeed"])
+        self.forward_speed = float(motor_config["forwardSpeedCmS"])
+        self.backward_speed = float(motor_config["backwardSpeedCmS"])
+        self.left_rate = math.radians(float(motor_config["leftTurnDegS"]))
+        self.right_rate = math.radians(float(motor_config["rightTurnDegS"]))
+        self.x = 0.0
+        self.y = 0.0
+        self.theta = 0.0
+        self.distance = 0.0     # Total path length driven, cm
+        self.updated = time.time()
+
+    def update(self, left_duty, right_duty, dt):
+        """Integrate one control tick of applied wheel duties over dt seconds"""
+        forward = (left_duty + right_duty) / 2.0
+        turn = (right_duty - left_duty) / 2.0
+        if forward == 0.0 and turn == 0.0:
+            return
+        speed = self.forward_speed if forward > 0 else self.backward_speed
+        rate = self.left_rate if turn > 0 else self.right_rate
+        v = forward / self.drive_ref * speed
+        w = turn / self.turn_ref * rate
+        with self._lock:
+            # Midpoint heading keeps arcs accurate at the control-loop step size
+            heading = self.theta + w * dt / 2.0
+            self.x += v * dt * math.cos(heading)
+            self.y += v * dt * math.sin(heading)
+            self.theta = (self.theta + w * dt + math.pi) % (2 * math.pi) - math.pi
+            self.distance += abs(v) * dt
+            self.updated = time.time()
+
+    def pose(self):
+        with self._lock:
+            return {"x": round(self.x, 1), "y": round(self.y, 1),
+                    "heading": round(math.degrees(self.theta), 1),
+                    "distance": round(self.distance, 1),
+                    "ts": int(self.updated * 1000)}
+
+    def reset(self, x=0.0, y=0.0, heading=0.0):
+        """Re-anchor the pose (e.g. after an ArUco fix at the dock)"""
+        with self._lock:
+            self.x, self.y = float(x), float(y)
+            self.theta = math.radians(float(heading))
+            self.updated = time.time()
+
+
+def pose_publisher(odometry, publish, heartbeat=10.0, clock=time):
+    """A step that publishes the pose if it changed, or if heartbeat seconds passed since the last one"""
+    state = {"pose": None, "sent": 0.0}
+
+    def step():
+        pose = odometry.pose()
+        now = clock.monotonic()
+        last_pose = state["pose"]
+        moved = last_pose is None or any(pose[k] != last_pose[k] for k in ("x", "y", "heading"))
+        if not moved and now - state["sent"] < heartbeat:
+            return
+        try:
+            publish(dict(pose, type="pose"))
+            state["pose"], state["sent"] = pose, now
+        except Exception as e:
+            print(f"⚠️ Error publishing pose: {e}")
+
+    return step
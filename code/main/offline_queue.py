@@ -0,0 +1,294 @@
+# offline_queue.py
+"""
+Bounded, priority-aware offline publish queue for the upstream MQTT session.
+
+AWSIoTMQTTClient's own offline queue (configureOfflinePublishQueueing(-1))
+is one unbounded FIFO. It drains at configureDrainingFrequency (2 msgs/s).
+A long Wi-Fi outage therefore keeps every telemetry batch in RAM. On
+reconnect it replays them all, one every 0.5 s, ahead of the script acks
+and state changes queued behind them.
+
+OfflineQueue instead sorts messages into classes (DEFAULT_OFFLINE_QUEUE_CONFIG),
+drained in the order they are listed:
+    keep         every message is kept (acks, state changes)
+    latest       only the newest message per topic + type (telemetry)
+    drop_oldest  a ring bounded by the class's maxBytes (logs)
+    drop         not queued at all (clock pings are meaningless late)
+All classes share maxBytes. Over the cap, the lowest-priority class that
+still holds something loses its oldest message, so keep classes are
+evicted only when nothing else is left.
+
+OfflinePublisher wraps the SDK client (whose own queue is disabled). While
+online with nothing queued it publishes straight through. Otherwise it
+queues, and a drain thread replays the queue at drainPerSecond once the
+SDK reports the connection is back. MqttHub publishes through it, so the
+runtime's workers and the hub clients are covered too.
+
+Only the SDK's onOnline / onOffline callbacks change the connection state.
+A publish that fails on a live session (e.g. a QoS 1 timeout) is queued,
+and the drain thread retries after retryInitialS, doubling up to retryMaxS
+while failures continue; a fresh session retries at once.
+"""
+
+import collections
+import json
+import threading
+import time
+
+from config_manager import DEFAULT_OFFLINE_QUEUE_CONFIG
+
+ENTRY_OVERHEAD = 96     # Rough per-message bookkeeping (tuple, key, deque slot) in bytes
+
+
+class _Entry:
+    __slots__ = ("topic", "payload", "qos", "kind", "key", "size", "queued_at")
+
+    def __init__(self, topic, payload, qos, kind, key, queued_at):
+        self.topic = topic
+        self.payload = payload
+        self.qos = qos
+        self.kind = kind
+        self.key = key
+        self.size = len(payload) + len(topic) + ENTRY_OVERHEAD
+        self.queued_at = queued_at
+
+
+class _Class:
+    def __init__(self, name, priority, policy, max_bytes=None):
+        self.name = name
+        self.priority = priority
+        self.policy = policy
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        # latest: key -> entry in order of last update; otherwise FIFO
+        self.entries = collections.OrderedDict() if policy == "latest" else collections.deque()
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def pop_oldest(self):
+        if self.policy == "latest":
+            _, entry = self.entries.popitem(last=False)
+        else:
+            entry = self.entries.popleft()
+        self.bytes -= entry.size
+        return entry
+
+
+class OfflineQueue:
+    def __init__(self, config=None, clock=time):
+        config = dict(DEFAULT_OFFLINE_QUEUE_CONFIG, **(config or {}))
+        self.max_bytes = config["maxBytes"]
+        self.types = config["types"]
+        self.default_class = config["defaultClass"]
+        self.clock = clock
+        self.classes = {}
+        for priority, (name, policy) in enumerate(config["classes"].items()):
+            self.classes[name] = _Class(name, priority, policy["policy"], policy.get("maxBytes"))
+        self._by_priority = sorted(self.classes.values(), key=lambda c: c.priority)
+        self.bytes = 0
+        self.peak_bytes = 0
+        self.queued = 0
+        self.evicted = 0
+
+    def classify(self, payload):
+        """(class, message type) from the JSON "type" (or the only field of an untyped message)"""
+        if isinstance(payload, (bytes, bytearray)):
+            return self.default_class, None
+        try:
+            data = json.loads(payload)
+        except ValueError:
+            return ("log" if "log" in self.classes else self.default_class), None
+        if not isinstance(data, dict):
+            return self.default_class, None
+        message_type = data.get("type") or (next(iter(data)) if len(data) == 1 else None)
+        return self.types.get(message_type, self.default_class), message_type
+
+    def put(self, topic, payload, qos=0, kind=None):
+        """Queue one publish (kind overrides its class); returns False if it is not queued"""
+        classified, message_type = self.classify(payload)
+        queue_class = self.classes.get(kind or classified, self.classes[self.default_class])
+        if queue_class.policy == "drop":
+            queue_class.dropped += 1
+            return False
+        entry = _Entry(topic, payload, qos, queue_class.name, (topic, message_type), self.clock.monotonic())
+        if entry.size > self.max_bytes:
+            queue_class.dropped += 1
+            return False
+        if queue_class.policy == "latest":
+            previous = queue_class.entries.pop(entry.key, None)
+            if previous is not None:
+                queue_class.bytes -= previous.size
+                self.bytes -= previous.size
+                queue_class.dropped += 1
+            queue_class.entries[entry.key] = entry
+        else:
+            queue_class.entries.append(entry)
+        queue_class.bytes += entry.size
+        self.bytes += entry.size
+        self.queued += 1
+        if queue_class.max_bytes is not None:
+            while queue_class.bytes > queue_class.max_bytes and len(queue_class) > 1:
+                self._evict(queue_class)
+        while self.bytes > self.max_bytes:
+            victim = self._victim()
+            if victim is None:
+                break
+            self._evict(victim)
+        self.peak_bytes = max(self.peak_bytes, self.bytes)
+        return True
+
+    def pop(self):
+        """Next message to publish (highest priority class first, oldest first), or None"""
+        for queue_class in self._by_priority:
+            if queue_class.entries:
+                entry = queue_class.pop_oldest()
+                self.bytes -= entry.size
+                return entry
+        return None
+
+    def requeue(self, entry):
+        """Put back a message whose publish failed, at the head of its class"""
+        queue_class = self.classes[entry.kind]
+        if queue_class.policy == "latest":
+            if entry.key in queue_class.entries:
+                return   # A newer one arrived meanwhile
+            queue_class.entries[entry.key] = entry
+            queue_class.entries.move_to_end(entry.key, last=False)
+        else:
+            queue_class.entries.appendleft(entry)
+        queue_class.bytes += entry.size
+        self.bytes += entry.size
+
+    def __len__(self):
+        return sum(len(queue_class) for queue_class in self.classes.values())
+
+    def stats(self):
+        return {"bytes": self.bytes, "peakBytes": self.peak_bytes, "queued": self.queued, "evicted": self.evicted,
+                "classes": {name: {"messages": len(c), "bytes": c.bytes, "dropped": c.dropped}
+                            for name, c in self.classes.items()}}
+
+    def _victim(self):
+        candidates = [c for c in reversed(self._by_priority) if c.entries]
+        for queue_class in candidates:
+            if queue_class.policy != "keep":
+                return queue_class
+        return candidates[0] if candidates else None
+
+    def _evict(self, queue_class):
+        entry = queue_class.pop_oldest()
+        self.bytes -= entry.size
+        queue_class.dropped += 1
+        self.evicted += 1
+
+
+class OfflinePublisher:
+    """publish() like AWSIoTMQTTClient, queueing in an OfflineQueue while the session is down"""
+
+    def __init__(self, client, config=None, clock=time):
+        config = dict(DEFAULT_OFFLINE_QUEUE_CONFIG, **(config or {}))
+        self.client = client
+        self.queue = OfflineQueue(config, clock)
+        self.clock = clock
+        self.drain_interval = 1.0 / config["drainPerSecond"]
+        self.retry_initial = config["retryInitialS"]
+        self.retry_max = config["retryMaxS"]
+        self.online = True
+        self.published = 0
+        self.drained = 0
+        self.failures = 0
+        self._backoff = 0.0     # Current wait after failed publishes; 0 while they succeed
+        self._retry_at = 0.0    # clock.monotonic() before which the drain does not retry
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    def publish(self, topic, payload, qos=0, kind=None):
+        with self._cond:
+            direct = self.online and not len(self.queue)
+        if direct:
+            try:
+                result = self.client.publish(topic, payload, qos)
+                self.published += 1
+                return result
+            except Exception as e:
+                print(f"⚠️ Publish failed, queueing for retry: {e}")
+                with self._cond:
+                    self._failed()
+        with self._cond:
+            queued = self.queue.put(topic, payload, qos, kind)
+            self._cond.notify()
+        return queued
+
+    def set_online(self, online):
+        """Connection state from the SDK's onOnline / onOffline callbacks"""
+        with self._cond:
+            if online != self.online:
+                print("📶 MQTT session back online" if online else "📴 MQTT session offline, queueing publishes")
+            self.online = online
+            if online:
+                self._backoff = self._retry_at = 0.0     # New session: no reason to wait
+            self._cond.notify()
+
+    def next_drain_delay(self):
+        """Seconds until drain_once should run: 0 now, None while offline or nothing is queued"""
+        with self._cond:
+            return self._drain_delay()
+
+    def drain_once(self):
+        """Publish the next queued message if online and not backing off; returns True if one was sent"""
+        with self._cond:
+            if self._drain_delay() != 0.0:
+                return False
+            entry = self.queue.pop()
+        try:
+            self.client.publish(entry.topic, entry.payload, entry.qos)
+        except Exception as e:
+            print(f"⚠️ Drain publish failed, will retry: {e}")
+            with self._cond:
+                self.queue.requeue(entry)
+                self._failed()
+            return False
+        with self._cond:
+            self._backoff = 0.0
+        self.drained += 1
+        return True
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="offline-drain", daemon=True)
+        self._thread.start()
+
+    def shutdown(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            return dict(self.queue.stats(), online=self.online, published=self.published, drained=self.drained,
+                        failures=self.failures)
+
+    def _drain_delay(self):
+        if not (self.online and len(self.queue)):
+            return None
+        return max(0.0, self._retry_at - self.clock.monotonic())
+
+    def _failed(self):
+        """Back off before the next retry (with the lock held)"""
+        self.failures += 1
+        self._backoff = min(self.retry_max, self._backoff * 2 or self.retry_initial)
+        self._retry_at = self.clock.monotonic() + self._backoff
+        self._cond.notify()
+
+    def _run(self):
+        while self._running:
+            with self._cond:
+                delay = self._drain_delay()
+                if delay != 0.0:
+                    # Nothing to send, offline, or backing off: publish, set_online and shutdown notify
+                    self._cond.wait(delay)
+                    continue
+            if self.drain_once():
+                self.clock.sleep(self.drain_interval)
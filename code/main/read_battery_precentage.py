@@ -1,44 +1,47 @@
-import time
-from AWSIoTPythonSDK.MQTTLib import AWSIoTMQTTClient
+import asyncio
+import json
+import re
+from gpio_backend import open_serial
 
 
-def read_serial_batter_status(mqtt_config, port='/dev/ttyUSB0', baudrate=9600, timeout=1):
-    """
-    Reads battery percentage from serial and publishes to AWS IoT MQTT topic.
-    """
-    import serial
-    import json
+NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
 
-    print("🔋 Battery percentage monitoring started...")
 
-    # Setup AWS MQTT client inside the process
-    mqtt_client = AWSIoTMQTTClient("batteryClient", useWebsocket=True)
-    mqtt_client.configureEndpoint(mqtt_config["endpoint"], 443)
-    mqtt_client.configureCredentials(mqtt_config["ca_path"])
-    mqtt_client.configureIAMCredentials(
-        mqtt_config["access_key"],
-        mqtt_config["secret_key"],
-        mqtt_config["session_token"]
-    )
-    mqtt_client.configureConnectDisconnectTimeout(10)
-    mqtt_client.configureMQTTOperationTimeout(5)
+def parse_percentage(line):
+    """First number in a serial line as a float, or None"""
+    match = NUMBER.search(line)
+    return float(match.group()) if match else None
 
-    mqtt_client.connect()
 
-    # Setup Serial
-    ser = serial.Serial(port, baudrate, timeout=timeout)
+async def poll_battery_status(publish, on_level=None, port='/dev/ttyUSB0', baudrate=9600, timeout=1, interval=60):
+    """
+    The battery reader as a task on the motor process's RobotRuntime.
 
+    Reads a percentage line from serial and publishes it as
+    {"battery_percentage": line} once a minute. publish(payload) goes
+    straight to the shared session (no hub socket, no separate process).
+    The blocking serial read runs on the loop's executor; on_level(percent)
+    gets every parsed percentage.
+    """
+    print("🔋 Battery percentage monitoring started...")
+    loop = asyncio.get_running_loop()
+    ser = open_serial(port, baudrate, timeout=timeout)
     try:
         while True:
-            line = ser.readline().decode('utf-8', errors='ignore').strip()
-            if line:
-                payload = json.dumps({"battery_percentage": line})
-                print(f"🔋 Publishing: {payload}")
-                mqtt_client.publish(mqtt_config["topic"], payload, 0)
-                time.sleep(60)
-    except KeyboardInterrupt:
-        print("❌ Battery monitoring interrupted")
+            line = await loop.run_in_executor(None, ser.readline)
+            line = line.decode('utf-8', errors='ignore').strip()
+            if not line:
+                continue
+            percentage = parse_percentage(line)
+            if on_level is not None and percentage is not None:
+                on_level(percentage)
+            payload = json.dumps({"battery_percentage": line})
+            print(f"🔋 Publishing: {payload}")
+            try:
+                publish(payload)
+            except Exception as e:
+                print(f"⚠️ Error publishing battery status: {e}")
+            await asyncio.sleep(interval)
     finally:
         ser.close()
-        mqtt_client.disconnect()
-        print("🔌 Serial and MQTT disconnected")
+        print("🔌 Battery serial closed")
@@ -0,0 +1,180 @@
+# robot_runtime.py
+"""
+One asyncio event loop for the motor process's housekeeping workers.
+
+The robot used to run a process per worker: obstacle log, battery reader
+(with its own hub socket and a second copy of the interpreter and
+modules). On top of that came a thread per periodic publisher: telemetry,
+acks, pose, clock pings, latency summary, credential watch. They all sleep
+almost all of the time, so RobotRuntime hosts them as tasks on one loop in
+one thread instead:
+
+    runtime = RobotRuntime()
+    runtime.every("pose", 1.0, publish_pose)            # plain callable
+    runtime.ticker("telemetry", telemetry.tick)          # callable returns the next delay
+    runtime.ticker("acks", batcher.tick)                 # ... or None: idle until runtime.wake("acks")
+    runtime.every("credentials", 5.0, rotator.check, blocking=True)   # may block: executor
+    runtime.spawn("battery", poll_battery_status(...))  # any coroutine
+    runtime.start()
+    runtime.submit(handle_message, message, received_ns)   # from another thread (MQTT callback)
+
+Callables run on the loop thread, so they must not block; blocking=True
+(or offload()) moves a call to the loop's small executor. A worker that
+raises is logged and called again at its next interval, like the old
+thread loops.
+
+What stays outside on purpose: the sensor sampler (its own process, hard
+timing), the motor driver / scheduler / obstacle watcher threads (safety
+path, must not wait behind a log line) and the hub and offline-drain
+threads (socket servers with their own blocking I/O).
+
+stats() reports per-task runs and errors, cross-thread submissions and the
+loop's lag (how late a 1 s timer fires), which is what a blocking worker
+would show up in.
+"""
+
+import asyncio
+import concurrent.futures
+import contextlib
+import threading
+
+LAG_PROBE_S = 1.0
+EXECUTOR_WORKERS = 2
+
+
+class RobotRuntime:
+    def __init__(self, name="robot-runtime"):
+        self.name = name
+        self.loop = asyncio.new_event_loop()
+        self.loop.set_default_executor(concurrent.futures.ThreadPoolExecutor(
+            EXECUTOR_WORKERS, thread_name_prefix=f"{name}-blocking"))
+        self.tasks = {}             # name -> asyncio.Task
+        self.runs = {}              # name -> times the worker ran
+        self.errors = {}            # name -> times it raised
+        self._wakeups = {}          # ticker name -> asyncio.Event that cuts its wait short
+        self.submitted = 0
+        self.max_lag_ms = 0.0
+        self._pending = []          # (name, coroutine) added before start()
+        self._thread = None
+
+    # --- workers ---
+    def spawn(self, name, coroutine):
+        """Run a coroutine as a named task"""
+        self.runs.setdefault(name, 0)
+        self.errors.setdefault(name, 0)
+        if self._thread is None:
+            self._pending.append((name, coroutine))
+        else:
+            self.loop.call_soon_threadsafe(self._create_task, name, coroutine)
+
+    def ticker(self, name, tick, first=0.0, blocking=False):
+        """Call tick() after first seconds, then again after the delay it returns (None: when woken)"""
+        self._wakeups[name] = asyncio.Event()
+        self.spawn(name, self._tick_loop(name, tick, first, blocking))
+
+    def wake(self, name):
+        """Run a ticker now instead of at the end of its current delay; safe from any thread"""
+        woken = self._wakeups.get(name)
+        if woken is not None:
+            self.loop.call_soon_threadsafe(woken.set)
+
+    def every(self, name, interval, fn, first=None, blocking=False):
+        """Call fn() every interval seconds (first call after first, default one interval)"""
+
+        def tick():
+            fn()
+            return interval
+
+        self.ticker(name, tick, interval if first is None else first, blocking)
+
+    def submit(self, fn, *args):
+        """Run fn(*args) on the loop thread as soon as possible; safe from any thread"""
+        self.submitted += 1
+        self.loop.call_soon_threadsafe(self._call, fn, args)
+
+    def call_later(self, delay, fn, *args):
+        """Run fn(*args) on the loop thread after delay seconds; safe from any thread"""
+        self.loop.call_soon_threadsafe(self.loop.call_later, delay, self._call, fn, args)
+
+    def offload(self, fn, *args):
+        """Run a blocking fn(*args) on the executor; returns a concurrent future"""
+        return self.loop.run_in_executor(None, fn, *args)
+
+    # --- lifecycle ---
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self, timeout=2.0):
+        """Cancel every task and stop the loop (waits for it unless called from the loop itself)"""
+        if self._thread is None or self.loop.is_closed():
+            return
+        self.loop.call_soon_threadsafe(self._cancel_all)
+        if threading.current_thread() is not self._thread:
+            self._thread.join(timeout)
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def stats(self):
+        return {"tasks": {name: {"alive": name in self.tasks and not self.tasks[name].done(),
+                                 "runs": self.runs.get(name, 0), "errors": self.errors.get(name, 0)}
+                          for name in self.runs},
+                "submitted": self.submitted, "maxLagMs": round(self.max_lag_ms, 2)}
+
+    # --- internals ---
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        for name, coroutine in self._pending:
+            self._create_task(name, coroutine)
+        self._pending = []
+        self._create_task("lag-probe", self._lag_probe())
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.run_until_complete(self.loop.shutdown_default_executor())
+            self.loop.close()
+
+    def _create_task(self, name, coroutine):
+        self.tasks[name] = self.loop.create_task(coroutine, name=name)
+
+    def _call(self, fn, args):
+        try:
+            fn(*args)
+        except Exception as e:
+            print(f"⚠️ Error in {getattr(fn, '__name__', 'runtime call')}: {e}")
+
+    async def _tick_loop(self, name, tick, delay, blocking):
+        woken = self._wakeups[name]
+        while True:
+            if not woken.is_set():
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(woken.wait(), delay)
+            woken.clear()
+            try:
+                delay = await self.loop.run_in_executor(None, tick) if blocking else tick()
+                self.runs[name] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors[name] += 1
+                print(f"⚠️ Error in {name}: {e}")
+                delay = 1.0
+
+    async def _lag_probe(self):
+        while True:
+            started = self.loop.time()
+            await asyncio.sleep(LAG_PROBE_S)
+            self.max_lag_ms = max(self.max_lag_ms, (self.loop.time() - started - LAG_PROBE_S) * 1000)
+
+    def _cancel_all(self):
+        tasks = list(self.tasks.values())
+        for task in tasks:
+            task.cancel()
+
+        async def finish():
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.loop.stop()
+
+        self.loop.create_task(finish())
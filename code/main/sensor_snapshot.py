@@ -0,0 +1,118 @@
+# sensor_snapshot.py
+"""
+Lock-free sensor snapshot in shared memory, guarded by a seqlock.
+
+The ultrasonic process is the only writer. Every sample bumps the header
+sequence to an odd value, rewrites that sensor's slot and bumps it back to
+even. Readers in any process copy the whole slot region between two reads
+of the sequence and retry if it changed or was odd, so they always see a
+consistent multi-sensor snapshot without taking a lock.
+
+Each slot carries the filtered distance, confidence, closing rate, the
+monotonic_ns timestamp of the sample, a per-sensor sample sequence number
+and the gate's blocked flag. CLOCK_MONOTONIC is system-wide, so readers can
+age a reading with their own time.monotonic_ns(). A reading older than
+staleAfterS (a crashed or hung sensor process) counts as blocked, and so
+does a snapshot that stays unreadable.
+
+Layout (little-endian):
+    header  seq u64, sensor count u32, layout version u32
+    slot    distance f64, confidence f64, closing f64, timestamp_ns i64,
+            sample seq u64, blocked u8, 7 pad bytes
+"""
+
+import collections
+import struct
+import time
+from multiprocessing import shared_memory
+
+VERSION = 1
+HEADER = struct.Struct("<QII")
+SEQ = struct.Struct("<Q")
+SLOT = struct.Struct("<dddqQB7x")
+READ_RETRIES = 1000
+STALE_AFTER_S = 0.5
+
+SensorReading = collections.namedtuple(
+    "SensorReading", "distance confidence closing timestamp_ns seq blocked")
+
+
+class SensorSnapshot:
+    def __init__(self, count, name=None):
+        """Create a region for count sensors, or attach to the existing one called name"""
+        size = HEADER.size + count * SLOT.size
+        if name is None:
+            self._shm = shared_memory.SharedMemory(create=True, size=size)
+            self._shm.buf[:size] = bytes(size)
+            HEADER.pack_into(self._shm.buf, 0, 0, count, VERSION)
+            self.owner = True
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+            _, stored, version = HEADER.unpack_from(self._shm.buf, 0)
+            if stored != count or version != VERSION:
+                raise ValueError(f"sensor snapshot {name} holds {stored} sensors (v{version}), expected {count}")
+            self.owner = False
+        self.name = self._shm.name
+        self.count = count
+        self._buf = self._shm.buf
+        self._end = size
+        self._seq = None            # Writer-side copies, loaded on the first write
+        self._slot_seqs = None
+
+    def __reduce__(self):
+        # Child processes attach by name instead of copying the buffer
+        return (SensorSnapshot, (self.count, self.name))
+
+    # --- Writer (ultrasonic process only) ---
+    def write(self, index, distance, confidence, closing, blocked, timestamp_ns=None):
+        buf = self._buf
+        if self._seq is None:
+            # Pick up where a previous (possibly crashed) writer left off; never stay odd
+            seq = SEQ.unpack_from(buf, 0)[0]
+            self._seq = seq + (seq & 1)
+            self._slot_seqs = [SLOT.unpack_from(buf, HEADER.size + i * SLOT.size)[4] for i in range(self.count)]
+        if timestamp_ns is None:
+            timestamp_ns = time.monotonic_ns()
+        seq = self._seq
+        sample_seq = self._slot_seqs[index] + 1
+        self._slot_seqs[index] = sample_seq
+        SEQ.pack_into(buf, 0, seq + 1)
+        SLOT.pack_into(buf, HEADER.size + index * SLOT.size,
+                       distance, confidence, closing, timestamp_ns, sample_seq, 1 if blocked else 0)
+        SEQ.pack_into(buf, 0, seq + 2)
+        self._seq = seq + 2
+
+    # --- Readers (any process, lock-free) ---
+    def read(self):
+        """Consistent tuple of SensorReading for every sensor, or None if the writer never settled"""
+        buf = self._buf
+        for _ in range(READ_RETRIES):
+            before = SEQ.unpack_from(buf, 0)[0]
+            if before & 1:
+                time.sleep(0)   # Writer is mid-update; let it finish
+                continue
+            data = bytes(buf[HEADER.size:self._end])
+            if SEQ.unpack_from(buf, 0)[0] == before:
+                return tuple(SensorReading._make(SLOT.unpack_from(data, i * SLOT.size))
+                             for i in range(self.count))
+        return None
+
+    def close(self):
+        self._buf = None
+        self._shm.close()
+        if self.owner:
+            self.owner = False
+            self._shm.unlink()
+
+
+def is_stale(reading, now_ns=None, stale_after=STALE_AFTER_S):
+    """True when the reading was never written or is older than stale_after seconds"""
+    if reading.seq == 0:
+        return True
+    now_ns = time.monotonic_ns() if now_ns is None else now_ns
+    return now_ns - reading.timestamp_ns > stale_after * 1e9
+
+
+def is_unsafe(reading, now_ns=None, stale_after=STALE_AFTER_S):
+    """Blocked, or too old to trust: either way the direction counts as blocked"""
+    return reading.blocked or is_stale(reading, now_ns, stale_after)
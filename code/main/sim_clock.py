@@ -0,0 +1,117 @@
+# sim_clock.py
+"""
+Injectable time source for the motor and sensor logic.
+
+Components that keep time (MotorScheduler, MotorDriver, ObstacleWatcher,
+ClockSync, motor_thread) take a `clock` argument. It defaults to the `time`
+module itself, so production code pays nothing. A clock only needs the
+subset of `time` those components call: time(), monotonic(), monotonic_ns(),
+perf_counter() and sleep().
+
+VirtualClock implements the same subset over simulated time together with
+an event queue. Nothing moves until the owner advances the clock: events
+fire in (time, insertion) order and each one sees the clock at its own
+timestamp, so a run is deterministic and as fast as the callbacks. sleep()
+called from outside an event advances the clock and fires whatever falls
+due. sleep() called from inside an event only consumes time, like a
+busy-wait.
+
+sim_harness.py builds a whole robot (dispatcher, stop deadline, ramped
+driver, sensor loop, obstacle gate and watcher) on one VirtualClock.
+"""
+
+import heapq
+import itertools
+import math
+
+DEFAULT_EPOCH = 1_700_000_000.0     # Wall-clock seconds at virtual time 0
+
+
+class VirtualClock:
+    def __init__(self, start=0.0, epoch=DEFAULT_EPOCH):
+        self._now_ns = int(start * 1e9)
+        self._epoch = epoch
+        self._events = []       # (due ns, tie-break, handle)
+        self._order = itertools.count()
+        self._firing = False
+        self.fired = 0
+
+    # --- time-module subset ---
+    def monotonic_ns(self):
+        return self._now_ns
+
+    def monotonic(self):
+        return self._now_ns / 1e9
+
+    perf_counter = monotonic
+
+    def time(self):
+        return self._epoch + self._now_ns / 1e9
+
+    def sleep(self, seconds):
+        target = self._now_ns + max(0, int(seconds * 1e9))
+        if self._firing:
+            self._now_ns = target
+        else:
+            self._advance(target)
+
+    # --- event queue ---
+    def call_at(self, when, callback, *args):
+        """Run callback(*args) at virtual time when (seconds); returns a handle with cancel()"""
+        handle = _Event(callback, args)
+        heapq.heappush(self._events, (math.ceil(when * 1e9), next(self._order), handle))
+        return handle
+
+    def call_later(self, delay, callback, *args):
+        return self.call_at(self.monotonic() + max(0.0, delay), callback, *args)
+
+    def call_every(self, period, callback, *args, first=None):
+        """Run callback(*args) every period seconds (first run after `first`, default one period)
+        until it returns False or the handle is cancelled"""
+        handle = _Event(None, ())
+
+        def tick():
+            if handle.cancelled or callback(*args) is False:
+                return
+            self.call_later(period, tick)
+
+        self.call_later(period if first is None else first, tick)
+        return handle
+
+    def run_until(self, when):
+        """Advance to virtual time when (seconds), firing every event due by then"""
+        self._advance(int(when * 1e9))
+
+    def run_for(self, seconds):
+        self._advance(self._now_ns + int(seconds * 1e9))
+
+    def pending(self):
+        return sum(1 for _, _, handle in self._events if not handle.cancelled)
+
+    def _advance(self, target_ns):
+        events = self._events
+        while events and events[0][0] <= target_ns:
+            due, _, handle = heapq.heappop(events)
+            if handle.cancelled:
+                continue
+            # A callback that slept may have pushed the clock past this event's due time
+            self._now_ns = max(self._now_ns, due)
+            self._firing = True
+            try:
+                handle.callback(*handle.args)
+            finally:
+                self._firing = False
+            self.fired += 1
+        self._now_ns = max(self._now_ns, target_ns)
+
+
+class _Event:
+    __slots__ = ("callback", "args", "cancelled")
+
+    def __init__(self, callback, args):
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
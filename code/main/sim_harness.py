@@ -0,0 +1,253 @@
+# sim_harness.py
+"""
+Deterministic, faster-than-real-time harness for the motor and sensor logic.
+
+SimulatedRobot runs the real robot code on one sim_clock.VirtualClock,
+single-threaded:
+- the motor_thread command dispatcher (staleness check, obstacle gating,
+  motion functions);
+- the MotorScheduler stop deadline, polled when it falls due;
+- the MotorDriver ramp loop, stepped at the control rate;
+- the sensor loop (ultrasonic_thread2.publish_samples, i.e. DistanceFilter
+  plus ObstacleGate), fired slot by slot with the staggered-array timing;
+- the ObstacleWatcher, woken by the gate's event and on its poll interval;
+- the obstacle monitor report.
+Only the world is simulated. The robot moves by the calibrated speed of the
+duties actually on the pins, and each sensor reads the gap to its obstacle
+plus seeded noise.
+
+Traces:
+    commands   [{"t": s, "key": "ArrowUp", "duration": 0.2, "speed": None,
+                 "hold": s, "repeat": s, "latency": s}, ...]
+               hold/repeat replay a held key as key-repeat commands.
+    obstacles  [[t, cm or None per sensor], ...]
+               At each point the obstacles are re-placed that far from the
+               robot along each sensor's facing (None = nothing in range).
+               In between they stand still, so driving closes the gap.
+
+motor_thread keeps its state in module globals, so use one SimulatedRobot
+per process. bench_soak.py runs long scenarios through it.
+"""
+
+import contextlib
+import functools
+import math
+import os
+import random
+import time
+
+os.environ["ROBOT_GPIO_BACKEND"] = "sim"
+
+import clock_sync  # noqa: E402
+import command_filter  # noqa: E402
+import control_codec  # noqa: E402
+import motor_thread as mt  # noqa: E402
+import obstacle_guard  # noqa: E402
+from distance_filter import DistanceFilter  # noqa: E402
+from motor_driver import MotorDriver  # noqa: E402
+from motor_scheduler import MotorScheduler  # noqa: E402
+from sim_clock import VirtualClock  # noqa: E402
+from ultrasonic_array import plan_slots  # noqa: E402
+from ultrasonic_echo import ECHO_TIMEOUT_S, MAX_DISTANCE_CM, MIN_DISTANCE_CM, SPEED_OF_SOUND_CM_S  # noqa: E402
+from ultrasonic_thread2 import publish_samples  # noqa: E402
+
+MONITOR_INTERVAL_S = 0.5
+
+
+class SimulatedRobot:
+    def __init__(self, clock=None, seed=0, noise_cm=1.0, dropout=0.0, verbose=False):
+        self.clock = clock or VirtualClock()
+        self.verbose = verbose
+        self._random = random.Random(seed)
+        self.noise_cm = noise_cm
+        self.dropout = dropout
+
+        # Point the motor_thread globals at the virtual clock; nothing here starts a thread
+        mt.clock = self.clock
+        mt.link_clock = clock_sync.ClockSync(self.clock)
+        mt.encoders = None
+        mt.motor_scheduler = MotorScheduler(mt.motor_stop, clock=self.clock)
+        mt.motor_driver = MotorDriver(
+            mt.GPIO, (mt.IN1, mt.IN2), (mt.IN3, mt.IN4),
+            pwm_frequency=mt.motor_config["pwmFrequency"],
+            rate_hz=mt.motor_config["controlRate"],
+            accel=mt.motor_config["acceleration"],
+            decel=mt.motor_config["deceleration"],
+            clock=self.clock
+        )
+        mt.motor_driver.on_tick = mt.on_motor_tick
+        mt.motor_driver.on_applied = mt.on_command_applied
+        mt.open_sensor_snapshot()
+        mt.obstacle_watcher = obstacle_guard.ObstacleWatcher(
+            mt.sensor_readings, mt.obstacle_event, mt.current_motion_sensors, mt.obstacle_emergency_stop,
+            stale_after=mt.STALE_AFTER_S, clock=self.clock
+        )
+        mt.obstacle_event.clear()
+        # Fresh seq windows; late commands wait on the virtual clock
+        mt.command_sequences = command_filter.SequenceFilter()
+        mt.command_backlog = command_filter.BacklogCollapser(self._execute, mt.on_command_collapsed,
+                                                             self.clock.call_later, clock=self.clock)
+        self._record_rejection = mt.record_rejection
+        mt.record_rejection = self._on_rejection
+
+        sensors = mt.sensor_config["sensors"]
+        self.facing = [math.radians(sensor.get("facing", 0)) for sensor in sensors]
+        self.slots = plan_slots(sensors, mt.sensor_config["crosstalkAngleDeg"])
+        self.min_period = mt.sensor_config["minPeriodS"]
+        self.settle = mt.sensor_config["settleS"]
+        self.distance_filter = DistanceFilter(len(sensors))
+        self._slot_fired = [-math.inf] * len(self.slots)
+        self._next_slot = 0
+
+        self.travel = 0.0                               # cm along the starting heading
+        self._placed = [None] * len(sensors)            # (cm, travel when placed)
+        self.stats = {"commands": 0, "rejected": 0, "samples": 0, "reports": 0,
+                      "collisions": 0, "min_clearance_cm": math.inf}
+        self._touching = [False] * len(sensors)
+
+        period = mt.motor_driver.period
+        self.clock.call_every(period, self._control_tick, period)
+        self.clock.call_later(0.0, self._fire_slot)
+        self.clock.call_every(obstacle_guard.WATCHER_POLL_INTERVAL, self._watch)
+        self.clock.call_every(MONITOR_INTERVAL_S, self._report)
+
+    # --- world ---
+    def place_obstacles(self, distances):
+        """Put obstacles distances[i] cm from the robot along sensor i (None = clear)"""
+        self._placed = [None if d is None else (float(d), self.travel) for d in distances]
+
+    def gap(self, index):
+        """True distance from sensor index to its obstacle, or None"""
+        placed = self._placed[index]
+        if placed is None:
+            return None
+        cm, anchor = placed
+        return cm - (self.travel - anchor) * math.cos(self.facing[index])
+
+    def _control_tick(self, dt):
+        driver = mt.motor_driver
+        forward = (driver.left.duty + driver.right.duty) / 2.0
+        velocity = math.copysign(mt.approach_speed(forward), forward)
+        self.travel += velocity * dt
+        for i in range(len(self.facing)):
+            gap = self.gap(i)
+            approaching = velocity * math.cos(self.facing[i]) > 0
+            if gap is not None and approaching:
+                self.stats["min_clearance_cm"] = min(self.stats["min_clearance_cm"], gap)
+            touching = gap is not None and gap <= 0
+            if touching and not self._touching[i]:
+                self.stats["collisions"] += 1
+            self._touching[i] = touching
+        driver.step(dt)
+
+    # --- sensor loop ---
+    def _fire_slot(self):
+        # Same timing as UltrasonicArray.next_slot: wait for minPeriodS, echoes, settle gap
+        index = self._next_slot
+        self._next_slot = (index + 1) % len(self.slots)
+        now = self.clock.monotonic()
+        wait = self._slot_fired[index] + self.min_period - now
+        if wait > 0:
+            self.clock.call_later(wait, self._sample_slot, index)
+        else:
+            self._sample_slot(index)
+
+    def _sample_slot(self, slot_index):
+        fired = self._slot_fired[slot_index] = self.clock.monotonic()
+        samples, longest = [], 0.0
+        for i in self.slots[slot_index]:
+            raw = self._read(i)
+            echo = ECHO_TIMEOUT_S if raw is None else 2 * raw / SPEED_OF_SOUND_CM_S
+            longest = max(longest, echo)
+            samples.append((i, raw, fired + echo))
+        self.clock.call_later(longest, self._publish, samples)
+        self.clock.call_later(longest + self.settle, self._fire_slot)
+
+    def _read(self, index):
+        gap = self.gap(index)
+        if gap is None or self._random.random() < self.dropout:
+            return None
+        reading = max(0.0, gap) + self._random.gauss(0.0, self.noise_cm)
+        if reading < MIN_DISTANCE_CM or reading > MAX_DISTANCE_CM:
+            return None
+        return reading
+
+    def _publish(self, samples):
+        publish_samples(samples, self.distance_filter, mt.sensor_readings, mt.obstacle_gate)
+        self.stats["samples"] += len(samples)
+        if mt.obstacle_event.is_set():
+            self._watch()
+
+    # --- motor-process side ---
+    def _watch(self):
+        mt.obstacle_event.clear()
+        mt.obstacle_watcher.check()
+
+    def _report(self):
+        line = mt.obstacle_report()
+        self.stats["reports"] += 1
+        if self.verbose:
+            print(f"[{self.clock.monotonic():9.2f}] {line}")
+
+    def _on_rejection(self, key):
+        self.stats["rejected"] += 1
+        self._record_rejection(key)
+
+    def _poll_stop(self):
+        remaining = mt.motor_scheduler.poll()
+        if remaining is not None:
+            # At least 1 us on: float deadlines can sit a hair past the ns clock
+            self.clock.call_later(max(remaining, 1e-6), self._poll_stop)
+
+    def send(self, key, duration=0.2, speed=None, latency=0.03, sender=0, distance=None, seq=None):
+        """Publish a drive command now; it reaches the dispatcher latency seconds later. Returns the command"""
+        msg = {"key": key, "timestamp": self.clock.time() * 1000.0, "duration": duration,
+               "speed": speed, "sender": sender, "distance": distance, "seq": seq}
+        command = control_codec.command_from_json(msg)
+        self.deliver(command, latency)
+        return command
+
+    def deliver(self, command, latency=0.0):
+        """Hand an already published command to the dispatcher (a redelivery or a queued burst)"""
+        self.clock.call_later(latency, self._dispatch, command)
+
+    def _dispatch(self, command):
+        self.stats["commands"] += 1
+        decode_start_ns = time.monotonic_ns()
+        mt.handle_drive_command(command, self.clock.monotonic_ns(), decode_start_ns, time.monotonic_ns())
+        self._poll_stop()
+
+    def _execute(self, command, received_ns, decoded_ns):
+        mt.execute_drive_command(command, received_ns, decoded_ns)
+        self._poll_stop()
+
+    # --- traces ---
+    def schedule_commands(self, commands):
+        for command in commands:
+            hold, repeat = command.get("hold", 0.0), command.get("repeat", 0.1)
+            count = 1 + int(hold / repeat) if hold else 1
+            options = {name: command[name] for name in ("duration", "speed", "latency", "sender", "distance")
+                       if name in command}
+            for k in range(count):
+                self.clock.call_at(command["t"] + k * repeat, functools.partial(self.send, command["key"], **options))
+
+    def schedule_obstacles(self, obstacles):
+        for t, *distances in obstacles:
+            self.clock.call_at(t, self.place_obstacles, distances)
+
+    def run(self, seconds):
+        """Advance the simulation by seconds of virtual time; returns the stats"""
+        started = time.perf_counter()
+        with open(os.devnull, "w") as sink:
+            with contextlib.nullcontext() if self.verbose else contextlib.redirect_stdout(sink):
+                self.clock.run_for(seconds)
+        wall = time.perf_counter() - started
+        stats = dict(self.stats,
+                     sim_s=self.clock.monotonic(), wall_s=wall, speedup=seconds / max(wall, 1e-9),
+                     timed_stops=mt.motor_scheduler.stops, emergency_stops=mt.obstacle_watcher.stops,
+                     driven_cm=mt.odometry.distance, events=self.clock.fired)
+        return stats
+
+    def close(self):
+        mt.record_rejection = self._record_rejection
+        mt.close_sensor_snapshot()
@@ -7,7 +7,7 @@ import math
 import os
 from dataclasses import dataclass, field
 from typing import Dict, List, Optional
-from AWSIoTPythonSDK.MQTTLib import AWSIoTMQTTClient
+from AWSIoTPythonSDK.MQTTLib import AWSIoTMQTTClient, DROP_OLDEST
 import random
 
 # --- Certificate Paths (relative to the script) ---
@@ -21,6 +21,9 @@ CERTIFICATE_PATH = os.path.join(os.path.dirname(__file__), "cert", "device-certi
 AWS_IOT_ENDPOINT = "a2cdp9hijgdiig-ats.iot.ap-southeast-2.amazonaws.com" # e.g., "xxxxxxxxxxxxxx-ats.iot.us-east-1.amazonaws.com"
 AWS_REGION = "ap-southeast-2" # e.g., "us-east-1" (optional for certificate auth, but good to keep consistent)
 
+# Simulated robots only subscribe; keep the SDK's offline publish queue small instead of unbounded
+OFFLINE_QUEUE_SIZE = 20
+
 @dataclass
 class Robot:
     """Represents a robot in the simulation"""
@@ -274,7 +277,7 @@ class RobotSimulation:
             
             # Configure connection parameters
             robot.mqtt_client.configureAutoReconnectBackoffTime(1, 32, 20)
-            robot.mqtt_client.configureOfflinePublishQueueing(-1)
+            robot.mqtt_client.configureOfflinePublishQueueing(OFFLINE_QUEUE_SIZE, DROP_OLDEST)
             robot.mqtt_client.configureDrainingFrequency(2)
             robot.mqtt_client.configureConnectDisconnectTimeout(10)
             robot.mqtt_client.configureMQTTOperationTimeout(5)
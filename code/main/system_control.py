@@ -9,7 +9,9 @@ via MQTT for testing and manual control.
 import json
 import time
 import os
-from AWSIoTPythonSDK.MQTTLib import AWSIoTMQTTClient
+from mqtt_hub import HubClient
+
+OFFLINE_QUEUE_SIZE = 20   # SDK offline queue when we open our own session
 
 def load_mqtt_credentials():
     """Load MQTT credentials from the robot's credential file"""
@@ -28,6 +30,7 @@ def load_mqtt_credentials():
 def setup_mqtt_client(credentials):
     """Setup MQTT client for sending commands"""
     try:
+        from AWSIoTPythonSDK.MQTTLib import AWSIoTMQTTClient, DROP_OLDEST
         client = AWSIoTMQTTClient("systemControlClient", useWebsocket=True)
         client.configureEndpoint(credentials["awsHost"], 443)
         client.configureCredentials("../cert/AmazonRootCA1.pem")
@@ -39,7 +42,7 @@ def setup_mqtt_client(credentials):
         )
         
         client.configureAutoReconnectBackoffTime(1, 32, 20)
-        client.configureOfflinePublishQueueing(-1)
+        client.configureOfflinePublishQueueing(OFFLINE_QUEUE_SIZE, DROP_OLDEST)  # One-shot commands; never unbounded
         client.configureDrainingFrequency(2)
         client.configureConnectDisconnectTimeout(10)
         client.configureMQTTOperationTimeout(5)
@@ -52,6 +55,16 @@ def setup_mqtt_client(credentials):
         print(f"❌ Error setting up MQTT client: {e}")
         return None
 
+def connect_client(credentials):
+    """Borrow the running robot's MQTT session through its hub; open our own only when no robot is up"""
+    client = HubClient("systemControlClient")
+    try:
+        client.connect()
+        print("🔀 Using the robot's shared MQTT session")
+        return client
+    except OSError:
+        return setup_mqtt_client(credentials)
+
 def send_system_command(command_type):
     """Send a system command (disconnect/reconnect) to the robot"""
     try:
@@ -61,7 +74,7 @@ def send_system_command(command_type):
             return False
         
         # Setup MQTT client
-        client = setup_mqtt_client(credentials)
+        client = connect_client(credentials)
         if not client:
             return False
         
@@ -82,8 +95,9 @@ def send_system_command(command_type):
         client.publish(topic, message, 1)
         print(f"✅ {command_type.capitalize()} command sent successfully")
         
-        # Wait a moment then disconnect
-        time.sleep(2)
+        # Wait a moment then disconnect (the hub has already acked a QoS 1 publish)
+        if not isinstance(client, HubClient):
+            time.sleep(2)
         client.disconnect()
         
         return True
@@ -0,0 +1,190 @@
+# telemetry.py
+"""
+Batched, delta-encoded robot telemetry.
+
+TelemetryAggregator samples registered channels (distances, motor duties,
+battery, latency, ...) at their configured rates. Values are quantized to
+integers by a per-channel scale, and a sample whose values all stay within
+the channel's deadband of the last kept one is dropped, so a robot standing
+still produces almost nothing. Kept samples are batched and published every
+publishIntervalS (or after heartbeatS of silence). A token bucket caps the
+publish rate at maxPublishesPerMin. When the budget or maxSamplesPerBatch
+is exhausted, the batch keeps growing and is thinned out instead of being
+sent early.
+
+Message (JSON, one per batch):
+    {"type": "telemetry", "v": 1, "seq": n, "t": batch start (epoch ms),
+     "ch": {name: {"t": first sample offset ms,
+                   "v": [first sample, quantized],
+                   "d": [[ms since previous sample, delta per field], ...]}},
+     "schema": {name: {"fields": [...], "scale": s}}}
+"schema" is included in the first batch and then every schemaIntervalS.
+Each batch starts from absolute values, so a lost QoS 0 message costs only
+its own samples. decode_batch() turns a message back into timestamped
+floats.
+"""
+
+import json
+import math
+import time
+
+from config_manager import DEFAULT_TELEMETRY_CONFIG
+
+VERSION = 1
+
+
+class _Channel:
+    def __init__(self, name, fields, sample, period, scale, deadband):
+        self.name = name
+        self.fields = list(fields)
+        self.sample = sample
+        self.period = period
+        self.scale = scale
+        self.deadband = max(1, int(round(deadband * scale)))
+        self.next_due = 0.0
+        self.last = None            # Last kept quantized values
+        self.last_ms = 0            # ... and when they were sampled
+        self.pending = []           # [(epoch ms, quantized values)]
+
+    def quantize(self, values):
+        scale = self.scale
+        return [0 if value is None or math.isnan(value) else int(round(value * scale)) for value in values]
+
+
+class TelemetryAggregator:
+    def __init__(self, publish, config=None, clock=time):
+        """publish(payload) sends one JSON string; config defaults to DEFAULT_TELEMETRY_CONFIG"""
+        self.publish = publish
+        self.config = dict(DEFAULT_TELEMETRY_CONFIG, **(config or {}))
+        self.clock = clock
+        self.channels = {}
+        self.seq = 0
+        self.published = 0
+        self.bytes = 0
+        self.samples = 0
+        self.kept = 0
+        self._rate = self.config["maxPublishesPerMin"] / 60.0
+        self._tokens = 1.0
+        self._token_time = clock.monotonic()
+        self._next_flush = clock.monotonic() + self.config["publishIntervalS"]
+        self._last_publish = -math.inf
+        self._last_schema = -math.inf
+
+    def add_channel(self, name, fields, sample, scale=1.0, deadband=0.0):
+        """Register sample() -> list of floats (or None to skip) for fields; returns False if disabled"""
+        rate = self.config["sampleHz"].get(name, 0.0)
+        if not rate or rate <= 0:
+            return False
+        self.channels[name] = _Channel(name, fields, sample, 1.0 / rate, scale, deadband)
+        return True
+
+    def tick(self):
+        """Take the samples that are due and publish if a batch is due; returns seconds to the next action"""
+        now = self.clock.monotonic()
+        for channel in self.channels.values():
+            if now >= channel.next_due:
+                channel.next_due = max(channel.next_due + channel.period, now)
+                self._take(channel)
+        if now >= self._next_flush:
+            self._flush(now)
+        next_due = min([channel.next_due for channel in self.channels.values()] + [self._next_flush])
+        return max(0.0, next_due - self.clock.monotonic())
+
+    def _take(self, channel):
+        try:
+            values = channel.sample()
+        except Exception as e:
+            print(f"⚠️ Telemetry {channel.name} sample failed: {e}")
+            return
+        if values is None:
+            return
+        self.samples += 1
+        quantized = channel.quantize(values)
+        last = channel.last
+        if last is not None and all(abs(a - b) < channel.deadband for a, b in zip(quantized, last)):
+            return
+        channel.last = quantized
+        channel.last_ms = int(self.clock.time() * 1000)
+        channel.pending.append((channel.last_ms, quantized))
+        self.kept += 1
+        limit = self.config["maxSamplesPerBatch"]
+        if len(channel.pending) > limit:
+            # Over budget: keep the first and newest, thin every other sample in between
+            channel.pending = channel.pending[:1] + channel.pending[1:-1:2] + channel.pending[-1:]
+
+    def _flush(self, now):
+        has_data = any(channel.pending for channel in self.channels.values())
+        if not has_data and now - self._last_publish < self.config["heartbeatS"]:
+            self._next_flush = now + self.config["publishIntervalS"]
+            return
+        # Token bucket: refill at maxPublishesPerMin, no bursting beyond one message
+        self._tokens = min(1.0, self._tokens + (now - self._token_time) * self._rate)
+        self._token_time = now
+        if self._tokens < 1.0:
+            self._next_flush = now + (1.0 - self._tokens) / self._rate
+            return
+        self._tokens -= 1.0
+        if not has_data:
+            # Heartbeat: resend the last kept values (with their own timestamps) so the dashboard knows we are alive
+            for channel in self.channels.values():
+                if channel.last is not None:
+                    channel.pending.append((channel.last_ms, channel.last))
+        payload = self.encode(now)
+        try:
+            self.publish(payload)
+            self.published += 1
+            self.bytes += len(payload)
+        except Exception as e:
+            print(f"⚠️ Error publishing telemetry: {e}")
+        self._last_publish = now
+        self._next_flush = now + self.config["publishIntervalS"]
+
+    def encode(self, now=None):
+        """Build the batch message from the pending samples and clear them"""
+        now = self.clock.monotonic() if now is None else now
+        starts = [channel.pending[0][0] for channel in self.channels.values() if channel.pending]
+        start = min(starts) if starts else int(self.clock.time() * 1000)
+        self.seq += 1
+        message = {"type": "telemetry", "v": VERSION, "seq": self.seq, "t": start, "ch": {}}
+        for channel in self.channels.values():
+            if not channel.pending:
+                continue
+            first_ms, first = channel.pending[0]
+            deltas = []
+            previous_ms, previous = first_ms, first
+            for ms, values in channel.pending[1:]:
+                deltas.append([ms - previous_ms] + [a - b for a, b in zip(values, previous)])
+                previous_ms, previous = ms, values
+            entry = {"t": first_ms - start, "v": first}
+            if deltas:
+                entry["d"] = deltas
+            message["ch"][channel.name] = entry
+            channel.pending = []
+        if now - self._last_schema >= self.config["schemaIntervalS"]:
+            self._last_schema = now
+            message["schema"] = self.schema()
+        return json.dumps(message, separators=(",", ":"))
+
+    def schema(self):
+        return {channel.name: {"fields": channel.fields, "scale": channel.scale}
+                for channel in self.channels.values()}
+
+
+def decode_batch(message, schema):
+    """{channel: (fields, [(epoch ms, [values])])} from a telemetry message (dict or JSON)"""
+    if isinstance(message, (str, bytes)):
+        message = json.loads(message)
+    schema = message.get("schema", schema)
+    decoded = {}
+    for name, entry in message["ch"].items():
+        channel_schema = schema[name]
+        scale = channel_schema["scale"]
+        ms = message["t"] + entry["t"]
+        values = list(entry["v"])
+        samples = [(ms, [value / scale for value in values])]
+        for delta in entry.get("d", ()):
+            ms += delta[0]
+            values = [value + change for value, change in zip(values, delta[1:])]
+            samples.append((ms, [value / scale for value in values]))
+        decoded[name] = (channel_schema["fields"], samples)
+    return decoded
@@ -0,0 +1,111 @@
+# ultrasonic_array.py
+"""
+Staggered, crosstalk-free trigger scheduling for an N-sensor HC-SR04 array.
+
+Sensors facing roughly the same way hear each other's pings, so they must
+not be listening at the same time. plan_slots() groups the configured
+sensors into trigger slots whose members all face at least
+crosstalkAngleDeg apart. UltrasonicArray fires one slot at a time: all
+members are triggered together, every echo is collected (edge-timed, so
+waiting is sleeping), then a short settle gap lets stray echoes die out
+before the next slot. A sensor is never re-triggered within minPeriodS
+(the HC-SR04 datasheet asks for 60 ms).
+
+With the default front/back pair both sensors share one slot and run at
+~16 Hz each, instead of taking turns behind fixed 50 ms + 100 ms sleeps
+(~5 Hz). Sensors whose echo pin has no edge detection fall back to polling
+and get a slot of their own.
+"""
+
+import time
+
+from ultrasonic_echo import ECHO_TIMEOUT_S, TRIGGER_PULSE_S, EchoSensor
+
+
+def angle_between(a, b):
+    difference = abs(a - b) % 360
+    return min(difference, 360 - difference)
+
+
+def plan_slots(sensors, crosstalk_angle):
+    """Greedy grouping of sensor indices into slots of mutually non-interfering sensors"""
+    slots = []
+    for index, sensor in enumerate(sensors):
+        for slot in slots:
+            if all(angle_between(sensor.get("facing", 0), sensors[other].get("facing", 0)) >= crosstalk_angle
+                   for other in slot):
+                slot.append(index)
+                break
+        else:
+            slots.append([index])
+    return slots
+
+
+class UltrasonicArray:
+    def __init__(self, gpio, sensors, crosstalk_angle=90, min_period=0.06, settle=0.01):
+        self.gpio = gpio
+        self.names = [sensor.get("name", f"sensor{index}") for index, sensor in enumerate(sensors)]
+        self.sensors = [EchoSensor(gpio, sensor["trig"], sensor["echo"]) for sensor in sensors]
+        self.slots = []
+        for slot in plan_slots(sensors, crosstalk_angle):
+            timed = [index for index in slot if self.sensors[index].edge_timed]
+            if timed:
+                self.slots.append(timed)
+            self.slots.extend([index] for index in slot if not self.sensors[index].edge_timed)
+        self.min_period = min_period
+        self.settle = settle
+        self.samples = [0] * len(self.sensors)
+        self._last_fired = [0.0] * len(self.slots)
+        self._next_slot = 0
+        self._rate_since = time.monotonic()
+        self._rate_samples = [0] * len(self.sensors)
+
+    @classmethod
+    def from_config(cls, gpio, config):
+        return cls(gpio, config["sensors"], config["crosstalkAngleDeg"], config["minPeriodS"], config["settleS"])
+
+    def next_slot(self):
+        """Fire the next slot (sleeping until its sensors are due); returns [(index, cm or None, monotonic s)]"""
+        slot_index = self._next_slot
+        self._next_slot = (slot_index + 1) % len(self.slots)
+        members = self.slots[slot_index]
+        wait = self._last_fired[slot_index] + self.min_period - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+
+        if not self.sensors[members[0]].edge_timed:
+            self._last_fired[slot_index] = time.monotonic()
+            index = members[0]
+            results = [(index, self.sensors[index].measure_polling(), time.monotonic())]
+        else:
+            for index in members:
+                self.sensors[index].arm()
+            trigs = [self.sensors[index].trig_pin for index in members]
+            self.gpio.output(trigs, True)
+            time.sleep(TRIGGER_PULSE_S)
+            self.gpio.output(trigs, False)
+            fired = self._last_fired[slot_index] = time.monotonic()
+            deadline = fired + ECHO_TIMEOUT_S
+            results = []
+            for index in members:
+                distance = self.sensors[index].collect(deadline - time.monotonic())
+                results.append((index, distance, time.monotonic()))
+
+        for index, _, _ in results:
+            self.samples[index] += 1
+        if self.settle:
+            time.sleep(self.settle)
+        return results
+
+    def rates(self):
+        """Per-sensor effective sample rate (Hz) since the previous call"""
+        now = time.monotonic()
+        elapsed = max(1e-9, now - self._rate_since)
+        rates = [(count - previous) / elapsed for count, previous in zip(self.samples, self._rate_samples)]
+        self._rate_since = now
+        self._rate_samples = list(self.samples)
+        return rates
+
+    def close(self):
+        for sensor in self.sensors:
+            self.gpio.remove_event_detect(sensor.echo_pin)
@@ -0,0 +1,109 @@
+# ultrasonic_echo.py
+"""
+HC-SR04 echo timing from GPIO edge events.
+
+Instead of spinning on GPIO.input() until ECHO rises and falls, the echo
+pin gets a BOTH-edge callback that stores monotonic_ns timestamps; the
+measuring thread fires the trigger pulse and sleeps on an Event until the
+falling edge arrives or the timeout passes. The pulse width comes from the
+two edge timestamps, so wall-clock adjustments cannot distort it and the
+sensor process is idle between edges.
+
+measure_polling() keeps the old busy-wait loop (on the monotonic clock) as
+the fallback when edge detection cannot be added for a pin.
+"""
+
+import threading
+import time
+
+SPEED_OF_SOUND_CM_S = 34300
+TRIGGER_PULSE_S = 0.00001       # 10 us trigger pulse
+ECHO_TIMEOUT_S = 0.04           # Longest echo we wait for (~6.8 m round trip)
+MIN_DISTANCE_CM = 2             # HC-SR04 usable range
+MAX_DISTANCE_CM = 400
+
+_IDLE, _ARMED, _HIGH = 0, 1, 2
+
+
+def pulse_to_cm(width_ns):
+    return width_ns * SPEED_OF_SOUND_CM_S / 2e9
+
+
+class EchoSensor:
+    """One HC-SR04: trigger pin plus an edge-timed echo pin"""
+
+    def __init__(self, gpio, trig_pin, echo_pin, timeout=ECHO_TIMEOUT_S):
+        self.gpio = gpio
+        self.trig_pin = trig_pin
+        self.echo_pin = echo_pin
+        self.timeout = timeout
+        self._state = _IDLE
+        self._rise_ns = 0
+        self._fall_ns = 0
+        self._done = threading.Event()
+        self._clock = time.monotonic_ns
+        gpio.setup(trig_pin, gpio.OUT)
+        gpio.setup(echo_pin, gpio.IN)
+        gpio.output(trig_pin, False)
+        try:
+            gpio.add_event_detect(echo_pin, gpio.BOTH, callback=self._on_edge)
+            self.edge_timed = True
+        except RuntimeError as e:
+            print(f"⚠️ Edge detection unavailable on GPIO {echo_pin}, polling instead: {e}")
+            self.edge_timed = False
+
+    def _on_edge(self, channel):
+        # The first edge after the trigger is the rise, the next one the fall
+        now = self._clock()
+        state = self._state
+        if state == _ARMED:
+            self._rise_ns = now
+            self._state = _HIGH
+        elif state == _HIGH:
+            self._fall_ns = now
+            self._state = _IDLE
+            self._done.set()
+
+    def measure(self):
+        """Distance in cm, or None when there was no valid echo"""
+        if not self.edge_timed:
+            return self.measure_polling()
+        self.arm()
+        self._trigger()
+        return self.collect(self.timeout)
+
+    def arm(self):
+        """Expect an echo; call right before triggering (alone or together with other sensors)"""
+        self._done.clear()
+        self._state = _ARMED
+
+    def collect(self, timeout):
+        """Wait up to timeout seconds for the armed echo; distance in cm or None"""
+        if not self._done.wait(max(0.0, timeout)):
+            self._state = _IDLE
+            return None
+        return self._validate(pulse_to_cm(self._fall_ns - self._rise_ns))
+
+    def measure_polling(self):
+        """Busy-wait measurement (previous implementation, kept as a fallback)"""
+        gpio, echo = self.gpio, self.echo_pin
+        clock = self._clock
+        self._trigger()
+        start = stop = clock()
+        deadline = start + int(self.timeout * 1e9)
+        while gpio.input(echo) == 0 and start < deadline:
+            start = clock()
+        while gpio.input(echo) == 1 and stop < deadline:
+            stop = clock()
+        return self._validate(pulse_to_cm(stop - start))
+
+    def _trigger(self):
+        self.gpio.output(self.trig_pin, True)
+        time.sleep(TRIGGER_PULSE_S)
+        self.gpio.output(self.trig_pin, False)
+
+    @staticmethod
+    def _validate(distance):
+        if distance < MIN_DISTANCE_CM or distance > MAX_DISTANCE_CM:
+            return None
+        return distance
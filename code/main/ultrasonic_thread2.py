@@ -1,15 +1,25 @@
 # ultrasonic_thread2.py
-import RPi.GPIO as GPIO
+from gpio_backend import GPIO
+from ultrasonic_echo import EchoSensor
+from ultrasonic_array import UltrasonicArray
+from distance_filter import DistanceFilter
+from config_manager import load_sensor_config
+from sensor_snapshot import SensorSnapshot
+import flight_recorder
 import time
 import multiprocessing
 import signal
 import sys
 
-# GPIO pin pairs for two sensors: (TRIG, ECHO)
-SENSORS = [(5, 6), (24, 25)]  # Sensor 1 (front), Sensor 2 (back)
+# Sensor array from sensor_config.json (default: front (5, 6) and back (24, 25))
+SENSOR_CONFIG = load_sensor_config()
+# GPIO pin pairs: (TRIG, ECHO)
+SENSORS = [(sensor["trig"], sensor["echo"]) for sensor in SENSOR_CONFIG["sensors"]]
+RATE_REPORT_INTERVAL = 5.0  # Seconds between distance / sample-rate reports
 
 # Global flag for graceful shutdown
 running = True
+echo_sensors = {}  # trig pin -> EchoSensor
 
 def signal_handler(signum, frame):
     """Handle shutdown signals"""
@@ -18,58 +28,81 @@ def signal_handler(signum, frame):
     running = False
 
 def setup_gpio():
-    """Setup GPIO pins for ultrasonic sensors"""
+    """Setup GPIO pins for ultrasonic sensors; returns the scheduled UltrasonicArray"""
     GPIO.setmode(GPIO.BCM)
     GPIO.setwarnings(False)
-    for trig, echo in SENSORS:
-        GPIO.setup(trig, GPIO.OUT)
-        GPIO.setup(echo, GPIO.IN)
+    sensor_array = UltrasonicArray.from_config(GPIO, SENSOR_CONFIG)
+    for sensor in sensor_array.sensors:
+        echo_sensors[sensor.trig_pin] = sensor
+    return sensor_array
 
 def cleanup_gpio():
     """Clean up GPIO resources"""
     try:
+        for trig, echo in SENSORS:
+            GPIO.remove_event_detect(echo)
+        echo_sensors.clear()
         GPIO.cleanup()
         print("📡 Ultrasonic GPIO cleaned up")
     except Exception as e:
         print(f"⚠️ Error cleaning up ultrasonic GPIO: {e}")
 
-def measure_single_distance(trig_pin, echo_pin, sensor_id):
-    """Measure distance from a single ultrasonic sensor"""
+def read_single_distance(trig_pin, echo_pin, sensor_id):
+    """Raw reading from a single ultrasonic sensor (edge-timed); None when there was no valid echo"""
     try:
-        # Trigger pulse
-        GPIO.output(trig_pin, True)
-        time.sleep(0.00001)
-        GPIO.output(trig_pin, False)
-
-        # Wait for echo
-        start_time = time.time()
-        stop_time = time.time()
-
-        timeout = time.time() + 0.04  # 40ms timeout
-
-        while GPIO.input(echo_pin) == 0 and time.time() < timeout:
-            start_time = time.time()
-
-        while GPIO.input(echo_pin) == 1 and time.time() < timeout:
-            stop_time = time.time()
-
-        # Calculate distance
-        time_elapsed = stop_time - start_time
-        distance = (time_elapsed * 34300) / 2  # in cm
-
-        # Validate distance reading
-        if distance < 2 or distance > 400:  # HC-SR04 range is typically 2-400cm
-            return 400  # Return max distance for invalid readings
-
-        return distance
-
+        sensor = echo_sensors.get(trig_pin)
+        if sensor is None:
+            sensor = echo_sensors[trig_pin] = EchoSensor(GPIO, trig_pin, echo_pin)
+        return sensor.measure()
     except Exception as e:
         print(f"⚠️ Error measuring distance from sensor {sensor_id}: {e}")
-        return 400  # Return safe max distance on error
+        return None
 
-def measure_distance(shared_distances):
-    """Main function to continuously measure distances from all sensors"""
+def measure_single_distance(trig_pin, echo_pin, sensor_id):
+    """Measure distance from a single ultrasonic sensor, unfiltered"""
+    distance = read_single_distance(trig_pin, echo_pin, sensor_id)
+    if distance is None:  # HC-SR04 range is typically 2-400cm
+        return 400  # Return max distance for invalid readings
+    return distance
+
+def publish_samples(samples, distance_filter, snapshot, obstacle_gate=None, flight=None):
+    """Filter one trigger slot's raw samples [(index, cm or None, monotonic s)] and publish them.
+
+    With an obstacle_gate the filtered sample is checked and published by the
+    gate; otherwise it goes straight to snapshot. Samples and blocked/clear
+    changes are logged to flight (a FlightRecorder) when given.
+    """
+    for i, raw, now in samples:
+        if i >= snapshot.count:
+            continue
+        distance, confidence, closing = distance_filter.update(i, raw, now)
+        
+        # Publish to the shared snapshot
+        if obstacle_gate is not None:
+            was_blocked = obstacle_gate.blocked[i]
+            blocked = obstacle_gate.on_sample(i, distance, now, closing_rate=closing, confidence=confidence)
+            if flight and blocked != was_blocked:
+                flight.record(flight_recorder.DECISION, i,
+                              flight_recorder.BLOCKED if blocked else flight_recorder.CLEARED, v1=distance)
+        else:
+            blocked = False
+            snapshot.write(i, distance, confidence, closing, False, int(now * 1e9))
+        if flight:
+            flight.record(flight_recorder.SAMPLE, i, blocked, int(confidence * 1000),
+                          float("nan") if raw is None else raw, distance, closing)
+
+def measure_distance(snapshot, obstacle_gate=None):
+    """Main function to continuously measure distances from all sensors.
+
+    Raw readings go through a DistanceFilter. With an obstacle_gate
+    (obstacle_guard.ObstacleGate) each filtered sample is checked and
+    published to its snapshot as soon as it is taken, so the motor process
+    can stop mid-motion; otherwise samples go straight to snapshot
+    (sensor_snapshot.SensorSnapshot). Every sample and every blocked/clear
+    change is also logged to the sensor flight recorder ring.
+    """
     global running
+    flight = None
     
     # Set up signal handlers
     signal.signal(signal.SIGTERM, signal_handler)
@@ -77,38 +110,32 @@ def measure_distance(shared_distances):
     
     try:
         # Setup GPIO
-        setup_gpio()
-        print("📡 Ultrasonic sensors initialized")
+        sensor_array = setup_gpio()
+        names = sensor_array.names
+        print(f"📡 Ultrasonic sensors initialized: {len(names)} sensors, trigger slots {sensor_array.slots}")
         
+        distance_filter = DistanceFilter(len(names))
+        flight = flight_recorder.FlightRecorder("sensor")
         consecutive_errors = 0
         max_consecutive_errors = 10
+        last_report = time.monotonic()
         
         while running:
             try:
-                for i, (TRIG, ECHO) in enumerate(SENSORS):
-                    if not running:
-                        break
-                        
-                    distance = measure_single_distance(TRIG, ECHO, i+1)
-                    
-                    # Update shared distance array
-                    shared_distances[i] = distance
-                    
-                    # Only print occasionally to reduce spam
-                    if time.time() % 2 < 0.1:  # Print roughly every 2 seconds
-                        sensor_name = "Front" if i == 0 else "Back"
-                        print(f"📏 {sensor_name} Sensor: {distance:.2f} cm")
-                    
-                    # Small delay between sensor readings
-                    if running:
-                        time.sleep(0.05)
+                publish_samples(sensor_array.next_slot(), distance_filter, snapshot, obstacle_gate, flight)
+                
+                # Only report occasionally to reduce spam
+                now = time.monotonic()
+                if now - last_report >= RATE_REPORT_INTERVAL:
+                    last_report = now
+                    rates = sensor_array.rates()
+                    readings = snapshot.read() or ()
+                    print("📏 " + " | ".join(f"{name}: {reading.distance:.1f} cm @ {rate:.1f} Hz"
+                                            for name, reading, rate in zip(names, readings, rates)))
                 
                 # Reset error counter on successful cycle
                 consecutive_errors = 0
                 
-                # Main loop delay
-                time.sleep(0.1)
-                
             except Exception as e:
                 consecutive_errors += 1
                 if consecutive_errors <= 3:  # Only show first few errors
@@ -125,6 +152,8 @@ def measure_distance(shared_distances):
     
     finally:
         print("📡 Ultrasonic sensor process shutting down...")
+        if flight is not None:
+            flight.close()
         cleanup_gpio()
         sys.exit(0)
 
@@ -133,11 +162,12 @@ if __name__ == "__main__":
     import multiprocessing
     
     print("🧪 Testing ultrasonic sensors independently...")
-    shared_distances = multiprocessing.Array('d', [100.0, 100.0])
+    snapshot = SensorSnapshot(len(SENSORS))
     
     try:
-        measure_distance(shared_distances)
+        measure_distance(snapshot)
     except KeyboardInterrupt:
         print("\n🛑 Test stopped by user")
     finally:
-        cleanup_gpio()
\ No newline at end of file
+        cleanup_gpio()
+        snapshot.close()
\ No newline at end of file
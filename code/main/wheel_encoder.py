@@ -0,0 +1,143 @@
+# wheel_encoder.py
+"""
+Optional wheel encoders: GPIO edge callbacks, tick ring buffers, speed and distance.
+
+Each encoder registers an edge callback on its A channel. The callback only
+stores a monotonic_ns timestamp into a preallocated array and bumps two
+integers (plus one input read for quadrature), so it keeps up at high tick
+rates and never grows memory. Speed is estimated from the newest ticks in
+the ring; distance from the signed tick count.
+
+Configured through motor_config "encoders" (disabled when null):
+    {"left": [17], "right": [18, 19], "ticksPerCm": 12.0}
+A one-pin entry is a single-channel encoder (direction taken from the
+commanded motion); two pins are quadrature A/B.
+"""
+
+import threading
+import time
+from array import array
+
+RING_SIZE = 256                 # Power of two; newest RING_SIZE tick times are kept
+SPEED_TICKS = 8                 # Ticks averaged for the speed estimate
+STALL_TIMEOUT_NS = 200_000_000  # No tick for this long means the wheel is stopped
+
+
+class WheelEncoder:
+    def __init__(self, gpio, pin_a, pin_b=None, ticks_per_cm=12.0, ring_size=RING_SIZE):
+        if ring_size & (ring_size - 1):
+            raise ValueError("ring_size must be a power of two")
+        self.pin_a = pin_a
+        self.pin_b = pin_b
+        self.ticks_per_cm = float(ticks_per_cm)
+        self._ring = array("q", bytes(8 * ring_size))
+        self._mask = ring_size - 1
+        self.edges = 0          # Total edges seen (ring write index)
+        self.count = 0          # Signed position in ticks
+        self.direction = 1      # Single-channel: sign set from the commanded motion
+        self._input = gpio.input
+        self._clock = time.monotonic_ns
+        gpio.setup(pin_a, gpio.IN, pull_up_down=gpio.PUD_UP)
+        if pin_b is None:
+            gpio.add_event_detect(pin_a, gpio.RISING, callback=self._on_edge_single)
+        else:
+            gpio.setup(pin_b, gpio.IN, pull_up_down=gpio.PUD_UP)
+            # Both A edges give x2 decoding; B's level at an A edge gives direction
+            gpio.add_event_detect(pin_a, gpio.BOTH, callback=self._on_edge_quadrature)
+
+    # --- Edge callbacks: keep these allocation-free ---
+    def _on_edge_single(self, channel):
+        n = self.edges
+        self._ring[n & self._mask] = self._clock()
+        self.edges = n + 1
+        self.count += self.direction
+
+    def _on_edge_quadrature(self, channel):
+        n = self.edges
+        self._ring[n & self._mask] = self._clock()
+        self.edges = n + 1
+        if self._input(self.pin_a) != self._input(self.pin_b):
+            self.count += 1
+        else:
+            self.count -= 1
+
+    # --- Estimates (called from the control loop, not the callback) ---
+    def distance_cm(self):
+        return self.count / self.ticks_per_cm
+
+    def speed_cm_s(self, now_ns=None):
+        """Unsigned wheel speed from the newest ticks; 0 when stalled"""
+        n = self.edges
+        if n < 2:
+            return 0.0
+        now_ns = self._clock() if now_ns is None else now_ns
+        last = self._ring[(n - 1) & self._mask]
+        if now_ns - last > STALL_TIMEOUT_NS:
+            return 0.0
+        k = min(SPEED_TICKS, n - 1, self._mask)
+        first = self._ring[(n - 1 - k) & self._mask]
+        if last <= first:
+            return 0.0
+        return k / self.ticks_per_cm * 1e9 / (last - first)
+
+
+class EncoderPair:
+    """Left/right encoders plus closed-loop distance moves on top of the motor driver"""
+
+    def __init__(self, left, right, driver):
+        self.left = left
+        self.right = right
+        self.driver = driver
+        self._lock = threading.Lock()
+        self._move = None       # (start left cm, start right cm, target cm, on_done)
+
+    def set_direction(self, left_sign, right_sign):
+        """Direction hint for single-channel encoders"""
+        self.left.direction = 1 if left_sign >= 0 else -1
+        self.right.direction = 1 if right_sign >= 0 else -1
+
+    def travelled_cm(self, start_left, start_right):
+        return (abs(self.left.distance_cm() - start_left) + abs(self.right.distance_cm() - start_right)) / 2.0
+
+    def speed_cm_s(self):
+        now = time.monotonic_ns()
+        return (self.left.speed_cm_s(now) + self.right.speed_cm_s(now)) / 2.0
+
+    def start_move(self, target_cm, on_done=None):
+        """Track a straight move; the driver is stopped when target_cm is (about to be) reached"""
+        with self._lock:
+            self._move = (self.left.distance_cm(), self.right.distance_cm(), float(target_cm), on_done)
+
+    def cancel_move(self):
+        with self._lock:
+            self._move = None
+
+    def on_tick(self, left_duty, right_duty, dt):
+        """Control-loop hook: stop early enough that the decel ramp lands on the target"""
+        move = self._move
+        if move is None:
+            return
+        start_left, start_right, target, on_done = move
+        travelled = self.travelled_cm(start_left, start_right)
+        duty = max(abs(left_duty), abs(right_duty))
+        # Ramp-down distance ~ v * t_stop / 2 with t_stop = duty / decel
+        braking = self.speed_cm_s() * (duty / self.driver.decel) / 2.0 if self.driver.decel else 0.0
+        if travelled + braking < target:
+            return
+        with self._lock:
+            if self._move is not move:
+                return
+            self._move = None
+        self.driver.stop()
+        if on_done:
+            on_done(travelled)
+
+
+def create_encoders(gpio, config, driver):
+    """Build an EncoderPair from motor_config["encoders"], or None when not configured"""
+    if not config:
+        return None
+    ticks_per_cm = config.get("ticksPerCm", 12.0)
+    left = WheelEncoder(gpio, *config["left"], ticks_per_cm=ticks_per_cm)
+    right = WheelEncoder(gpio, *config["right"], ticks_per_cm=ticks_per_cm)
+    return EncoderPair(left, right, driver)